@@ -0,0 +1,54 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from apiCommuniPay.accounts import telegram_ids
+
+User = get_user_model()
+
+
+class TelegramIdResolverTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        telegram_ids.clear_local()
+        self.users = [User.objects.create_user(username=f"u{i}", password="x", telegram_id=500 + i) for i in range(3)]
+
+    def test_batch_resolve_is_one_query_then_cached(self):
+        with self.assertNumQueries(1):
+            got = telegram_ids.resolve_many([500, 501, 502, 999])
+        self.assertEqual(got, {500 + i: u.pk for i, u in enumerate(self.users)})
+        with self.assertNumQueries(0):
+            self.assertEqual(telegram_ids.resolve(501), self.users[1].pk)
+            self.assertIsNone(telegram_ids.resolve(999))   # промах тоже закэширован
+
+        telegram_ids.clear_local()
+        with self.assertNumQueries(0):   # из общего кэша
+            self.assertEqual(telegram_ids.resolve_many([500, 999]), {500: self.users[0].pk})
+
+    def test_local_lru_is_bounded(self):
+        with mock.patch.object(telegram_ids, "LOCAL_SIZE", 2):
+            telegram_ids.resolve_many([500, 501, 502])
+            self.assertEqual(len(telegram_ids._local), 2)
+
+    def test_remember_and_delete(self):
+        self.assertIsNone(telegram_ids.resolve(777))
+        user = User.objects.create_user(username="late", password="x", telegram_id=777)
+        telegram_ids.remember(777, user.pk)
+        self.assertEqual(telegram_ids.resolve(777), user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.delete()
+        with self.assertNumQueries(1):
+            self.assertIsNone(telegram_ids.resolve(777))
+
+    def test_telegram_id_change_drops_stale_mapping(self):
+        user = self.users[0]
+        self.assertEqual(telegram_ids.resolve(500), user.pk)
+        self.assertIsNone(telegram_ids.resolve(600))   # промах закэширован
+        with self.captureOnCommitCallbacks(execute=True):
+            user.telegram_id = 600
+            user.save()
+        self.assertIsNone(telegram_ids.resolve(500))
+        self.assertEqual(telegram_ids.resolve(600), user.pk)
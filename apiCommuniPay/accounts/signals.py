@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import Signal, receiver
+
+from . import telegram_ids
+
+User = get_user_model()
+
+# save() сменил User.telegram_id: kwargs previous, current (любой может быть None)
+telegram_id_changed = Signal()
+
+
+def _telegram_id(instance):
+    # без обращения к отложенному полю (.only()/.defer()) — иначе лишний запрос
+    return instance.__dict__.get("telegram_id")
+
+
+@receiver(post_init, sender=User)
+def remember_initial_telegram_id(sender, instance, **kwargs):
+    instance._initial_telegram_id = _telegram_id(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=User)
+def forget_changed_telegram_id(sender, instance, created, **kwargs):
+    """Сменился telegram_id (админка, сериализатор, импорт) — сбрасываем старое и новое соответствие."""
+    previous, current = instance._initial_telegram_id, _telegram_id(instance)
+    instance._initial_telegram_id = current
+    if previous != current:
+        transaction.on_commit(lambda: telegram_ids.forget([previous, current]))
+        if not created:
+            telegram_id_changed.send(sender, instance=instance, previous=previous, current=current)
+
+
+@receiver(post_delete, sender=User)
+def forget_telegram_id(sender, instance, **kwargs):
+    if instance.telegram_id:
+        tg_id = instance.telegram_id
+        transaction.on_commit(lambda: telegram_ids.forget([tg_id]))
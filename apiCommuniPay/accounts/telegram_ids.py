@@ -0,0 +1,129 @@
+"""
+Резолвер telegram_id → user_id для обработчиков вебхука.
+
+Два уровня:
+- LRU в памяти процесса на `TG_USER_CACHE_LOCAL_SIZE` записей, запись живёт не дольше
+  `TG_USER_CACHE_LOCAL_TTL` секунд (другие процессы могли создать или удалить пользователя);
+- общий кэш `tguser:<telegram_id>` с TTL `TG_USER_CACHE_TTL`.
+
+Отсутствие пользователя тоже кэшируется (значение 0), но коротко —
+`TG_USER_CACHE_MISS_TTL`: пользователь может появиться через любой путь регистрации.
+`TelegramAuthView` записывает соответствие сразу после создания или обновления
+пользователя; любая смена `telegram_id` через save() (админка, сериализаторы) и
+удаление пользователя сбрасывают старое и новое соответствие (accounts/signals.py).
+
+`resolve_many` отвечает на пачку id одним `get_many` и одним запросом в БД на промахи.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+LOCAL_SIZE = getattr(settings, "TG_USER_CACHE_LOCAL_SIZE", 10_000)
+LOCAL_TTL = getattr(settings, "TG_USER_CACHE_LOCAL_TTL", 60)
+CACHE_TTL = getattr(settings, "TG_USER_CACHE_TTL", 24 * 60 * 60)
+MISS_TTL = getattr(settings, "TG_USER_CACHE_MISS_TTL", 30)
+
+_MISSING = 0
+
+_local: OrderedDict[int, tuple[int, float]] = OrderedDict()
+_lock = threading.Lock()
+
+
+def _key(tg_id: int) -> str:
+    return f"tguser:{tg_id}"
+
+
+def _local_get(tg_id: int, now: float) -> int | None:
+    with _lock:
+        hit = _local.get(tg_id)
+        if hit is None:
+            return None
+        if hit[1] <= now:
+            del _local[tg_id]
+            return None
+        _local.move_to_end(tg_id)
+        return hit[0]
+
+
+def _local_put(items: dict[int, int], now: float) -> None:
+    with _lock:
+        for tg_id, user_id in items.items():
+            ttl = LOCAL_TTL if user_id != _MISSING else min(LOCAL_TTL, MISS_TTL)
+            _local[tg_id] = (user_id, now + ttl)
+            _local.move_to_end(tg_id)
+        while len(_local) > LOCAL_SIZE:
+            _local.popitem(last=False)
+
+
+def resolve_many(tg_ids: Iterable[int]) -> dict[int, int]:
+    """{telegram_id: user_id} для найденных; неизвестные id в ответ не попадают."""
+    now = time.monotonic()
+    found: dict[int, int] = {}
+    pending = []
+    for tg_id in {int(t) for t in tg_ids if t}:
+        user_id = _local_get(tg_id, now)
+        if user_id is None:
+            pending.append(tg_id)
+        elif user_id != _MISSING:
+            found[tg_id] = user_id
+    if not pending:
+        return found
+
+    shared = cache.get_many([_key(t) for t in pending])
+    fetched: dict[int, int] = {}
+    todo = []
+    for tg_id in pending:
+        user_id = shared.get(_key(tg_id))
+        if user_id is None:
+            todo.append(tg_id)
+        else:
+            fetched[tg_id] = user_id
+
+    if todo:
+        loaded = dict(
+            get_user_model().objects
+            .filter(telegram_id__in=todo)
+            .values_list("telegram_id", "pk")
+        )
+        cache.set_many({_key(t): u for t, u in loaded.items()}, timeout=CACHE_TTL)
+        misses = {_key(t): _MISSING for t in todo if t not in loaded}
+        if misses:
+            cache.set_many(misses, timeout=MISS_TTL)
+        fetched.update({t: loaded.get(t, _MISSING) for t in todo})
+
+    _local_put(fetched, now)
+    found.update({t: u for t, u in fetched.items() if u != _MISSING})
+    return found
+
+
+def resolve(tg_id: int | None) -> int | None:
+    if not tg_id:
+        return None
+    return resolve_many([tg_id]).get(int(tg_id))
+
+
+def remember(tg_id: int, user_id: int) -> None:
+    """Записать соответствие (после создания/обновления пользователя)."""
+    tg_id = int(tg_id)
+    cache.set(_key(tg_id), user_id, timeout=CACHE_TTL)
+    _local_put({tg_id: user_id}, time.monotonic())
+
+
+def forget(tg_ids: Iterable[int]) -> None:
+    tg_ids = [int(t) for t in tg_ids if t]
+    cache.delete_many([_key(t) for t in tg_ids])
+    with _lock:
+        for t in tg_ids:
+            _local.pop(t, None)
+
+
+def clear_local() -> None:
+    with _lock:
+        _local.clear()
@@ -177,6 +177,7 @@ class TelegramAuthView(views.APIView):
 
         # find or create user by telegram_id
         from django.contrib.auth import get_user_model
+        from apiCommuniPay.accounts import telegram_ids
         from apiCommuniPay.accounts.models import Roles
         User = get_user_model()
 
@@ -205,6 +206,8 @@ class TelegramAuthView(views.APIView):
                 changed = True
         if changed:
             user.save()
+        if created or changed:
+            telegram_ids.remember(tg_id, user.pk)
 
         # issue JWT
         refresh = RefreshToken.for_user(user)
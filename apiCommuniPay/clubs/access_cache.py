@@ -0,0 +1,140 @@
+"""
+Кэш решений о доступе (user, chat) поверх ChatEntitlement / ProjectEntitlement.
+
+Инвалидация — версиями, а не удалением ключей:
+- у каждого пользователя и чата есть счётчик версии в кэше;
+- запись решения хранит версии, при которых была посчитана;
+- при изменении прав (entitlements.refresh после записи Subscription / PlanChannel /
+  Plan.channels) после коммита увеличиваются версии затронутых пользователей или чатов —
+  все их записи разом становятся недействительными;
+- перепривязка чата к другому проекту сдвигает версию чата (проектные права).
+
+Версии сдвигают все процессы (веб-воркеры, команды), поэтому кэш должен быть общим,
+с атомарным `incr` и дешевле запроса к БД — Redis или Memcached (settings.CACHES).
+С `SHARED_CACHE_REQUIRED` приложение на другом кэше не стартует (`require_shared_cache`):
+у DatabaseCache `incr` — чтение и запись, параллельные сдвиги версии сливаются в один.
+
+Чтение — один `get_many` (две версии + запись). Запись хранит `valid_until`, поэтому
+решение «разрешено» само перестаёт действовать, когда подписка истекает, а TTL
+записи не превышает оставшегося срока.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import secrets
+import threading
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+
+from . import entitlements
+
+CACHE_TTL = getattr(settings, "ACCESS_CACHE_TTL", 300)
+
+SHARED_BACKENDS = (
+    "django.core.cache.backends.redis.RedisCache",
+    "django.core.cache.backends.memcached.PyMemcacheCache",
+    "django.core.cache.backends.memcached.PyLibMCCache",
+    "django_redis.cache.RedisCache",
+)
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _user_key(user_id: int) -> str:
+    return f"access:v:user:{user_id}"
+
+
+def _chat_key(chat_id: int) -> str:
+    return f"access:v:chat:{chat_id}"
+
+
+def _entry_key(user_id: int, chat_id: int) -> str:
+    return f"access:{user_id}:{chat_id}"
+
+
+def _seed() -> int:
+    # случайное начальное значение: если ключ версии вытеснен, новая версия
+    # не совпадёт ни с одной старой записью
+    return secrets.randbits(48)
+
+
+def _count(name: str, n: int = 1) -> None:
+    with _stats_lock:
+        _stats[name] += n
+
+
+def _version(key: str, current) -> int:
+    if current is not None:
+        return current
+    cache.add(key, _seed(), timeout=None)
+    return cache.get(key)
+
+
+def has_access(user_id: int, chat_id: int, at: dt.datetime | None = None) -> bool:
+    at = at or timezone.now()
+    uk, ck, ek = _user_key(user_id), _chat_key(chat_id), _entry_key(user_id, chat_id)
+    got = cache.get_many([uk, ck, ek])
+    uv, cv, entry = got.get(uk), got.get(ck), got.get(ek)
+
+    if uv is not None and cv is not None and entry is not None and entry[:2] == (uv, cv):
+        _count("hits")
+        found, until = entry[2], entry[3]
+        return found and (until is None or until > at)
+
+    _count("misses")
+    # версии читаем ДО запроса в БД: если права поменяются между ними,
+    # версия уйдёт вперёд и сохранённая ниже запись сразу окажется устаревшей
+    uv, cv = _version(uk, uv), _version(ck, cv)
+    rows = entitlements.merge_rows(entitlements.valid_rows([user_id], [chat_id]))
+    found, until = bool(rows), rows.get((user_id, chat_id))
+    timeout = CACHE_TTL
+    if found and until is not None:
+        timeout = min(timeout, max(1, int((until - at).total_seconds())))
+    cache.set(ek, (uv, cv, found, until), timeout=timeout)
+    return found and (until is None or until > at)
+
+
+def _bump(keys: list[str]) -> None:
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _seed(), timeout=None)
+    _count("invalidations", len(keys))
+
+
+def invalidate(
+    *,
+    user_ids: Iterable[int] = (),
+    chat_ids: Iterable[int] = (),
+) -> None:
+    """Сдвигает версии после коммита текущей транзакции (сразу — вне транзакции)."""
+    keys = [_user_key(u) for u in user_ids] + [_chat_key(c) for c in chat_ids]
+    if keys:
+        transaction.on_commit(lambda: _bump(keys))
+
+
+def require_shared_cache() -> None:
+    """ImproperlyConfigured, если общий кэш обязателен, а настроен не Redis / Memcached."""
+    if not getattr(settings, "SHARED_CACHE_REQUIRED", False):
+        return
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    if backend not in SHARED_BACKENDS:
+        raise ImproperlyConfigured(
+            f"CACHES['default'] is {backend}: access versions need a shared cache with atomic incr. "
+            "Configure REDIS_URL."
+        )
+
+
+def stats() -> dict:
+    with _stats_lock:
+        out = dict(_stats)
+    total = out["hits"] + out["misses"]
+    out["hit_ratio"] = round(out["hits"] / total, 4) if total else None
+    return out
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Plan, PlanChannel, Subscription
+from .models import ChatEntitlement, Payment, PaymentCallback, Plan, PlanChannel, PlanDailyStats, ProjectEntitlement, RenewalRun, Subscription, SubscriptionEvent, TelegramAction
 from django.db.models import Count
 
 
@@ -11,11 +11,11 @@ class PlanChannelInline(admin.TabularInline):
 
 @admin.register(Plan)
 class PlanAdmin(admin.ModelAdmin):
-    list_display = ("id", "name", "project", "price", "is_public", "channels_count","created_at")
+    list_display = ("id", "name", "project", "price", "is_public", "all_channels", "channels_count","created_at")
     ordering = ("-created_at",)
     list_select_related = ("project",)
     search_fields = ("name", "project__name")
-    list_filter = ("project", "is_public")
+    list_filter = ("project", "is_public", "all_channels")
     filter_horizontal = ("channels",)  # удобно выбирать M2M
 
     def get_queryset(self, request):
@@ -41,3 +41,103 @@ class PlanChannelAdmin(admin.ModelAdmin):
     list_display = ("id", "plan", "chat")
     list_filter = ("plan__project",)
     search_fields = ("plan__name", "chat__title", "chat__tg_chat_id")
+
+
+@admin.register(ChatEntitlement)
+class ChatEntitlementAdmin(admin.ModelAdmin):
+    """Производная таблица: правится только сигналами и rebuild_entitlements."""
+    list_display = ("id", "user", "chat", "valid_until", "updated_at")
+    list_select_related = ("user", "chat")
+    search_fields = ("user__email", "user__telegram_id", "chat__title")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ProjectEntitlement)
+class ProjectEntitlementAdmin(admin.ModelAdmin):
+    """Производная таблица для тарифов «все чаты проекта»."""
+    list_display = ("id", "user", "project", "valid_until", "updated_at")
+    list_select_related = ("user", "project")
+    search_fields = ("user__email", "user__telegram_id", "project__name")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Payment)
+class PaymentAdmin(admin.ModelAdmin):
+    list_display = ("id", "provider", "provider_payment_id", "subscription", "amount", "currency", "status", "created_at", "processed_at")
+    list_filter = ("provider", "status")
+    search_fields = ("provider_payment_id", "subscription__user__email")
+    raw_id_fields = ("subscription",)
+
+
+@admin.register(PaymentCallback)
+class PaymentCallbackAdmin(admin.ModelAdmin):
+    """Входящие уведомления провайдеров — только просмотр."""
+    list_display = ("id", "provider", "provider_payment_id", "status", "received_at", "processed_at", "error")
+    list_filter = ("provider", "status")
+    search_fields = ("provider_payment_id",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(RenewalRun)
+class RenewalRunAdmin(admin.ModelAdmin):
+    list_display = ("id", "cutoff", "started_at", "finished_at", "charged", "failed", "skipped")
+    readonly_fields = ("cutoff", "cursor_ends_at", "cursor_pk", "charged", "failed", "skipped", "started_at", "finished_at")
+
+
+@admin.register(SubscriptionEvent)
+class SubscriptionEventAdmin(admin.ModelAdmin):
+    """Журнал подписок — только добавление, правок нет."""
+    list_display = ("id", "kind", "subscription_id", "user_id", "plan_id", "prev_plan_id", "status", "ends_at", "created_at")
+    list_filter = ("kind",)
+    search_fields = ("=subscription_id", "=user_id")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PlanDailyStats)
+class PlanDailyStatsAdmin(admin.ModelAdmin):
+    """Производная таблица: правится журналом подписок и rebuild_plan_stats."""
+    list_display = ("id", "project", "plan", "day", "active", "mrr", "new", "churned", "renewed")
+    list_select_related = ("project", "plan")
+    list_filter = ("project",)
+    date_hierarchy = "day"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TelegramAction)
+class TelegramActionAdmin(admin.ModelAdmin):
+    """Очередь действий в Telegram — пишут producers, статус ведёт relay."""
+    list_display = ("id", "kind", "chat_tg_id", "user_tg_id", "status", "attempts", "available_at", "created_at", "sent_at")
+    list_filter = ("status", "kind")
+    search_fields = ("=chat_tg_id", "=user_tg_id", "dedup_key")
+    readonly_fields = ("kind", "chat_tg_id", "user_tg_id", "dedup_key", "attempts", "created_at", "sent_at", "error")
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,53 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase
+
+from apiCommuniPay.common.fake_payments import SIGNATURE_HEADER, FakePaymentProvider
+
+
+class FakeProviderTests(TestCase):
+    def test_callbacks_are_signed_duplicated_and_reordered(self):
+        provider = FakePaymentProvider(duplicate_rate=1.0, reorder_rate=1.0, seed=1)
+        res = provider.create_payment(100, "RUB", {})
+        self.assertTrue(res.ok)
+        statuses = [json.loads(body)["status"] for body, _ in provider.outbox]
+        self.assertEqual(statuses, ["succeeded", "succeeded", "pending"])
+
+        body, signature = provider.drain()[0]
+        request = RequestFactory().post("/", data=body, content_type="application/json",
+                                        **{"HTTP_" + SIGNATURE_HEADER.upper().replace("-", "_"): signature})
+        self.assertTrue(provider.verify_signature(request))
+        self.assertEqual(provider.parse_notification(request)[0].provider_payment_id, res.provider_payment_id)
+        forged = RequestFactory().post("/", data=body, content_type="application/json")
+        self.assertFalse(provider.verify_signature(forged))
+
+    def test_failure_rate(self):
+        provider = FakePaymentProvider(failure_rate=1.0, seed=1)
+        self.assertFalse(provider.create_payment(100, "RUB", {}).ok)
+        self.assertEqual(provider.outbox, [])
+
+
+class CheckoutBenchTests(TestCase):
+    def test_end_to_end_without_anomalies(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "r.json")
+            call_command(
+                "bench_checkout", "--checkouts", "6", "--concurrency", "1", "--limit", "4",
+                "--latency-ms", "0", "--duplicate-rate", "1", "--reorder-rate", "0.5",
+                "--timeout", "20", "--output", path, stdout=StringIO(),
+            )
+            with open(path) as f:
+                report = json.load(f)
+        self.assertEqual(report["results"]["entitlements_visible"], 4)
+        anomalies = report["anomalies"]
+        self.assertEqual(anomalies["oversold"], 0)
+        self.assertEqual(anomalies["seat_counter_drift"], 0)
+        self.assertEqual(anomalies["duplicate_active"], 0)
+        self.assertEqual(anomalies["paid_not_active"], 0)
+        self.assertEqual(anomalies["stuck_pending"], 0)
+        self.assertEqual(anomalies["sold_out_refunds"], 2)
+        self.assertEqual(anomalies["callbacks_deduplicated"], 6)
@@ -0,0 +1,65 @@
+import json
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from apiCommuniPay.clubs import entitlements
+from apiCommuniPay.clubs.models import Plan, Subscription
+from apiCommuniPay.common.models import TelegramChat
+from apiCommuniPay.projects.models import Project
+
+User = get_user_model()
+
+
+class BulkAccessTests(TestCase):
+    url = "/api/chats/access/bulk/"
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="x")
+        self.project = Project.objects.create(owner=self.owner, name="Proj")
+        self.chat = TelegramChat.objects.create(tg_id=-1001, type="supergroup", project=self.project)
+        plan = Plan.objects.create(project=self.project, name="Basic", price=Decimal("5.00"))
+        plan.channels.add(self.chat)
+        self.members = [User.objects.create_user(username=f"m{i}", password="x", telegram_id=100 + i) for i in range(4)]
+        for m in self.members[:2]:
+            Subscription.objects.create(user=m, plan=plan)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_service_uses_fixed_number_of_queries(self):
+        pairs = [(None, 100 + i, self.chat.pk) for i in range(6)] + [(self.members[3].pk, None, self.chat.pk)]
+        with self.assertNumQueries(2):
+            out = list(entitlements.check_many(pairs))
+        self.assertEqual([r["allowed"] for r in out], [True, True, False, False, False, False, False])
+        self.assertIsNone(out[5]["user"])  # неизвестный telegram_id
+
+    def test_short_form_for_one_chat(self):
+        r = self.client.post(self.url, {"chat": self.chat.pk, "telegram_ids": [100, 103]}, format="json")
+        self.assertEqual(r.status_code, 200, r.content)
+        self.assertEqual([x["allowed"] for x in r.data["results"]], [True, False])
+
+    def test_stream_returns_ndjson(self):
+        r = self.client.post(self.url, {"chat": self.chat.pk, "telegram_ids": [101], "stream": True}, format="json")
+        lines = b"".join(r.streaming_content).decode().splitlines()
+        self.assertEqual(r["Content-Type"], "application/x-ndjson")
+        self.assertTrue(json.loads(lines[0])["allowed"])
+
+    def test_foreign_chat_is_forbidden(self):
+        self.client.force_authenticate(self.members[0])
+        r = self.client.post(self.url, {"pairs": [{"telegram_id": 100, "chat": self.chat.pk}]}, format="json")
+        self.assertEqual(r.status_code, 403)
+
+    def test_roster_export_streams_entitled_ids(self):
+        r = self.client.get(f"/api/chats/{self.chat.pk}/roster/", {"output": "csv"})
+        self.assertEqual(r.status_code, 200)
+        lines = b"".join(r.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "telegram_id")
+        self.assertEqual(sorted(lines[1:]), ["100", "101"])
+
+        out = StringIO()
+        call_command("export_roster", str(self.chat.tg_id), stdout=out)
+        self.assertEqual(sorted(json.loads(x)["telegram_id"] for x in out.getvalue().splitlines()), [100, 101])
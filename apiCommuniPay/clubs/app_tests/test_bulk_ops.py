@@ -0,0 +1,109 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from apiCommuniPay.clubs import bulk_ops, entitlements, seats
+from apiCommuniPay.clubs.models import ChatEntitlement, Plan, PlanSeats, Subscription, TelegramAction
+from apiCommuniPay.common.models import TelegramChat
+from apiCommuniPay.projects.models import Project
+
+User = get_user_model()
+
+
+class BulkOpsTests(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="x")
+        self.project = Project.objects.create(owner=self.owner, name="Proj")
+        self.chat_a = TelegramChat.objects.create(tg_id=-1001, type="supergroup", project=self.project)
+        self.chat_b = TelegramChat.objects.create(tg_id=-1002, type="supergroup", project=self.project)
+        self.plan = Plan.objects.create(project=self.project, name="A", price=Decimal("5.00"))
+        self.plan.channels.add(self.chat_a)
+        self.other = Plan.objects.create(project=self.project, name="B", price=Decimal("5.00"), limit=3)
+        self.other.channels.add(self.chat_b)
+
+        self.ends = timezone.now() + timedelta(days=3)
+        self.users = [User.objects.create_user(username=f"u{i}", password="x") for i in range(5)]
+        self.subs = [Subscription.objects.create(user=u, plan=self.plan, ends_at=self.ends) for u in self.users[:3]]
+        Subscription.objects.create(user=self.users[3], plan=self.plan, status="expired", ends_at=self.ends)
+        Subscription.objects.create(user=self.users[4], plan=self.plan)   # бессрочная
+
+    def test_extend_in_chunks_with_dry_run(self):
+        dry = bulk_ops.extend(self.plan, 7, dry_run=True)
+        self.assertEqual((dry.matched, dry.changed), (3, 0))
+        self.assertEqual(Subscription.objects.get(pk=self.subs[0].pk).ends_at, self.ends)
+
+        res = bulk_ops.extend(self.plan, 7, chunk_size=2)
+        self.assertEqual((res.changed, res.chunks), (3, 2))
+        for s in self.subs:
+            self.assertEqual(Subscription.objects.get(pk=s.pk).ends_at, self.ends + timedelta(days=7))
+        ent = ChatEntitlement.objects.get(user=self.users[0], chat=self.chat_a)
+        self.assertEqual(ent.valid_until, self.ends + timedelta(days=7))
+
+    def test_migrate_moves_seats_and_access(self):
+        with self.assertRaises(seats.PlanSoldOut):   # 4 активных, в B — 3 места
+            bulk_ops.migrate(self.plan, self.other)
+        Subscription.objects.filter(user=self.users[4]).update(status="canceled")
+        seats.recount()
+
+        res = bulk_ops.migrate(self.plan, self.other, chunk_size=2)
+        self.assertEqual(res.changed, 3)
+        self.assertEqual(PlanSeats.objects.get(plan=self.other).used, 3)
+        self.assertEqual(PlanSeats.objects.get(plan=self.plan).used, 0)
+        self.assertTrue(entitlements.has_access(self.users[0].pk, self.chat_b.pk))
+        self.assertFalse(entitlements.has_access(self.users[0].pk, self.chat_a.pk))
+
+        foreign = Plan.objects.create(
+            project=Project.objects.create(owner=self.owner, name="P2"), name="F", price=Decimal("1.00"),
+        )
+        with self.assertRaises(ValueError):
+            bulk_ops.migrate(self.other, foreign)
+
+    def test_migrate_stops_when_late_activations_run_out_of_seats(self):
+        Subscription.objects.filter(user=self.users[4]).update(status="canceled")
+        late = Subscription.objects.create(user=self.users[3], plan=self.plan, status="pending")
+        seats.recount()
+        real_acquire, calls = seats.acquire, []
+
+        def acquire(plan, n=1):
+            real_acquire(plan, n)
+            if not calls:   # резерв на 3 активных занят — следом оплатили ещё одну
+                Subscription.objects.filter(pk=late.pk).update(status="active")
+            calls.append(n)
+
+        with mock.patch.object(seats, "acquire", side_effect=acquire):
+            res = bulk_ops.migrate(self.plan, self.other, chunk_size=2)
+        self.assertEqual((res.changed, res.stopped), (2, "sold_out"))
+        self.assertEqual(Subscription.objects.filter(plan=self.other).count(), 2)
+        self.assertEqual(PlanSeats.objects.get(plan=self.other).used, 2)   # остаток резерва возвращён
+
+    def test_cancel_via_api_is_owner_only(self):
+        TelegramChat.objects.filter(pk=self.chat_a.pk).update(status=TelegramChat.ChatStatus.ACTIVE)
+        User.objects.filter(pk=self.users[0].pk).update(telegram_id=500)
+        url = f"/api/plans/{self.plan.pk}/subscriptions/bulk/"
+        self.client.force_authenticate(self.users[0])
+        self.assertEqual(self.client.post(url, {"op": "cancel"}, format="json").status_code, 403)
+
+        self.client.force_authenticate(self.owner)
+        r = self.client.post(url, {"op": "cancel", "dry_run": True}, format="json")
+        self.assertEqual((r.status_code, r.data["matched"], r.data["changed"]), (200, 4, 0))
+        r = self.client.post(url, {"op": "cancel"}, format="json")
+        self.assertEqual((r.data["changed"], r.data["queued"]), (4, 1))
+        self.assertEqual(list(TelegramAction.objects.values_list("kind", "chat_tg_id", "user_tg_id")), [("kick", -1001, 500)])
+        self.assertEqual(Subscription.objects.filter(plan=self.plan, status="canceled").count(), 4)
+        self.assertEqual(PlanSeats.objects.get(plan=self.plan).used, 0)
+        self.assertFalse(ChatEntitlement.objects.filter(chat=self.chat_a).exists())
+
+        r = self.client.post(url, {"op": "extend"}, format="json")
+        self.assertEqual(r.status_code, 400)
+
+    def test_command_dry_run(self):
+        out = StringIO()
+        call_command("bulk_subscriptions", str(self.plan.pk), "extend", "--days", "7", "--dry-run", stdout=out)
+        self.assertEqual(json.loads(out.getvalue())["matched"], 3)
@@ -0,0 +1,123 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from apiCommuniPay.clubs import chat_bitmap
+from apiCommuniPay.clubs.models import JoinRequest, Plan, Subscription, TelegramAction
+from apiCommuniPay.common import webhook
+from apiCommuniPay.common.models import TelegramChat
+from apiCommuniPay.projects.models import Project
+
+User = get_user_model()
+
+
+class ChatBitmapTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        chat_bitmap.clear_local()
+        self.owner = User.objects.create_user(username="owner", password="x")
+        self.project = Project.objects.create(owner=self.owner, name="Proj")
+        self.chat = TelegramChat.objects.create(tg_id=-1001, type="supergroup", project=self.project)
+        self.plan = Plan.objects.create(project=self.project, name="Basic", price=Decimal("5.00"))
+        self.plan.channels.add(self.chat)
+        self.users = [User.objects.create_user(username=f"u{i}", password="x", telegram_id=100 + i) for i in range(4)]
+        Subscription.objects.create(user=self.users[0], plan=self.plan)
+        Subscription.objects.create(user=self.users[1], plan=self.plan, ends_at=timezone.now() + timedelta(hours=1))
+
+    def test_lookup_and_denies_without_db(self):
+        self.assertTrue(chat_bitmap.may_have_access(-1001, 100))
+        with self.assertNumQueries(0):
+            self.assertTrue(chat_bitmap.may_have_access(-1001, 101))
+            self.assertFalse(chat_bitmap.may_have_access(-1001, 102))
+            self.assertFalse(chat_bitmap.may_have_access(-1001, 999))
+        later = (timezone.now() + timedelta(hours=2)).timestamp()
+        self.assertFalse(chat_bitmap.may_have_access(-1001, 101, at=later))
+
+    def test_patched_incrementally_on_entitlement_change(self):
+        chat_bitmap.get(-1001)
+        version = cache.get("bitmap:v:-1001")
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscription.objects.create(user=self.users[2], plan=self.plan)
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscription.objects.filter(user=self.users[0]).update(status="canceled")
+            from apiCommuniPay.clubs import entitlements
+            entitlements.refresh(user_ids=[self.users[0].pk])
+        self.assertEqual(cache.get("bitmap:v:-1001"), version + 2)   # патчи, не перестроение
+
+        chat_bitmap.clear_local()
+        with self.assertNumQueries(0):
+            self.assertTrue(chat_bitmap.may_have_access(-1001, 102))
+            self.assertFalse(chat_bitmap.may_have_access(-1001, 100))
+
+    def test_telegram_id_change_rebuilds_roster(self):
+        self.assertTrue(chat_bitmap.may_have_access(-1001, 100))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.users[0].telegram_id = 200
+            self.users[0].save()
+        chat_bitmap.clear_local()   # другой процесс: локальная копия сверится с общей версией
+        self.assertTrue(chat_bitmap.may_have_access(-1001, 200))
+        self.assertFalse(chat_bitmap.may_have_access(-1001, 100))
+
+    def test_grant_during_build_is_not_cached_stale(self):
+        build = chat_bitmap.build
+
+        def build_then_grant(tg_chat_id):
+            roster = build(tg_chat_id)   # таблицы прочитаны до коммита выдачи права
+            with self.captureOnCommitCallbacks(execute=True):
+                Subscription.objects.create(user=self.users[2], plan=self.plan)
+            return roster
+
+        with mock.patch.object(chat_bitmap, "build", side_effect=build_then_grant):
+            self.assertFalse(chat_bitmap.may_have_access(-1001, 102))
+        self.assertIsNone(cache.get("bitmap:v:-1001"))
+        self.assertTrue(chat_bitmap.may_have_access(-1001, 102))
+
+    def test_roster_merge(self):
+        roster = chat_bitmap.build(-1001)
+        patched = roster.patched({100: None, 150: 0, 99: 0})
+        self.assertEqual(list(patched.ids), [99, 101, 150])
+        self.assertEqual(chat_bitmap.Roster.loads(1, patched.dumps()).ids, patched.ids)
+
+    def test_webhook_join_request_fast_path(self):
+        with mock.patch("apiCommuniPay.clubs.telegram_outbox.tg") as tg:
+            chat_bitmap.get(-1001)
+            webhook._handle_chat_join_request({"chat": {"id": -1001}, "from": {"id": 999}})
+            with self.assertNumQueries(0):   # чужой telegram_id уже в кэше как неизвестный
+                webhook._handle_chat_join_request({"chat": {"id": -1001}, "from": {"id": 999}})
+            webhook._handle_chat_join_request({"chat": {"id": -1001}, "from": {"id": 103}})
+            for _ in range(2):   # повторная доставка апдейта
+                webhook._handle_chat_join_request({"chat": {"id": -1001}, "from": {"id": 100}, "date": 1700000000})
+        tg.approve_chat_join_request.assert_not_called()   # одобрение — через очередь
+        self.assertEqual(
+            list(TelegramAction.objects.values_list("kind", "chat_tg_id", "user_tg_id")),
+            [("approve", -1001, 100)],
+        )
+
+    def test_webhook_join_request_waits_for_payment(self):
+        Subscription.objects.create(user=self.users[3], plan=self.plan, status="pending")   # checkout начат
+        for _ in range(2):
+            webhook._handle_chat_join_request({"chat": {"id": -1001}, "from": {"id": 103}})
+        self.assertEqual(
+            list(JoinRequest.objects.values_list("user_id", "chat_id", "plan_id", "status")),
+            [(self.users[3].pk, self.chat.pk, self.plan.pk, "pending")],
+        )
+        self.assertFalse(TelegramAction.objects.exists())
+
+    def test_bench_command(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "r.json")
+            call_command("bench_join_check", str(self.chat.pk), "--checks", "200", "--output", path, stdout=StringIO())
+            with open(path) as f:
+                report = json.load(f)
+        self.assertEqual(report["results"]["bitmap"]["queries"], 0)
+        self.assertEqual(report["mismatches_first_1000"], 0)
@@ -0,0 +1,180 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apiCommuniPay.clubs import access_cache, entitlements
+from apiCommuniPay.clubs.models import ChatEntitlement, Plan, PlanChannel, ProjectEntitlement, Subscription
+from apiCommuniPay.common.access import user_has_chat_access
+from apiCommuniPay.common.models import TelegramChat
+from apiCommuniPay.projects.models import Project
+
+User = get_user_model()
+
+
+class EntitlementTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="owner", password="x")
+        self.user = User.objects.create_user(username="member", password="x")
+        self.project = Project.objects.create(owner=self.owner, name="Proj")
+        self.chat = TelegramChat.objects.create(tg_id=-1001, type="supergroup", project=self.project)
+        self.chat2 = TelegramChat.objects.create(tg_id=-1002, type="channel", project=self.project)
+        self.plan = Plan.objects.create(project=self.project, name="Basic", price=Decimal("5.00"))
+        self.plan.channels.add(self.chat)
+
+    def rows(self):
+        return set(ChatEntitlement.objects.values_list("user_id", "chat_id", "valid_until"))
+
+    def test_subscription_changes_are_materialized(self):
+        ends = timezone.now() + timedelta(days=30)
+        sub = Subscription.objects.create(user=self.user, plan=self.plan, ends_at=ends)
+        self.assertEqual(self.rows(), {(self.user.pk, self.chat.pk, ends)})
+        self.assertTrue(user_has_chat_access(self.user, self.chat))
+        self.assertFalse(user_has_chat_access(self.user, self.chat2))
+
+        # вторая бессрочная подписка на тот же чат → valid_until = NULL
+        Subscription.objects.create(user=self.user, plan=self.plan)
+        self.assertEqual(self.rows(), {(self.user.pk, self.chat.pk, None)})
+
+        Subscription.objects.filter(user=self.user).exclude(pk=sub.pk).delete()
+        sub.status = "canceled"
+        sub.save(update_fields=["status"])
+        self.assertEqual(self.rows(), set())
+
+    def test_lapsed_subscription_denies_without_refresh(self):
+        Subscription.objects.create(user=self.user, plan=self.plan, ends_at=timezone.now() + timedelta(hours=1))
+        later = timezone.now() + timedelta(hours=2)
+        self.assertFalse(entitlements.has_access(self.user.pk, self.chat.pk, at=later))
+
+    def test_plan_channel_set_changes_are_materialized(self):
+        Subscription.objects.create(user=self.user, plan=self.plan)
+        self.plan.channels.add(self.chat2)
+        self.assertEqual({r[1] for r in self.rows()}, {self.chat.pk, self.chat2.pk})
+        self.plan.channels.remove(self.chat)
+        self.assertEqual({r[1] for r in self.rows()}, {self.chat2.pk})
+        self.plan.channels.clear()
+        self.assertEqual(self.rows(), set())
+        PlanChannel.objects.create(plan=self.plan, chat=self.chat)
+        self.assertEqual({r[1] for r in self.rows()}, {self.chat.pk})
+
+    def test_rebuild_command_detects_and_repairs_drift(self):
+        Subscription.objects.create(user=self.user, plan=self.plan)
+        call_command("rebuild_entitlements", "--check", stdout=StringIO())
+
+        ChatEntitlement.objects.all().delete()
+        ChatEntitlement.objects.create(user=self.owner, chat=self.chat2)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_entitlements", "--check", stdout=StringIO())
+        call_command("rebuild_entitlements", stdout=StringIO())
+        self.assertEqual(self.rows(), {(self.user.pk, self.chat.pk, None)})
+
+    def test_access_view_uses_entitlements(self):
+        Subscription.objects.create(user=self.user, plan=self.plan)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.assertNumQueries(2):  # чат + lookup права
+            r = client.get(f"/api/chats/{self.chat.pk}/access/")
+        self.assertEqual(r.json(), {"chat_id": self.chat.pk, "allowed": True})
+
+    def test_access_decisions_are_cached_and_invalidated(self):
+        sub = Subscription.objects.create(user=self.user, plan=self.plan)
+        self.assertTrue(access_cache.has_access(self.user.pk, self.chat.pk))
+        with self.assertNumQueries(0):
+            self.assertTrue(access_cache.has_access(self.user.pk, self.chat.pk))
+            self.assertTrue(access_cache.has_access(self.user.pk, self.chat.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sub.status = "canceled"
+            sub.save(update_fields=["status"])
+        self.assertFalse(access_cache.has_access(self.user.pk, self.chat.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plan.channels.add(self.chat2)   # чужой для user чат — его версия не влияет
+        with self.assertNumQueries(0):
+            self.assertFalse(access_cache.has_access(self.user.pk, self.chat.pk))
+
+    def test_cached_allow_expires_with_subscription(self):
+        Subscription.objects.create(user=self.user, plan=self.plan, ends_at=timezone.now() + timedelta(hours=1))
+        self.assertTrue(access_cache.has_access(self.user.pk, self.chat.pk))
+        later = timezone.now() + timedelta(hours=2)
+        with self.assertNumQueries(0):
+            self.assertFalse(access_cache.has_access(self.user.pk, self.chat.pk, at=later))
+
+    def test_shared_cache_is_required_with_postgres_settings(self):
+        local = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        db = {"default": {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "django_cache"}}
+        redis = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://x"}}
+        for caches in (local, db):
+            with override_settings(SHARED_CACHE_REQUIRED=True, CACHES=caches):
+                with self.assertRaises(ImproperlyConfigured):
+                    access_cache.require_shared_cache()
+        with override_settings(SHARED_CACHE_REQUIRED=True, CACHES=redis):
+            access_cache.require_shared_cache()
+
+
+class AllChannelsPlanTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="owner", password="x")
+        self.user = User.objects.create_user(username="member", password="x", telegram_id=555)
+        self.project = Project.objects.create(owner=self.owner, name="Proj")
+        self.other = Project.objects.create(owner=self.owner, name="Other")
+        self.chat = TelegramChat.objects.create(tg_id=-1001, type="supergroup", project=self.project)
+        self.plan = Plan.objects.create(project=self.project, name="All", price=Decimal("9.00"), all_channels=True)
+
+    def test_new_chat_is_covered_without_plan_channel_rows(self):
+        Subscription.objects.create(user=self.user, plan=self.plan)
+        self.assertEqual(
+            set(ProjectEntitlement.objects.values_list("user_id", "project_id")),
+            {(self.user.pk, self.project.pk)},
+        )
+        self.assertFalse(ChatEntitlement.objects.exists())
+
+        later = TelegramChat.objects.create(tg_id=-1009, type="channel", project=self.project)
+        foreign = TelegramChat.objects.create(tg_id=-1010, type="channel", project=self.other)
+        self.assertFalse(PlanChannel.objects.exists())
+        for chat, allowed in ((self.chat, True), (later, True), (foreign, False)):
+            self.assertEqual(user_has_chat_access(self.user, chat), allowed)
+            self.assertEqual(entitlements.has_access(self.user.pk, chat.pk), allowed)
+        out = list(entitlements.check_many([(None, 555, later.pk), (None, 555, foreign.pk)]))
+        self.assertEqual([r["allowed"] for r in out], [True, False])
+        self.assertEqual(list(entitlements.entitled_telegram_ids(later.pk)), [555])
+
+    def test_relinking_chat_invalidates_cached_decision(self):
+        Subscription.objects.create(user=self.user, plan=self.plan)
+        foreign = TelegramChat.objects.create(tg_id=-1010, type="channel", project=self.other)
+        self.assertFalse(access_cache.has_access(self.user.pk, foreign.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            foreign.project = self.project
+            foreign.save()
+        self.assertTrue(access_cache.has_access(self.user.pk, foreign.pk))
+
+    def test_switching_plan_mode_moves_entitlements(self):
+        self.plan.all_channels = False
+        self.plan.save()
+        self.plan.channels.add(self.chat)
+        Subscription.objects.create(user=self.user, plan=self.plan)
+        self.assertTrue(ChatEntitlement.objects.exists())
+        self.assertFalse(ProjectEntitlement.objects.exists())
+
+        self.plan.all_channels = True
+        self.plan.save()
+        self.assertFalse(ChatEntitlement.objects.exists())
+        self.assertTrue(ProjectEntitlement.objects.exists())
+
+    def test_rebuild_command_covers_project_entitlements(self):
+        Subscription.objects.create(user=self.user, plan=self.plan)
+        ProjectEntitlement.objects.all().delete()
+        with self.assertRaises(CommandError):
+            call_command("rebuild_entitlements", "--check", stdout=StringIO())
+        call_command("rebuild_entitlements", stdout=StringIO())
+        self.assertTrue(ProjectEntitlement.objects.filter(user=self.user, project=self.project).exists())
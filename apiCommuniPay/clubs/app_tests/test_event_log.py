@@ -0,0 +1,114 @@
+import datetime as dt
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from apiCommuniPay.clubs import bulk_ops, event_log, expiry
+from apiCommuniPay.clubs.models import Plan, Subscription, SubscriptionEvent
+from apiCommuniPay.projects.models import Project
+
+User = get_user_model()
+Kind = SubscriptionEvent.Kind
+
+
+class EventLogTests(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="x")
+        self.project = Project.objects.create(owner=self.owner, name="Proj")
+        self.plan = Plan.objects.create(project=self.project, name="A", price=Decimal("5.00"))
+        self.other = Plan.objects.create(project=self.project, name="B", price=Decimal("5.00"))
+        self.user = User.objects.create_user(username="u", password="x")
+
+    def kinds(self, sub):
+        return list(
+            SubscriptionEvent.objects.filter(subscription_id=sub.pk).order_by("pk").values_list("kind", flat=True)
+        )
+
+    def test_single_saves_are_logged(self):
+        sub = Subscription.objects.create(user=self.user, plan=self.plan, ends_at=timezone.now() + timedelta(days=3))
+        sub.ends_at += timedelta(days=30)
+        sub.save()
+        sub.plan = self.other
+        sub.save()
+        sub.save()   # без изменений — без события
+        sub.status = "canceled"
+        sub.save()
+        self.assertEqual(self.kinds(sub), [Kind.CREATED, Kind.ACTIVATED, Kind.EXTENDED, Kind.PLAN_CHANGED, Kind.CANCELED])
+        changed = SubscriptionEvent.objects.get(subscription_id=sub.pk, kind=Kind.PLAN_CHANGED)
+        self.assertEqual((changed.prev_plan_id, changed.plan_id), (self.plan.pk, self.other.pk))
+
+    def test_bulk_paths_are_logged(self):
+        now = timezone.now()
+        due = Subscription.objects.create(user=self.user, plan=self.plan, ends_at=now - timedelta(minutes=1))
+        live = Subscription.objects.create(user=self.owner, plan=self.plan, ends_at=now + timedelta(days=1))
+        expiry.expire_batch(now)
+        bulk_ops.migrate(self.plan, self.other)
+        self.assertEqual(self.kinds(due), [Kind.CREATED, Kind.ACTIVATED, Kind.EXPIRED])
+        self.assertEqual(self.kinds(live), [Kind.CREATED, Kind.ACTIVATED, Kind.PLAN_CHANGED])
+
+    def test_log_survives_subscription_delete_and_old_rows_drop(self):
+        sub = Subscription.objects.create(user=self.user, plan=self.plan)
+        pk = sub.pk
+        sub.delete()
+        self.assertEqual(
+            list(SubscriptionEvent.objects.filter(subscription_id=pk).order_by("pk").values_list("kind", flat=True)),
+            [Kind.CREATED, Kind.ACTIVATED, Kind.DELETED],
+        )
+
+        SubscriptionEvent.objects.update(created_at=timezone.now() - timedelta(days=70))
+        event_log.record(Kind.CREATED, [(999, self.user.pk, self.plan.pk, "active", None)])
+        this_month = timezone.localdate().replace(day=1)
+        out = StringIO()
+        call_command("partition_subscription_events", "--drop-before", f"{this_month:%Y-%m}", stdout=out)
+        self.assertIn("dropped 3 rows", out.getvalue())
+        self.assertEqual(list(SubscriptionEvent.objects.values_list("subscription_id", flat=True)), [999])
+
+
+class PartitionSqlTests(APITestCase):
+    """Postgres здесь нет — проверяем порядок SQL на записывающем курсоре."""
+
+    def ensure(self, stray_by_month):
+        statements = []
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params=None):
+                if "SAVEPOINT" not in sql:   # transaction.atomic() в тестовой транзакции
+                    statements.append(" ".join(sql.split()))
+                self.params = params
+
+            def fetchone(self):
+                return (stray_by_month.get(self.params[0], 0),)
+
+        with mock.patch.object(event_log, "partitioned", return_value=True), \
+                mock.patch.object(event_log, "partitions", return_value={}), \
+                mock.patch.object(event_log.connection, "cursor", return_value=Cursor()):
+            created = event_log.ensure_partitions(ahead=1, today=dt.date(2026, 1, 15))
+        return created, statements
+
+    def test_rows_in_default_are_moved_into_new_partition(self):
+        created, sql = self.ensure({"2026-02-01": 3})
+        self.assertEqual(created, [event_log.partition_name(dt.date(2026, 1, 1)), event_log.partition_name(dt.date(2026, 2, 1))])
+        feb = sql[sql.index(next(q for q in sql if "DETACH PARTITION" in q)):]
+        self.assertEqual(
+            [q.split(" (")[0].split(" SELECT")[0] for q in feb],
+            [
+                f"ALTER TABLE {event_log.TABLE} DETACH PARTITION {event_log.DEFAULT}",
+                f"CREATE TABLE IF NOT EXISTS {event_log.partition_name(dt.date(2026, 2, 1))} PARTITION OF {event_log.TABLE} FOR VALUES FROM",
+                f"INSERT INTO {event_log.TABLE}",
+                f"DELETE FROM {event_log.DEFAULT} WHERE created_at >= %s AND created_at < %s",
+                f"ALTER TABLE {event_log.TABLE} ATTACH PARTITION {event_log.DEFAULT} DEFAULT",
+            ],
+        )
+        self.assertEqual(sum("DETACH" in q for q in sql), 1)   # январь — без переноса
@@ -0,0 +1,73 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from apiCommuniPay.clubs import expiry
+from apiCommuniPay.clubs.models import ChatEntitlement, Plan, PlanSeats, Subscription, TelegramAction
+from apiCommuniPay.common.models import TelegramChat
+from apiCommuniPay.projects.models import Project
+
+User = get_user_model()
+
+
+class ExpiryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="owner", password="x")
+        self.project = Project.objects.create(owner=self.owner, name="Proj")
+        self.chat = TelegramChat.objects.create(
+            tg_id=-1001, type="supergroup", project=self.project, status=TelegramChat.ChatStatus.ACTIVE,
+        )
+        self.plan = Plan.objects.create(project=self.project, name="Basic", price=Decimal("5.00"))
+        self.plan.channels.add(self.chat)
+        self.now = timezone.now()
+
+    def subscribe(self, name, ends_at, telegram_id=None):
+        user = User.objects.create_user(username=name, password="x", telegram_id=telegram_id)
+        return Subscription.objects.create(user=user, plan=self.plan, ends_at=ends_at)
+
+    def test_expires_due_subscriptions_in_batches(self):
+        due = [self.subscribe(f"u{i}", self.now - timedelta(minutes=i + 1)) for i in range(5)]
+        alive = self.subscribe("alive", self.now + timedelta(days=1))
+
+        stats = expiry.tick(self.now, batch_size=2, max_batches=2)
+        self.assertEqual((stats["batches"], stats["expired"]), (2, 4))
+
+        stats = expiry.tick(self.now, batch_size=2, max_batches=10, kick=False)
+        self.assertEqual((stats["batches"], stats["expired"]), (1, 1))
+        self.assertEqual(
+            set(Subscription.objects.filter(status="expired").values_list("pk", flat=True)),
+            {s.pk for s in due},
+        )
+        alive.refresh_from_db()
+        self.assertEqual(alive.status, "active")
+        self.assertEqual(set(ChatEntitlement.objects.values_list("user_id", flat=True)), {alive.user_id})
+        self.assertEqual(PlanSeats.objects.get(plan=self.plan).used, 1)
+
+    def test_kicks_only_members_who_lost_access(self):
+        # права материализованы, пока подписки ещё действовали
+        self.subscribe("lost", self.now + timedelta(hours=1), telegram_id=111)
+        kept = self.subscribe("kept", self.now + timedelta(hours=1), telegram_id=222)
+        Subscription.objects.create(user=kept.user, plan=self.plan, ends_at=self.now + timedelta(days=3))
+
+        with mock.patch("apiCommuniPay.clubs.telegram_outbox.tg") as tg:
+            stats = expiry.tick(self.now + timedelta(hours=2))
+        self.assertEqual((stats["expired"], stats["revoked"], stats["queued"]), (2, 1, 1))
+        tg.kick_chat_member.assert_not_called()   # только очередь, Bot API — у relay
+        self.assertEqual(
+            list(TelegramAction.objects.values_list("kind", "chat_tg_id", "user_tg_id", "status")),
+            [("kick", self.chat.tg_id, 111, "pending")],
+        )
+
+    def test_command_runs_single_pass(self):
+        self.subscribe("u", self.now - timedelta(hours=1))
+        out = StringIO()
+        call_command("expire_subscriptions", "--no-kick", stdout=out)
+        self.assertIn("Expired: 1", out.getvalue())
@@ -0,0 +1,63 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from apiCommuniPay.clubs import join_requests
+from apiCommuniPay.clubs.models import JoinRequest, Plan, Subscription, TelegramAction
+from apiCommuniPay.common.models import TelegramChat
+from apiCommuniPay.projects.models import Project
+
+User = get_user_model()
+
+
+class JoinRequestWorkerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create_user(username="owner", password="x")
+        project = Project.objects.create(owner=owner, name="Proj")
+        self.chat = TelegramChat.objects.create(
+            tg_id=-1001, type="supergroup", project=project, status=TelegramChat.ChatStatus.ACTIVE,
+        )
+        self.plan = Plan.objects.create(project=project, name="Basic", price=Decimal("5.00"))
+        self.plan.channels.add(self.chat)
+        self.users = {tg: User.objects.create_user(username=f"u{tg}", password="x", telegram_id=tg) for tg in range(1, 6)}
+        Subscription.objects.create(user=self.users[1], plan=self.plan)
+        Subscription.objects.create(user=self.users[2], plan=self.plan)
+        Subscription.objects.create(user=self.users[3], plan=self.plan, status="pending")   # ждёт оплаты
+        self.requests = {
+            tg: JoinRequest.objects.create(user=u, chat=self.chat, plan=self.plan) for tg, u in self.users.items()
+        }
+
+    def status(self, tg):
+        return JoinRequest.objects.get(pk=self.requests[tg].pk).status
+
+    def test_tick_decides_in_batches(self):
+        with mock.patch("apiCommuniPay.clubs.telegram_outbox.tg") as tg, \
+                self.assertNumQueries(3 * 7):    # на пачку: SAVEPOINT, выборка, права, подписки, UPDATE, очередь, RELEASE
+            stats = join_requests.tick(batch_size=2)
+
+        self.assertEqual(
+            {k: stats[k] for k in ("batches", "claimed", "confirmed", "rejected", "waiting")},
+            {"batches": 3, "claimed": 5, "confirmed": 2, "rejected": 2, "waiting": 1},
+        )
+        tg.approve_chat_join_request.assert_not_called()   # Bot API — только у relay
+        self.assertEqual(
+            sorted(TelegramAction.objects.values_list("kind", "chat_tg_id", "user_tg_id")),
+            [("approve", -1001, 1), ("approve", -1001, 2), ("decline", -1001, 4), ("decline", -1001, 5)],
+        )
+        self.assertEqual(
+            [self.status(tg) for tg in range(1, 6)],
+            ["confirmed", "confirmed", "pending", "rejected", "rejected"],
+        )
+        self.assertIsNotNone(JoinRequest.objects.get(pk=self.requests[1].pk).confirmed_at)
+
+    def test_decided_rows_are_not_claimed_again(self):
+        first = join_requests.process_batch(batch_size=10)
+        again = join_requests.process_batch(batch_size=10)
+        self.assertEqual((first["confirmed"], first["rejected"]), (2, 2))
+        # остались только ждущие оплаты — новых действий для Telegram нет
+        self.assertEqual((again["claimed"], again["confirmed"], again["rejected"]), (1, 0, 0))
+        self.assertEqual(TelegramAction.objects.count(), 4)
@@ -0,0 +1,142 @@
+import itertools
+import json
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from apiCommuniPay.clubs import access_cache, payments
+from apiCommuniPay.clubs.models import JoinRequest, Payment, PaymentCallback, Plan, PlanSeats, Subscription
+from apiCommuniPay.common.models import TelegramChat
+from apiCommuniPay.common.services import PaymentNotification, PaymentResult
+from apiCommuniPay.projects.models import Project
+
+User = get_user_model()
+
+
+class DummyProvider:
+    """Подпись — заголовок X-Signature: ok; тело — {"id": ..., "status": ...}."""
+    ids = itertools.count(1)
+
+    def create_payment(self, amount, currency, meta):
+        return PaymentResult(ok=True, provider_payment_id=f"pay-{next(self.ids)}", raw={"url": "https://pay.example"})
+
+    def verify_signature(self, request):
+        return request.headers.get("X-Signature") == "ok"
+
+    def parse_notification(self, request):
+        body = json.loads(request.body)
+        return [PaymentNotification(provider_payment_id=body["id"], status=body["status"], raw=body)]
+
+
+@override_settings(
+    PAYMENT_PROVIDERS={"dummy": "apiCommuniPay.clubs.app_tests.test_payments.DummyProvider"},
+    PAYMENT_DEFAULT_PROVIDER="dummy",
+)
+class PaymentPipelineTests(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="x")
+        self.project = Project.objects.create(owner=self.owner, name="Proj")
+        self.chat = TelegramChat.objects.create(tg_id=-1001, type="supergroup", project=self.project)
+        self.plan = Plan.objects.create(project=self.project, name="Basic", price=Decimal("5.00"), limit=1)
+        self.plan.channels.add(self.chat)
+        self.users = [User.objects.create_user(username=f"u{i}", password="x") for i in range(2)]
+
+    def notify(self, payment_id, status, signature="ok"):
+        return self.client.post(
+            "/api/payments/webhook/dummy/", {"id": payment_id, "status": status},
+            format="json", HTTP_X_SIGNATURE=signature,
+        )
+
+    def test_checkout_callback_activates_and_confirms(self):
+        self.client.force_authenticate(self.users[0])
+        r = self.client.post("/api/payments/checkout/", {"plan": self.plan.pk}, format="json")
+        self.assertEqual(r.status_code, 201, r.content)
+        sub = Subscription.objects.get(pk=r.data["subscription"])
+        self.assertEqual(sub.status, "pending")
+        jr = JoinRequest.objects.create(user=self.users[0], chat=self.chat, plan=self.plan)
+
+        self.assertEqual(self.notify(r.data["provider_payment_id"], "succeeded").status_code, 200)
+        self.assertEqual(self.notify(r.data["provider_payment_id"], "succeeded").status_code, 200)   # повтор
+        self.assertEqual(self.notify(r.data["provider_payment_id"], "failed").status_code, 200)      # запоздавший
+        self.assertEqual(PaymentCallback.objects.count(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = payments.tick()
+        self.assertEqual(stats["activated"], 1)
+        self.assertEqual(stats["confirmed"], 1)
+        sub.refresh_from_db()
+        jr.refresh_from_db()
+        self.assertEqual(sub.status, "active")
+        self.assertEqual(jr.status, "confirmed")
+        self.assertEqual(Payment.objects.get().status, "succeeded")
+        self.assertEqual(PlanSeats.objects.get(plan=self.plan).used, 1)
+        self.assertTrue(access_cache.has_access(self.users[0].pk, self.chat.pk))
+        self.assertFalse(PaymentCallback.objects.filter(processed_at__isnull=True).exists())
+
+    def test_activation_starts_paid_period_and_direct_create_is_refused(self):
+        monthly = Plan.objects.create(project=self.project, name="Monthly", price=Decimal("5.00"), period_days=30)
+        self.client.force_authenticate(self.users[1])
+        r = self.client.post("/api/subscriptions/", {"plan": monthly.pk, "status": "active"}, format="json")
+        self.assertEqual(r.status_code, 405)
+        self.assertFalse(Subscription.objects.exists())
+
+        payment, _ = payments.start_checkout(self.users[1], monthly)
+        payments.ingest("dummy", [PaymentNotification(payment.provider_payment_id, "succeeded")])
+        payments.tick()
+        sub = Subscription.objects.get(pk=payment.subscription_id)
+        self.assertEqual(sub.status, "active")
+        self.assertEqual(sub.ends_at - sub.updated_at, payments.dt.timedelta(days=30))
+
+    def test_provider_exception_fails_checkout(self):
+        with mock.patch.object(DummyProvider, "create_payment", side_effect=TimeoutError):
+            payment, res = payments.start_checkout(self.users[0], self.plan)
+        self.assertFalse(res.ok)
+        self.assertEqual(Payment.objects.get().status, "failed")
+        self.assertEqual(Subscription.objects.get(pk=payment.subscription_id).status, "canceled")
+
+    def test_bad_signature_is_rejected(self):
+        self.assertEqual(self.notify("pay-x", "succeeded", signature="nope").status_code, 403)
+        self.assertFalse(PaymentCallback.objects.exists())
+
+    def test_sold_out_and_failed_payments(self):
+        first, _ = payments.start_checkout(self.users[0], self.plan)
+        second, _ = payments.start_checkout(self.users[1], self.plan)
+        payments.ingest("dummy", [
+            PaymentNotification(first.provider_payment_id, "succeeded"),
+            PaymentNotification(second.provider_payment_id, "succeeded"),
+        ])
+        stats = payments.tick()
+        self.assertEqual((stats["activated"], stats["sold_out"]), (1, 1))
+        second.refresh_from_db()
+        self.assertEqual(second.status, "sold_out")
+        self.assertEqual(Subscription.objects.get(pk=second.subscription_id).status, "canceled")
+        self.assertEqual(PlanSeats.objects.get(plan=self.plan).used, 1)
+
+    def test_paid_after_cancel_is_flagged_for_refund(self):
+        payment, _ = payments.start_checkout(self.users[0], self.plan)
+        Subscription.objects.filter(pk=payment.subscription_id).update(status="canceled")   # отменил, не дождавшись
+        payments.ingest("dummy", [PaymentNotification(payment.provider_payment_id, "succeeded")])
+        with self.assertLogs("clubs.payments", "WARNING"):
+            stats = payments.tick()
+        self.assertEqual((stats["activated"], stats["refund"]), (0, 1))
+        self.assertEqual(Payment.objects.get().status, "refund")
+        self.assertEqual(Subscription.objects.get(pk=payment.subscription_id).status, "canceled")
+        self.assertFalse(PlanSeats.objects.filter(plan=self.plan, used__gt=0).exists())
+
+    def test_waiting_orphans_do_not_block_later_callbacks(self):
+        payments.ingest("dummy", [PaymentNotification(f"pay-missing-{i}", "succeeded") for i in range(2)])
+        payment, _ = payments.start_checkout(self.users[0], self.plan)
+        payments.ingest("dummy", [PaymentNotification(payment.provider_payment_id, "succeeded")])
+        stats = payments.tick(batch_size=2)
+        self.assertEqual((stats["batches"], stats["claimed"], stats["callbacks"], stats["activated"]), (2, 3, 1, 1))
+        self.assertEqual(PaymentCallback.objects.filter(processed_at__isnull=True).count(), 2)
+
+    def test_unknown_payment_waits_then_errors(self):
+        payments.ingest("dummy", [PaymentNotification("pay-missing", "succeeded")])
+        self.assertEqual(payments.tick()["callbacks"], 0)
+        late = PaymentCallback.objects.get().received_at + payments.dt.timedelta(seconds=payments.ORPHAN_GRACE + 1)
+        payments.tick(now=late)
+        self.assertEqual(PaymentCallback.objects.get().error, "unknown payment")
@@ -0,0 +1,84 @@
+import json
+from array import array
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from apiCommuniPay.clubs import reconcile
+from apiCommuniPay.clubs.models import JoinRequest, Plan, Subscription, TelegramAction
+from apiCommuniPay.common.models import ChatMember, TelegramChat
+from apiCommuniPay.projects.models import Project
+
+User = get_user_model()
+
+
+class SortedSetOpsTests(TestCase):
+    def test_difference_and_intersection(self):
+        a, b = reconcile.sorted_ids([5, 1, 3, 3, 9]), reconcile.sorted_ids([3, 4, 9, 10])
+        self.assertEqual(a, array("q", [1, 3, 5, 9]))
+        self.assertEqual(reconcile.difference(a, b), array("q", [1, 5]))
+        self.assertEqual(reconcile.intersection(a, b), array("q", [3, 9]))
+
+
+class ReconcileTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create_user(username="owner", password="x")
+        project = Project.objects.create(owner=owner, name="Proj")
+        self.chat = TelegramChat.objects.create(
+            tg_id=-1001, type="supergroup", project=project, status=TelegramChat.ChatStatus.ACTIVE,
+        )
+        self.plan = Plan.objects.create(project=project, name="Basic", price=Decimal("5.00"))
+        self.plan.channels.add(self.chat)
+        self.users = {tg: User.objects.create_user(username=f"u{tg}", password="x", telegram_id=tg) for tg in (1, 2, 3, 4)}
+        for tg in (1, 2, 4):                       # 1, 2, 4 оплатили; 3 — нет
+            Subscription.objects.create(user=self.users[tg], plan=self.plan)
+        for tg, status in ((1, "member"), (3, "member"), (7, "administrator")):
+            ChatMember.objects.create(chat=self.chat, tg_user_id=tg, status=status)
+        for tg in (2, 3):                          # заявки: 2 оплатил, 3 — нет
+            JoinRequest.objects.create(user=self.users[tg], chat=self.chat, plan=self.plan)
+
+    def test_plan_computes_minimal_sets(self):
+        diff = reconcile.plan(self.chat)
+        self.assertEqual(list(diff.kick), [3])
+        self.assertEqual(list(diff.approve), [2])
+
+    def test_apply_queues_actions_only_for_diff(self):
+        with mock.patch("apiCommuniPay.clubs.telegram_outbox.tg") as tg:
+            diff = reconcile.reconcile(self.chat)
+        tg.kick_chat_member.assert_not_called()   # Bot API — только у relay
+        self.assertEqual(
+            sorted(TelegramAction.objects.values_list("kind", "chat_tg_id", "user_tg_id")),
+            [("approve", -1001, 2), ("kick", -1001, 3)],
+        )
+        self.assertEqual((diff.kicked, diff.approved), (1, 1))
+        self.assertFalse(ChatMember.objects.filter(tg_user_id=3).exists())
+        self.assertEqual(JoinRequest.objects.get(user=self.users[2]).status, "confirmed")
+        self.assertEqual(JoinRequest.objects.get(user=self.users[3]).status, "pending")
+
+        # повторный прогон: расхождений нет — ничего не ставится
+        ChatMember.objects.create(chat=self.chat, tg_user_id=2)
+        diff = reconcile.reconcile(self.chat)
+        self.assertEqual((len(diff.kick), len(diff.approve)), (0, 0))
+        self.assertEqual(TelegramAction.objects.count(), 2)
+
+    def test_webhook_chat_member_updates_snapshot(self):
+        from apiCommuniPay.common import webhook
+        update = {"chat": {"id": -1001}, "new_chat_member": {"user": {"id": 42}, "status": "member"}}
+        webhook._handle_chat_member(update)
+        self.assertTrue(ChatMember.objects.filter(chat=self.chat, tg_user_id=42).exists())
+        update["new_chat_member"]["status"] = "left"
+        webhook._handle_chat_member(update)
+        self.assertFalse(ChatMember.objects.filter(chat=self.chat, tg_user_id=42).exists())
+
+    def test_command_dry_run(self):
+        out = StringIO()
+        call_command("reconcile_members", "--dry-run", stdout=out)
+        self.assertFalse(TelegramAction.objects.exists())
+        totals = json.loads(out.getvalue().strip().splitlines()[-1])
+        self.assertEqual((totals["kick"], totals["approve"], totals["kicked"]), (1, 1, 0))
@@ -0,0 +1,150 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apiCommuniPay.clubs import payments, renewal
+from apiCommuniPay.clubs.models import ChatEntitlement, Payment, Plan, PlanSeats, RenewalRun, Subscription
+from apiCommuniPay.clubs.serializers import PlanSerializer
+from apiCommuniPay.common import services
+from apiCommuniPay.common.services import PaymentNotification
+from apiCommuniPay.common.models import TelegramChat
+from apiCommuniPay.projects.models import Project
+
+User = get_user_model()
+
+
+@override_settings(
+    PAYMENT_PROVIDERS={"fake": "apiCommuniPay.common.fake_payments.FakePaymentProvider"},
+    PAYMENT_DEFAULT_PROVIDER="fake",
+)
+class RenewalTests(TestCase):
+    def setUp(self):
+        services._providers.clear()
+        self.provider = services.get_provider("fake")
+        owner = User.objects.create_user(username="owner", password="x")
+        project = Project.objects.create(owner=owner, name="Proj")
+        self.chat = TelegramChat.objects.create(tg_id=-1001, type="supergroup", project=project)
+        self.monthly = Plan.objects.create(project=project, name="Monthly", price=Decimal("5.00"), period_days=30)
+        self.monthly.channels.add(self.chat)
+        once = Plan.objects.create(project=project, name="Once", price=Decimal("5.00"))
+
+        soon = timezone.now() + timedelta(minutes=10)
+        self.subs = [
+            Subscription.objects.create(
+                user=User.objects.create_user(username=f"u{i}", password="x"),
+                plan=self.monthly, ends_at=soon + timedelta(seconds=i),
+            )
+            for i in range(5)
+        ]
+        Subscription.objects.create(user=self.subs[0].user, plan=once, ends_at=soon)
+        Subscription.objects.create(user=self.subs[1].user, plan=self.monthly, ends_at=soon + timedelta(days=10))
+        self.run = RenewalRun.objects.create(cutoff=timezone.now() + timedelta(hours=1))
+
+    def ends(self):
+        return [Subscription.objects.get(pk=s.pk).ends_at for s in self.subs]
+
+    def deliver(self):
+        """Уведомления фейкового провайдера → очередь → обработчик."""
+        payments.ingest("fake", [
+            PaymentNotification(str(body["id"]), body["status"])
+            for body in (json.loads(raw) for raw, _ in self.provider.drain())
+        ])
+        return payments.tick()
+
+    def test_renews_due_recurring_subscriptions_in_chunks(self):
+        before = self.ends()
+        run = renewal.run(self.run, chunk_size=2, concurrency=3)
+        self.assertIsNotNone(run.finished_at)
+        self.assertEqual((run.charged, run.failed, run.skipped), (5, 0, 0))
+        # платёж создан, но не оплачен — срок сдвигает только уведомление
+        self.assertEqual(self.ends(), before)
+        self.assertEqual(Payment.objects.filter(status="pending").count(), 5)
+
+        self.assertEqual(self.deliver()["renewed"], 5)
+        self.assertEqual([a - b for a, b in zip(self.ends(), before)], [timedelta(days=30)] * 5)
+        self.assertEqual(self.provider.charges, 5)
+        self.assertEqual(Payment.objects.filter(status="succeeded").count(), 5)
+        ent = ChatEntitlement.objects.get(user=self.subs[4].user, chat=self.chat)
+        self.assertEqual(ent.valid_until, self.ends()[4])
+
+        renewal.run(RenewalRun.objects.create(cutoff=self.run.cutoff))   # повторный прогон — ничего не списывает
+        self.assertEqual(self.provider.charges, 5)
+
+    def test_resume_after_crash_does_not_double_charge(self):
+        real_write = renewal._write
+        calls = {"n": 0}
+
+        def crash_second(*args):
+            calls["n"] += 1
+            if calls["n"] == 2:
+                raise RuntimeError("worker died")
+            return real_write(*args)
+
+        # LEASE=0 — к возобновлению аренда упавшего процесса уже истекла
+        with mock.patch.object(renewal, "_write", side_effect=crash_second), mock.patch.object(renewal, "LEASE", 0):
+            with self.assertRaises(RuntimeError):
+                renewal.run(self.run, chunk_size=2)
+        self.run.refresh_from_db()
+        self.assertEqual(self.run.charged, 2)
+        self.assertEqual(self.provider.charges, 4)   # вторая пачка списана, но не записана
+
+        run = renewal.run(chunk_size=2)   # продолжает незавершённый прогон
+        self.assertEqual(run.pk, self.run.pk)
+        self.assertEqual(run.charged, 5)
+        self.assertEqual(self.provider.charges, 5)
+        self.assertEqual(Payment.objects.count(), 5)
+
+    def test_concurrent_run_skips_claimed_payments(self):
+        items = renewal.due_chunk(self.run)
+        renewal._prepare(items, "fake")
+        renewal._claim(items[:3], timezone.now())   # второй процесс `renew` уже взял три платежа
+        run = renewal.run(RenewalRun.objects.create(cutoff=self.run.cutoff))
+        self.assertEqual((run.charged, run.skipped), (2, 3))
+        self.assertEqual(self.provider.charges, 2)
+
+    def test_zero_period_plan_is_not_charged(self):
+        self.assertFalse(PlanSerializer(self.monthly, data={"period_days": 0}, partial=True).is_valid())
+        Plan.objects.filter(pk=self.monthly.pk).update(period_days=0)   # старые данные в обход API
+        run = renewal.run(self.run)
+        self.assertEqual((run.charged, self.provider.charges), (0, 0))
+        self.assertFalse(Payment.objects.exists())
+
+    def test_failed_charge_leaves_subscription_to_lapse(self):
+        self.provider.configure(failure_rate=1.0)
+        before = self.ends()
+        run = renewal.run(self.run)
+        self.assertEqual((run.charged, run.failed), (0, 5))
+        self.assertEqual(self.ends(), before)
+        self.assertEqual(Payment.objects.filter(status="failed").count(), 5)
+
+    def test_declined_renewal_is_not_extended(self):
+        self.provider.configure(decline_rate=1.0)
+        before = self.ends()
+        self.assertEqual(renewal.run(self.run).charged, 5)
+        self.assertEqual(self.deliver()["renewed"], 0)
+        self.assertEqual(self.ends(), before)
+        self.assertEqual(Payment.objects.filter(status="failed").count(), 5)
+
+    def test_success_after_lapse_reactivates(self):
+        renewal.run(self.run)
+        before = self.ends()
+        Subscription.objects.filter(pk=self.subs[0].pk).update(status="expired")   # уведомление опоздало
+        self.assertEqual(self.deliver()["renewed"], 5)
+        sub = Subscription.objects.get(pk=self.subs[0].pk)
+        self.assertEqual((sub.status, sub.ends_at), ("active", before[0] + timedelta(days=30)))
+
+    def test_inapplicable_renewal_takes_no_seat(self):
+        renewal.run(self.run)
+        Subscription.objects.filter(pk=self.subs[0].pk).update(status="expired")
+        Plan.objects.filter(pk=self.monthly.pk).update(period_days=None)   # продлевать больше не на что
+        used = PlanSeats.objects.filter(plan=self.monthly).values_list("used", flat=True).first()
+        with self.assertLogs("clubs.payments", "WARNING"):
+            stats = self.deliver()
+        self.assertEqual((stats["renewed"], stats["refund"]), (0, 5))
+        self.assertEqual(PlanSeats.objects.filter(plan=self.monthly).values_list("used", flat=True).first(), used)
+        self.assertEqual(Subscription.objects.get(pk=self.subs[0].pk).status, "expired")
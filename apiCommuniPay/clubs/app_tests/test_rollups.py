@@ -0,0 +1,119 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from apiCommuniPay.clubs import bulk_ops, expiry, rollups
+from apiCommuniPay.clubs.models import Plan, PlanDailyStats, Subscription, SubscriptionEvent
+from apiCommuniPay.projects.models import Project
+
+User = get_user_model()
+
+
+class RollupTests(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="x")
+        self.project = Project.objects.create(owner=self.owner, name="Proj")
+        self.plan = Plan.objects.create(project=self.project, name="A", price=Decimal("10.00"))
+        self.yearly = Plan.objects.create(project=self.project, name="Y", price=Decimal("120.00"), period_days=360)
+        self.users = [User.objects.create_user(username=f"u{i}", password="x") for i in range(4)]
+        self.today = timezone.localdate()
+
+    def row(self, plan):
+        return PlanDailyStats.objects.get(plan=plan, day=self.today)
+
+    def counters(self, plan):
+        r = self.row(plan)
+        return r.active, r.new, r.churned, r.mrr
+
+    def test_incremental_counters(self):
+        now = timezone.now()
+        subs = [Subscription.objects.create(user=u, plan=self.plan, ends_at=now + timedelta(days=5)) for u in self.users[:3]]
+        Subscription.objects.create(user=self.users[3], plan=self.plan, status="pending")
+        self.assertEqual(self.counters(self.plan), (3, 3, 0, Decimal("30.00")))
+
+        subs[0].status = "canceled"
+        subs[0].save()
+        Subscription.objects.filter(pk=subs[1].pk).update(ends_at=now - timedelta(seconds=1))
+        expiry.expire_batch(now)
+        self.assertEqual(self.counters(self.plan), (1, 3, 2, Decimal("10.00")))
+
+        bulk_ops.migrate(self.plan, self.yearly)
+        self.assertEqual(self.counters(self.plan), (0, 3, 2, Decimal("0.00")))
+        self.assertEqual(self.counters(self.yearly), (1, 0, 0, Decimal("10.00")))   # 120 / 360 * 30
+
+        self.yearly.price = Decimal("240.00")
+        self.yearly.save()
+        self.assertEqual(self.row(self.yearly).mrr, Decimal("20.00"))
+
+    def test_delete_and_back_to_pending_leave_active_count(self):
+        subs = [Subscription.objects.create(user=u, plan=self.plan) for u in self.users[:3]]
+        subs[0].delete()
+        subs[1].status = "pending"
+        subs[1].save()
+        self.users[2].delete()   # подписка удаляется каскадом
+        self.assertEqual(self.counters(self.plan), (0, 3, 3, Decimal("0.00")))
+        self.assertEqual(
+            sorted(SubscriptionEvent.objects.exclude(kind__in=("created", "activated")).values_list("kind", "prev_status")),
+            [("deleted", "active"), ("deleted", "active"), ("suspended", "active")],
+        )
+
+    def test_series_carries_days_forward(self):
+        d0 = self.today - timedelta(days=3)
+        PlanDailyStats.objects.create(project=self.project, plan=self.plan, day=d0 - timedelta(days=5), active=4, new=4, mrr=40)
+        PlanDailyStats.objects.create(project=self.project, plan=self.plan, day=d0 + timedelta(days=1), active=3, new=1, churned=2, mrr=30)
+        PlanDailyStats.objects.create(project=self.project, plan=self.yearly, day=d0 + timedelta(days=2), active=1, new=1, mrr=10)
+
+        days = rollups.series(self.project, d0, d0 + timedelta(days=3))
+        self.assertEqual([d["active"] for d in days], [4, 3, 4, 4])
+        self.assertEqual([d["mrr"] for d in days], ["40.00", "30.00", "40.00", "40.00"])
+        self.assertEqual(days[1]["churn_rate"], 0.5)
+        self.assertEqual(days[0]["new"], 0)
+
+        self.client.force_authenticate(self.owner)
+        r = self.client.get(
+            f"/api/projects/{self.project.pk}/stats/daily/", {"from": d0.isoformat(), "to": self.today.isoformat()},
+        )
+        self.assertEqual(r.status_code, 200, r.content)
+        self.assertEqual(len(r.data["days"]), 4)
+        self.client.force_authenticate(self.users[0])
+        self.assertEqual(self.client.get(f"/api/projects/{self.project.pk}/stats/daily/").status_code, 403)
+
+    def test_backfill_matches_incremental(self):
+        subs = [Subscription.objects.create(user=u, plan=self.plan) for u in self.users]
+        subs[0].status = "canceled"
+        subs[0].save()
+        incremental = self.counters(self.plan)
+
+        PlanDailyStats.objects.all().delete()
+        out = StringIO()
+        call_command("rebuild_plan_stats", "--project", str(self.project.pk), stdout=out)
+        self.assertEqual(self.counters(self.plan), incremental)
+        self.assertIn("Rows written: 1", out.getvalue())
+
+    def test_rebuild_dates_new_and_churn_from_the_log(self):
+        now = timezone.now()
+        paid_later = Subscription.objects.create(user=self.users[0], plan=self.plan, status="pending")
+        paid_later.status = "active"
+        paid_later.save()
+        Subscription.objects.filter(pk=paid_later.pk).update(starts_at=now - timedelta(days=3))
+        SubscriptionEvent.objects.filter(kind="created").update(created_at=now - timedelta(days=3))   # оформил
+        SubscriptionEvent.objects.filter(kind="activated").update(created_at=now - timedelta(days=2))   # оплатил
+
+        legacy = Subscription.objects.create(user=self.users[1], plan=self.plan)   # старше журнала
+        SubscriptionEvent.objects.filter(subscription_id=legacy.pk).delete()
+        Subscription.objects.filter(pk=legacy.pk).update(
+            status="canceled", starts_at=now - timedelta(days=5), updated_at=now - timedelta(days=1),
+        )
+
+        PlanDailyStats.objects.all().delete()
+        rollups.rebuild(Plan.objects.filter(pk=self.plan.pk))
+        day = lambda n: timezone.localdate(now - timedelta(days=n))
+        self.assertEqual(
+            list(PlanDailyStats.objects.filter(plan=self.plan).order_by("day").values_list("day", "active", "new", "churned")),
+            [(day(5), 1, 1, 0), (day(2), 2, 1, 0), (day(1), 1, 0, 1)],
+        )
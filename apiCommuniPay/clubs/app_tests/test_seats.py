@@ -0,0 +1,53 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from apiCommuniPay.clubs import seats
+from apiCommuniPay.clubs.models import Plan, PlanSeats, Subscription
+from apiCommuniPay.projects.models import Project
+
+User = get_user_model()
+
+
+class SeatTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="x")
+        self.project = Project.objects.create(owner=self.owner, name="Proj")
+        self.plan = Plan.objects.create(project=self.project, name="Tiny", price=Decimal("5.00"), limit=2)
+        self.users = [User.objects.create_user(username=f"u{i}", password="x") for i in range(3)]
+
+    def used(self):
+        return PlanSeats.objects.get(plan=self.plan).used
+
+    def test_limit_is_enforced_and_seats_move_with_status(self):
+        a = Subscription.objects.create(user=self.users[0], plan=self.plan)
+        Subscription.objects.create(user=self.users[1], plan=self.plan)
+        self.assertEqual(self.used(), 2)
+        with self.assertRaises(seats.PlanSoldOut):
+            Subscription.objects.create(user=self.users[2], plan=self.plan)
+        self.assertEqual(Subscription.objects.count(), 2)
+
+        a.status = "canceled"
+        a.save(update_fields=["status"])
+        self.assertEqual(self.used(), 1)
+        Subscription.objects.create(user=self.users[2], plan=self.plan)
+        self.assertEqual(self.used(), 2)
+
+        with self.assertRaises(seats.PlanSoldOut):  # реактивация при полном тарифе
+            a.status = "active"
+            a.save(update_fields=["status"])
+        Subscription.objects.filter(user=self.users[2]).delete()
+        self.assertEqual(self.used(), 1)
+
+    def test_recount_repairs_drift(self):
+        Subscription.objects.create(user=self.users[0], plan=self.plan)
+        PlanSeats.objects.filter(plan=self.plan).update(used=7)
+        with self.assertRaises(CommandError):
+            call_command("recount_seats", "--check", stdout=StringIO())
+        self.assertEqual(self.used(), 7)
+        call_command("recount_seats", stdout=StringIO())
+        self.assertEqual(self.used(), 1)
@@ -0,0 +1,114 @@
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from apiCommuniPay.clubs import subscriber_import
+from apiCommuniPay.clubs.models import ChatEntitlement, Plan, PlanSeats, Subscription, SubscriptionEvent
+from apiCommuniPay.common.models import TelegramChat
+from apiCommuniPay.projects.models import Project
+
+User = get_user_model()
+
+
+class SubscriberImportTests(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="x")
+        self.project = Project.objects.create(owner=self.owner, name="Proj")
+        self.chat = TelegramChat.objects.create(tg_id=-1001, type="supergroup", project=self.project)
+        self.plan = Plan.objects.create(project=self.project, name="Gold", price=Decimal("5.00"), limit=3)
+        self.plan.channels.add(self.chat)
+        self.existing = User.objects.create_user(username="old", password="x", email="old@example.com", telegram_id=500)
+        self.ends = (timezone.now() + timedelta(days=30)).replace(microsecond=0)
+
+    def csv(self, rows):
+        return "telegram_id,email,plan,ends_at\n" + "".join(",".join(r) + "\n" for r in rows)
+
+    def test_import_in_chunks_with_errors(self):
+        data = self.csv([
+            ("500", "", "Gold", self.ends.isoformat()),           # существующий по telegram_id
+            ("", "new@example.com", str(self.plan.pk), ""),       # новый по email, бессрочно
+            ("600", "", "gold", self.ends.date().isoformat()),    # новый по telegram_id
+            ("", "", "Gold", ""),                                 # нет идентификатора
+            ("700", "", "Silver", ""),                            # нет такого тарифа
+            ("800", "", "Gold", "2000-01-01"),                    # уже истекла
+            ("500", "", "Gold", ""),                              # повтор — пропуск
+            ("900", "", "Gold", ""),                              # четвёртое место из трёх
+        ])
+        errors, progress = [], []
+        stats = subscriber_import.import_csv(
+            self.project, io.StringIO(data), chunk_size=2,
+            on_progress=lambda s: progress.append(s.rows), on_error=errors.append,
+        )
+        self.assertEqual(
+            (stats.rows, stats.subscriptions_created, stats.users_created, stats.skipped, stats.errors),
+            (8, 3, 3, 1, 4),
+        )
+        self.assertEqual(len(progress), stats.chunks)
+        self.assertEqual(
+            sorted((e.line, e.error) for e in errors),
+            [(5, "telegram_id or email required"), (6, "unknown plan"), (7, "ends_at in the past"), (9, "plan sold out")],
+        )
+        self.assertEqual(PlanSeats.objects.get(plan=self.plan).used, 3)
+        self.assertTrue(ChatEntitlement.objects.filter(user=self.existing, chat=self.chat).exists())
+        self.assertEqual(Subscription.objects.get(user=self.existing).ends_at, self.ends)
+        self.assertIsNone(Subscription.objects.get(user__email="new@example.com").ends_at)
+        self.assertEqual(SubscriptionEvent.objects.filter(kind="activated").count(), 3)
+
+        # повторный запуск ничего не меняет
+        again = subscriber_import.import_csv(self.project, io.StringIO(data), chunk_size=2)
+        self.assertEqual(again.subscriptions_created, 0)
+        self.assertEqual(Subscription.objects.count(), 3)
+
+    def test_matches_by_either_key_and_fills_remaining_seats(self):
+        other = User.objects.create_user(username="mail", password="x", email="mail@example.com")
+        data = self.csv([
+            ("", "old@example.com", "Gold", ""),            # существующий по email
+            ("123", "mail@example.com", "Gold", ""),        # telegram_id неизвестен — находится по email
+            ("124", "x@example.com", "Gold", ""),
+            ("125", "y@example.com", "Gold", ""),           # мест — три на четыре строки
+        ])
+        errors = []
+        stats = subscriber_import.import_csv(self.project, io.StringIO(data), on_error=errors.append)
+        self.assertEqual((stats.subscriptions_created, stats.users_created, stats.errors), (3, 2, 1))
+        self.assertEqual([(e.line, e.error) for e in errors], [(5, "plan sold out")])
+        self.assertEqual(
+            set(Subscription.objects.values_list("user_id", flat=True)),
+            {self.existing.pk, other.pk, User.objects.get(telegram_id=124).pk},
+        )
+        self.assertEqual(PlanSeats.objects.get(plan=self.plan).used, 3)
+
+    def test_endpoint_streams_progress(self):
+        upload = SimpleUploadedFile("subs.csv", self.csv([("1", "", "Gold", ""), ("x", "", "Gold", "")]).encode())
+        self.client.force_authenticate(self.existing)
+        r = self.client.post(f"/api/projects/{self.project.pk}/subscribers/import/", {"file": upload}, format="multipart")
+        self.assertEqual(r.status_code, 403)
+
+        self.client.force_authenticate(self.owner)
+        upload.seek(0)
+        r = self.client.post(f"/api/projects/{self.project.pk}/subscribers/import/", {"file": upload}, format="multipart")
+        self.assertEqual(r.status_code, 200)
+        lines = [json.loads(line) for line in b"".join(r.streaming_content).splitlines()]
+        self.assertEqual(lines[-1]["result"]["subscriptions_created"], 1)
+        self.assertEqual(lines[-1]["errors"][0]["error"], "bad telegram_id")
+        self.assertIn("progress", lines[0])
+
+    def test_command_writes_error_report(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src, report = os.path.join(tmp, "in.csv"), os.path.join(tmp, "errors.csv")
+            with open(src, "w") as f:
+                f.write(self.csv([("1", "", "Gold", ""), ("2", "", "Nope", "")]))
+            out = StringIO()
+            call_command("import_subscribers", str(self.project.pk), src, "--errors", report, stdout=out)
+            with open(report) as f:
+                self.assertEqual(f.read().splitlines()[1:], ["3,unknown plan,2,,Nope"])
+        self.assertIn('"subscriptions_created": 1', out.getvalue())
@@ -0,0 +1,120 @@
+from datetime import timedelta
+from unittest import mock
+
+import requests
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apiCommuniPay.clubs import telegram_outbox
+from apiCommuniPay.clubs.models import ChatEntitlement, TelegramAction
+from apiCommuniPay.common import tg
+from apiCommuniPay.common.models import TelegramChat
+
+Kind = TelegramAction.Kind
+
+
+def http_error(code):
+    return tg.TelegramError("approveChatJoinRequest", code, "Bad Request")
+
+
+class TelegramOutboxTests(TestCase):
+    def enqueue(self, kind, user, key=None):
+        telegram_outbox.enqueue([telegram_outbox.action(kind, -1001, user, key or f"{kind}:{user}")])
+        self.now = timezone.now()
+
+    def test_enqueue_is_transactional_and_deduplicated(self):
+        try:
+            with transaction.atomic():
+                self.enqueue(Kind.KICK, 1)
+                raise RuntimeError("rollback")
+        except RuntimeError:
+            pass
+        self.assertFalse(TelegramAction.objects.exists())
+
+        self.enqueue(Kind.KICK, 1)
+        self.enqueue(Kind.KICK, 1)
+        self.assertEqual(TelegramAction.objects.count(), 1)
+
+    def test_relay_sends_and_backs_off(self):
+        self.enqueue(Kind.KICK, 1)
+        self.enqueue(Kind.APPROVE, 2)
+        self.enqueue(Kind.DECLINE, 3)
+
+        with mock.patch("apiCommuniPay.clubs.telegram_outbox.tg") as tg:
+            tg.approve_chat_join_request.side_effect = RuntimeError("timeout")
+            tg.decline_chat_join_request.side_effect = http_error(403)
+            stats = telegram_outbox.tick(self.now, batch_size=2)
+        self.assertEqual(
+            {k: stats[k] for k in ("batches", "claimed", "sent", "failed", "retry")},
+            {"batches": 2, "claimed": 3, "sent": 1, "failed": 1, "retry": 1},
+        )
+        tg.kick_chat_member.assert_called_once_with(-1001, 1)
+        by_kind = {a.kind: a for a in TelegramAction.objects.all()}
+        self.assertEqual(by_kind["kick"].status, "sent")
+        self.assertEqual(by_kind["decline"].status, "failed")
+        retry = by_kind["approve"]
+        self.assertEqual((retry.status, retry.attempts), ("pending", 1))
+        self.assertGreater(retry.available_at, self.now)
+
+        with mock.patch("apiCommuniPay.clubs.telegram_outbox.tg") as tg:
+            self.assertEqual(telegram_outbox.tick(self.now)["claimed"], 0)   # пауза ещё не прошла
+            stats = telegram_outbox.tick(retry.available_at)
+        self.assertEqual((stats["claimed"], stats["sent"]), (1, 1))
+        tg.approve_chat_join_request.assert_called_once_with(-1001, 2)
+
+    def test_crashed_worker_lease_expires(self):
+        self.enqueue(Kind.APPROVE, 2)
+        telegram_outbox.claim(self.now)   # воркер забрал пачку, вызвал Telegram и упал
+
+        with mock.patch("apiCommuniPay.clubs.telegram_outbox.tg") as tg:
+            self.assertEqual(telegram_outbox.tick(self.now)["claimed"], 0)
+            # заявка уже одобрена прошлой попыткой — Telegram отвечает 400
+            tg.approve_chat_join_request.side_effect = http_error(400)
+            stats = telegram_outbox.tick(self.now + timedelta(seconds=telegram_outbox.LEASE))
+        self.assertEqual((stats["claimed"], stats["sent"]), (1, 1))
+        action = TelegramAction.objects.get()
+        self.assertEqual((action.status, action.attempts), ("sent", 2))
+
+    def test_rejection_after_known_failure_is_permanent(self):
+        self.enqueue(Kind.APPROVE, 2)
+        with mock.patch("apiCommuniPay.clubs.telegram_outbox.tg") as tg:
+            tg.approve_chat_join_request.side_effect = RuntimeError("timeout")
+            telegram_outbox.tick(self.now)
+            # прошлая попытка записала ошибку — 400 теперь не «уже сделано»
+            tg.approve_chat_join_request.side_effect = http_error(400)
+            stats = telegram_outbox.tick(TelegramAction.objects.get().available_at)
+        self.assertEqual((stats["sent"], stats["failed"]), (0, 1))
+        self.assertEqual(TelegramAction.objects.get().status, "failed")
+
+    def test_kick_is_skipped_when_access_is_back(self):
+        user = get_user_model().objects.create_user(username="u", password="x", telegram_id=1)
+        chat = TelegramChat.objects.create(tg_id=-1001, type="supergroup")
+        self.enqueue(Kind.KICK, 1)
+        self.enqueue(Kind.KICK, 7)
+        ChatEntitlement.objects.create(user=user, chat=chat, valid_until=self.now + timedelta(days=30))   # оплатил снова
+
+        with mock.patch("apiCommuniPay.clubs.telegram_outbox.tg") as tg:
+            stats = telegram_outbox.tick(self.now)
+        self.assertEqual((stats["sent"], stats["skipped"]), (1, 1))
+        tg.kick_chat_member.assert_called_once_with(-1001, 7)
+        self.assertEqual(TelegramAction.objects.get(user_tg_id=1).status, "skipped")
+
+    @override_settings(TELEGRAM_BOT_TOKEN="123:secret")
+    def test_errors_do_not_leak_bot_token(self):
+        self.enqueue(Kind.APPROVE, 2)
+        self.enqueue(Kind.DECLINE, 3)
+        url = "https://api.telegram.org/bot123:secret/approveChatJoinRequest"
+        rejected = requests.Response()
+        rejected.status_code, rejected.url = 400, url
+        rejected._content = b'{"ok": false, "error_code": 400, "description": "Bad Request: USER_ALREADY_PARTICIPANT"}'
+        network = requests.ConnectionError(f"Max retries exceeded with url: {url}")
+
+        with mock.patch("apiCommuniPay.common.tg.requests.post", side_effect=[network, rejected]), \
+                self.assertLogs("clubs.telegram_outbox", "WARNING") as logs:
+            telegram_outbox.tick(self.now)
+        errors = dict(TelegramAction.objects.values_list("kind", "error"))
+        self.assertEqual(errors["approve"], "approveChatJoinRequest ConnectionError")
+        self.assertEqual(errors["decline"], "declineChatJoinRequest 400 Bad Request: USER_ALREADY_PARTICIPANT")
+        self.assertNotIn("secret", "\n".join(logs.output))
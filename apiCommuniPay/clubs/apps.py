@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ClubsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apiCommuniPay.clubs'
+
+    def ready(self):
+        from . import signals  # noqa
+        from .access_cache import require_shared_cache
+        require_shared_cache()
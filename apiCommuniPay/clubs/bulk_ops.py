@@ -0,0 +1,199 @@
+"""
+Массовые операции над подписками тарифа (для операторов):
+
+- extend  — сдвинуть `ends_at` активных подписок на N дней (компенсация после сбоя);
+- migrate — перенести активные и ожидающие оплату подписки на другой тариф того же проекта;
+- cancel  — отменить активные и ожидающие оплату подписки тарифа.
+
+Операция — один UPDATE на пачку в порядке pk (keyset от последнего pk, строки пачки
+блокируются `select_for_update`), без загрузки моделей и без сигналов. Вместо сигналов
+каждая пачка отдаёт компактный список изменений `Change(subscription, user, plan, status,
+ends_at)`, по которому в той же транзакции обновляются места в тарифах, права
+(`entitlements.refresh` — один вызов на пачку), журнал подписок (`event_log`, один
+INSERT на пачку) и SSE-уведомления подписчикам. Пары (пользователь, чат), потерявшие
+право (cancel, migrate на тариф с другими чатами), в той же транзакции ставятся в
+очередь на удаление из чата (`telegram_outbox.kick_pairs`).
+
+migrate занимает места в целевом тарифе сразу на все активные подписки одним UPDATE
+(`seats.acquire`, PlanSoldOut — ничего не перенесено). Подписки, ставшие активными уже
+после резерва, занимают место в своей пачке; если места кончились, операция
+останавливается, уже перенесённые пачки остаются, а `BulkResult.stopped = "sold_out"`.
+
+`dry_run=True` только считает, сколько подписок попадёт под операцию.
+"""
+from __future__ import annotations
+
+import datetime as dt
+from dataclasses import asdict, astuple, dataclass
+from typing import Callable
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django.utils import timezone
+
+from apiCommuniPay.sse import events
+
+from . import entitlements, event_log, seats, telegram_outbox
+from .models import Plan, Subscription
+
+CHUNK_SIZE = getattr(settings, "SUBSCRIPTION_BULK_CHUNK", 1000)
+
+OPS = ("extend", "migrate", "cancel")
+LIVE = ("active", "pending")
+
+
+@dataclass(frozen=True)
+class Change:
+    subscription_id: int
+    user_id: int
+    plan_id: int
+    status: str
+    ends_at: dt.datetime | None
+
+
+@dataclass
+class BulkResult:
+    op: str
+    plan_id: int
+    matched: int
+    changed: int = 0
+    chunks: int = 0
+    queued: int = 0    # удаления из чатов, поставленные в очередь Telegram
+    stopped: str = ""  # непусто — операция прервана на полпути (см. migrate)
+    dry_run: bool = False
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def _chunks(
+    qs: QuerySet,
+    chunk_size: int,
+    apply: Callable[[list[tuple]], list[Change]],
+    event_type: str,
+    kind: str,
+    result: BulkResult,
+    prev_plan_id: int | None = None,
+    prev_status: str | None = None,
+    kick_key: str | None = None,
+):
+    last = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                qs.filter(pk__gt=last)
+                .select_for_update()
+                .order_by("pk")
+                .values_list("pk", "user_id", "status", "ends_at")[:chunk_size]
+            )
+            if not rows:
+                return result
+            changes = apply(rows)
+            event_log.record(kind, [astuple(c) for c in changes], prev_plan_id=prev_plan_id, prev_status=prev_status)
+            queued = publish(changes, event_type, kick_key)
+        last = rows[-1][0]
+        result.changed += len(changes)
+        result.chunks += 1
+        result.queued += queued
+
+
+def publish(changes: list[Change], event_type: str, kick_key: str | None = None) -> int:
+    """
+    Права и уведомления по пачке изменений (вызывать в транзакции операции). С kick_key —
+    удаление из чатов, на которые пропало право. Возвращает число поставленных удалений.
+    """
+    if not changes:
+        return 0
+    user_ids = {c.user_id for c in changes}
+    before = entitlements.held_pairs(user_ids) if kick_key else set()
+    entitlements.refresh(user_ids=user_ids)
+    queued = 0
+    if kick_key:
+        queued = telegram_outbox.kick_pairs(sorted(before - entitlements.held_pairs(user_ids)), key=kick_key)
+    for c in changes:
+        events.publish_user_event(c.user_id, event_type, {
+            "subscription_id": c.subscription_id,
+            "plan_id": c.plan_id,
+            "status": c.status,
+            "ends_at": c.ends_at.isoformat() if c.ends_at else None,
+        })
+    return queued
+
+
+def extend(plan: Plan, days: int, dry_run: bool = False, chunk_size: int = CHUNK_SIZE) -> BulkResult:
+    qs = Subscription.objects.filter(plan=plan, status="active", ends_at__isnull=False)
+    result = BulkResult("extend", plan.pk, qs.count(), dry_run=dry_run)
+    if dry_run:
+        return result
+    delta = dt.timedelta(days=days)
+
+    def apply(rows):
+        Subscription.objects.filter(pk__in=[r[0] for r in rows]).update(
+            ends_at=F("ends_at") + delta, updated_at=timezone.now(),
+        )
+        return [Change(pk, user_id, plan.pk, status, ends_at + delta) for pk, user_id, status, ends_at in rows]
+
+    return _chunks(
+        qs, chunk_size, apply, events.SUBSCRIPTION_CHANGED, event_log.Kind.EXTENDED, result, prev_status="active",
+    )
+
+
+def migrate(plan: Plan, to_plan: Plan, dry_run: bool = False, chunk_size: int = CHUNK_SIZE) -> BulkResult:
+    """
+    Места: резерв в целевом тарифе на все активные сразу, в исходном освобождаются по
+    пачкам. PlanSoldOut на резерве — ничего не перенесено; позже — частичный результат.
+    """
+    if to_plan.project_id != plan.project_id:
+        raise ValueError("Target plan belongs to another project")
+    qs = Subscription.objects.filter(plan=plan, status__in=LIVE)
+    result = BulkResult("migrate", plan.pk, qs.count(), dry_run=dry_run)
+    if dry_run or to_plan.pk == plan.pk:
+        return result
+    with transaction.atomic():
+        reserved = qs.filter(status="active").count()
+        seats.acquire(to_plan, reserved)
+
+    def apply(rows):
+        nonlocal reserved
+        active = sum(1 for r in rows if r[2] == "active")
+        extra = max(0, active - reserved)
+        seats.acquire(to_plan, extra)   # активировались после резерва
+        reserved -= active - extra
+        seats.release(plan.pk, active)
+        Subscription.objects.filter(pk__in=[r[0] for r in rows]).update(plan=to_plan, updated_at=timezone.now())
+        return [Change(pk, user_id, to_plan.pk, status, ends_at) for pk, user_id, status, ends_at in rows]
+
+    try:
+        _chunks(
+            qs, chunk_size, apply, events.SUBSCRIPTION_CHANGED, event_log.Kind.PLAN_CHANGED, result,
+            prev_plan_id=plan.pk, kick_key=f"migrate:{plan.pk}:{to_plan.pk}:{timezone.now().timestamp():.0f}",
+        )
+    except seats.PlanSoldOut:
+        result.stopped = "sold_out"
+    finally:
+        # истекли или отменены по ходу операции — резерв больше не нужен
+        seats.release(to_plan.pk, reserved)
+    return result
+
+
+def cancel(plan: Plan, dry_run: bool = False, chunk_size: int = CHUNK_SIZE) -> BulkResult:
+    """Активные и ожидающие оплату — отдельными проходами: журналу нужен статус до отмены."""
+    qs = Subscription.objects.filter(plan=plan, status__in=LIVE)
+    result = BulkResult("cancel", plan.pk, qs.count(), dry_run=dry_run)
+    if dry_run:
+        return result
+
+    key = f"cancel:{plan.pk}:{timezone.now().timestamp():.0f}"
+    for status in LIVE:
+        def apply(rows, status=status):
+            if status == "active":
+                seats.release(plan.pk, len(rows))
+            Subscription.objects.filter(pk__in=[r[0] for r in rows]).update(status="canceled", updated_at=timezone.now())
+            return [Change(pk, user_id, plan.pk, "canceled", ends_at) for pk, user_id, _, ends_at in rows]
+
+        _chunks(
+            qs.filter(status=status), chunk_size, apply, events.SUBSCRIPTION_CANCELED, event_log.Kind.CANCELED, result,
+            prev_status=status, kick_key=key,
+        )
+    return result
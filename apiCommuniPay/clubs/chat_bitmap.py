@@ -0,0 +1,295 @@
+"""
+Компактный ростер чата для быстрого «есть ли у telegram_id X право на чат Y».
+
+Для каждого чата (ключ — Telegram id чата, чтобы не ходить в БД за pk) храним два
+параллельных `array('q')`: отсортированные telegram_id и `valid_until` в epoch-секундах
+(0 — бессрочно). 16 байт на участника, поиск — bisect.
+
+Где живёт:
+- в общем кэше — blob под ключом с версией (`bitmap:<tg_chat>:<version>`) и сама
+  версия (`bitmap:v:<tg_chat>`);
+- в памяти процесса — декодированная копия; с общей версией сверяется не чаще раза
+  в `CHAT_BITMAP_LOCAL_TTL` секунд.
+
+Как поддерживается:
+- первый запрос к чату без blob строит его из ChatEntitlement + ProjectEntitlement;
+- `entitlements.refresh` после коммита передаёт изменённые пары (user, chat) в `sync()`:
+  их итоговое состояние перечитывается одним запросом и вливается в blob новой версии
+  (O(изменений + размер ростера) на слияние, без перестроения из БД);
+- при гонке двух патчей, смене проекта чата или смене `User.telegram_id` (ростер
+  хранит telegram_id, а не pk) версия удаляется — следующий читатель перестроит ростер из БД.
+
+Гонка построения с записью: читатель мог прочитать таблицы до коммита выдачи права, а
+`sync()` этого же коммита ещё не видит версии (патчить нечего) — без защиты устаревший
+ростер лёг бы в кэш на `CHAT_BITMAP_TTL`. Поэтому каждое изменение чата (`sync`,
+`invalidate`) сначала увеличивает счётчик поколений `bitmap:g:<tg_chat>`, а читатель
+запоминает его до `build()` и сверяет после публикации: сдвинулся — версия снимается,
+ростер не кэшируется.
+
+Права меняют не только веб-воркеры, но и команды (`process_payments`, импорт,
+bulk-операции, продление) — патчи видны всем процессам только через общий кэш
+(settings.CACHES, обязателен на проде — `access_cache.require_shared_cache`).
+
+Отказ (`False`) никогда не ходит в БД, если ростер чата уже загружен. Положительный
+ответ — кандидат: действие (одобрение заявки) подтверждается точной проверкой
+`access_cache.has_access`. Сравнение с ORM — команда `bench_join_check`.
+"""
+from __future__ import annotations
+
+import secrets
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Iterable
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+
+from apiCommuniPay.common.models import TelegramChat
+
+from . import entitlements
+from .models import ChatEntitlement, ProjectEntitlement
+
+LOCAL_TTL = getattr(settings, "CHAT_BITMAP_LOCAL_TTL", 2)
+BLOB_TTL = getattr(settings, "CHAT_BITMAP_TTL", 3600)
+
+_local: dict[int, "Roster"] = {}
+_lock = threading.Lock()
+
+
+def _version_key(tg_chat_id: int) -> str:
+    return f"bitmap:v:{tg_chat_id}"
+
+
+def _blob_key(tg_chat_id: int, version: int) -> str:
+    return f"bitmap:{tg_chat_id}:{version}"
+
+
+def _gen_key(tg_chat_id: int) -> str:
+    return f"bitmap:g:{tg_chat_id}"
+
+
+def _bump(tg_chat_ids: Iterable[int]) -> None:
+    """Сдвигает поколение чатов: построения, начатые раньше, не попадут в кэш."""
+    for tg_chat_id in tg_chat_ids:
+        try:
+            cache.incr(_gen_key(tg_chat_id))
+        except ValueError:   # ключа нет — любое значение отличается от прочитанного None
+            cache.set(_gen_key(tg_chat_id), secrets.randbits(48), timeout=BLOB_TTL)
+
+
+def _ts(until) -> int:
+    return 0 if until is None else max(1, int(until.timestamp()))
+
+
+@dataclass
+class Roster:
+    version: int
+    ids: array
+    until: array
+    checked_at: float = 0.0
+
+    def lookup(self, tg_user_id: int, at_ts: float) -> bool:
+        i = bisect_left(self.ids, tg_user_id)
+        if i == len(self.ids) or self.ids[i] != tg_user_id:
+            return False
+        u = self.until[i]
+        return u == 0 or u > at_ts
+
+    def dumps(self) -> bytes:
+        return self.ids.tobytes() + self.until.tobytes()
+
+    @classmethod
+    def loads(cls, version: int, blob: bytes) -> "Roster":
+        half = len(blob) // 2
+        ids, until = array("q"), array("q")
+        ids.frombytes(blob[:half])
+        until.frombytes(blob[half:])
+        return cls(version, ids, until)
+
+    def patched(self, changes: dict[int, int | None]) -> "Roster":
+        """Новая копия: changes — tg_user_id → until_ts (None — убрать). Слияние за O(n + k)."""
+        ids, until = array("q"), array("q")
+        upd = sorted(changes.items())
+        i = j = 0
+        while i < len(self.ids) or j < len(upd):
+            if j == len(upd) or (i < len(self.ids) and self.ids[i] < upd[j][0]):
+                ids.append(self.ids[i])
+                until.append(self.until[i])
+                i += 1
+                continue
+            tg, ts = upd[j]
+            if i < len(self.ids) and self.ids[i] == tg:
+                i += 1
+            if ts is not None:
+                ids.append(tg)
+                until.append(ts)
+            j += 1
+        return Roster(self.version, ids, until)
+
+
+def build(tg_chat_id: int) -> Roster:
+    """Ростер из таблиц прав (прямые права на чат + права на его проект)."""
+    chat_pk = TelegramChat.objects.filter(tg_id=tg_chat_id).values_list("pk", flat=True).first()
+    merged: dict[int, int] = {}
+    if chat_pk is not None:
+        direct = (
+            ChatEntitlement.objects
+            .filter(chat_id=chat_pk, user__telegram_id__isnull=False)
+            .values_list("user__telegram_id", "valid_until")
+        )
+        via_project = (
+            ProjectEntitlement.objects
+            .filter(project__telegram_chats__id=chat_pk, user__telegram_id__isnull=False)
+            .values_list("user__telegram_id", "valid_until")
+        )
+        for tg, until in direct.union(via_project, all=True):
+            ts = _ts(until)
+            prev = merged.get(tg)
+            if prev is None or (prev != 0 and (ts == 0 or ts > prev)):
+                merged[tg] = ts
+    ids, until = array("q"), array("q")
+    for tg in sorted(merged):
+        ids.append(tg)
+        until.append(merged[tg])
+    return Roster(secrets.randbits(48), ids, until)
+
+
+def _store(tg_chat_id: int, roster: Roster, gen) -> bool:
+    """
+    Публикует построенный ростер. `gen` — поколение чата до `build()`; если оно
+    сдвинулось, права менялись во время построения — версия снимается, False.
+    """
+    cache.set(_blob_key(tg_chat_id, roster.version), roster.dumps(), timeout=BLOB_TTL)
+    cache.set(_version_key(tg_chat_id), roster.version, timeout=BLOB_TTL)
+    if cache.get(_gen_key(tg_chat_id)) != gen:
+        cache.delete(_version_key(tg_chat_id))
+        return False
+    return True
+
+
+def get(tg_chat_id: int) -> Roster:
+    now = time.monotonic()
+    with _lock:
+        local = _local.get(tg_chat_id)
+    if local is not None and now - local.checked_at < LOCAL_TTL:
+        return local
+
+    version = cache.get(_version_key(tg_chat_id))
+    if local is not None and version == local.version:
+        local.checked_at = now
+        return local
+    roster = None
+    if version is not None:
+        blob = cache.get(_blob_key(tg_chat_id, version))
+        if blob is not None:
+            roster = Roster.loads(version, blob)
+    if roster is None:
+        gen = cache.get(_gen_key(tg_chat_id))
+        roster = build(tg_chat_id)
+        if not _store(tg_chat_id, roster, gen):
+            return roster   # мог устареть ещё до возврата — не кэшируем и локально
+    roster.checked_at = now
+    with _lock:
+        _local[tg_chat_id] = roster
+    return roster
+
+
+def may_have_access(tg_chat_id: int, tg_user_id: int, at: float | None = None) -> bool:
+    """False — права точно нет (без БД); True — есть по ростеру, подтвердите точной проверкой."""
+    return get(tg_chat_id).lookup(tg_user_id, at if at is not None else time.time())
+
+
+def invalidate(tg_chat_ids: Iterable[int]) -> None:
+    """Следующий читатель перестроит ростер из БД."""
+    tg_chat_ids = list(tg_chat_ids)
+    _bump(tg_chat_ids)
+    cache.delete_many([_version_key(c) for c in tg_chat_ids])
+
+
+def invalidate_user(user_id: int) -> None:
+    """Сменился telegram_id пользователя — ростеры его чатов перестроятся после коммита."""
+    direct = ChatEntitlement.objects.filter(user_id=user_id).values_list("chat__tg_id", flat=True)
+    via_project = TelegramChat.objects.filter(
+        project_id__in=ProjectEntitlement.objects.filter(user_id=user_id).values("project_id"),
+    ).values_list("tg_id", flat=True)
+    tg_chats = set(direct) | set(via_project)
+    if tg_chats:
+        transaction.on_commit(lambda: invalidate(tg_chats))
+
+
+def patch(tg_chat_id: int, changes: dict[int, int | None]) -> bool:
+    """
+    Вливает изменения в общий blob новой версии. Нет blob — патчить нечего (его построят
+    при чтении). Гонка с другим патчем — версия сбрасывается. Возвращает True, если вписали.
+    """
+    version = cache.get(_version_key(tg_chat_id))
+    blob = cache.get(_blob_key(tg_chat_id, version)) if version is not None else None
+    if blob is None:
+        return False
+    roster = Roster.loads(version, blob).patched(changes)
+    roster.version = version + 1
+    if not cache.add(_blob_key(tg_chat_id, roster.version), roster.dumps(), timeout=BLOB_TTL):
+        invalidate([tg_chat_id])
+        return False
+    cache.set(_version_key(tg_chat_id), roster.version, timeout=BLOB_TTL)
+    return True
+
+
+def _sync(pairs: set[tuple[int, int]]) -> None:
+    tg_chats = dict(TelegramChat.objects.filter(pk__in={c for _, c in pairs}).values_list("pk", "tg_id"))
+    # до проверки `live`: построение, которое идёт сейчас, не опубликует устаревший ростер
+    _bump(tg_chats.values())
+    # патчим только ростеры, которые кто-то уже загрузил; остальные построятся при чтении
+    live = cache.get_many([_version_key(tg) for tg in tg_chats.values()])
+    tg_chats = {pk: tg for pk, tg in tg_chats.items() if _version_key(tg) in live}
+    pairs = {(u, c) for u, c in pairs if c in tg_chats}
+    if not pairs:
+        return
+    tg_users = dict(
+        get_user_model().objects
+        .filter(pk__in={u for u, _ in pairs}, telegram_id__isnull=False)
+        .values_list("pk", "telegram_id")
+    )
+    if not tg_users:
+        return
+    state = entitlements.merge_rows(entitlements.valid_rows(list(tg_users), list(tg_chats)))
+
+    per_chat: dict[int, dict[int, int | None]] = {}
+    for u, c in pairs:
+        if u in tg_users:
+            until = _ts(state[(u, c)]) if (u, c) in state else None
+            per_chat.setdefault(tg_chats[c], {})[tg_users[u]] = until
+    for tg_chat_id, changes in per_chat.items():
+        patch(tg_chat_id, changes)
+
+
+def sync(pairs: Iterable[tuple[int, int]]) -> None:
+    """Пары (user_id, chat_id), у которых поменялось право; применяется после коммита."""
+    pairs = set(pairs)
+    if pairs:
+        transaction.on_commit(lambda: _sync(pairs))
+
+
+def project_pairs(keys: Iterable[tuple[int, object]]) -> set[tuple[int, int]]:
+    """(user_id, project_id) → (user_id, chat_id) по всем чатам этих проектов."""
+    keys = list(keys)
+    if not keys:
+        return set()
+    by_project: dict[object, list[int]] = {}
+    for chat_pk, project_id in (
+        TelegramChat.objects
+        .filter(project_id__in={p for _, p in keys})
+        .values_list("pk", "project_id")
+    ):
+        by_project.setdefault(project_id, []).append(chat_pk)
+    return {(u, c) for u, p in keys for c in by_project.get(p, ())}
+
+
+def clear_local() -> None:
+    with _lock:
+        _local.clear()
@@ -0,0 +1,309 @@
+"""
+Материализованные права доступа к чатам (ChatEntitlement).
+
+Источник истины — активные подписки: Subscription(status=active, ends_at пусто или
+в будущем) → Plan → PlanChannel → TelegramChat. Таблица ChatEntitlement хранит по
+строке на пару (user, chat) с `valid_until = max(ends_at)` (NULL — бессрочно), так что
+проверка доступа — один lookup по уникальному индексу.
+
+Тарифы «все чаты проекта» (`Plan.all_channels`) материализуются в ProjectEntitlement —
+по строке на (user, project). Проверка права на чат смотрит обе таблицы одним запросом
+(`valid_rows`): прямое право на чат или право на проект чата. Поэтому подключение нового
+чата к проекту не требует ни строк PlanChannel, ни пересчёта прав.
+
+Поддержка таблицы:
+- `refresh(user_ids=..., chat_ids=..., project_ids=...)` пересчитывает права в заданной
+  области (по пользователям, по чатам, по проектам) и пишет только разницу;
+- сигналы в `clubs/signals.py` вызывают его при изменениях Subscription / PlanChannel;
+- массовые `.update()` сигналов не шлют — такой код обязан вызвать `refresh` сам;
+- `diff()` / команда `rebuild_entitlements` сверяют таблицу с источником истины;
+- `check_many()` отвечает на пачку пар (пользователь, чат) двумя запросами на чанк;
+- `entitled_telegram_ids()` стримит ростер чата серверным курсором.
+
+Горячие одиночные проверки идут через кэш `clubs/access_cache.py`; `refresh`
+при каждом реальном изменении сдвигает версии затронутой области и патчит
+компактные ростеры чатов (`clubs/chat_bitmap.py`).
+"""
+from __future__ import annotations
+
+import datetime as dt
+from itertools import islice
+from typing import Iterable, Iterator
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Q
+from django.utils import timezone
+
+from apiCommuniPay.accounts import telegram_ids
+
+from . import access_cache, chat_bitmap
+from .models import ChatEntitlement, ProjectEntitlement, Subscription
+
+Key = tuple[int, int]   # (user_id, chat_id)
+
+BULK_CHUNK = 1000       # пар на чанк в check_many (укладываемся в лимит параметров SQLite)
+ROSTER_CHUNK = 5000     # строк на fetch серверного курсора в entitled_telegram_ids
+
+
+def active_subscription_q(at: dt.datetime | None = None, prefix: str = "") -> Q:
+    """Q «подписка действует на момент at»; prefix — путь до Subscription (например, 'subscriptions__')."""
+    at = at or timezone.now()
+    return Q(**{f"{prefix}status": "active"}) & (
+        Q(**{f"{prefix}ends_at__isnull": True}) | Q(**{f"{prefix}ends_at__gt": at})
+    )
+
+
+def _latest(rows) -> dict[Key, dt.datetime | None]:
+    """Агрегаты (key, open_ended, until) → key: valid_until (NULL — бессрочно)."""
+    return {key: (None if open_ended else until) for key, open_ended, until in rows}
+
+
+def _aggregate(qs, scope: str):
+    rows = (
+        qs
+        .values("user_id", target=F(scope))
+        .annotate(open_ended=Count("pk", filter=Q(ends_at__isnull=True)), until=Max("ends_at"))
+        .order_by()
+    )
+    return _latest(((r["user_id"], r["target"]), r["open_ended"], r["until"]) for r in rows)
+
+
+def compute(
+    user_ids: Iterable[int] | None = None,
+    chat_ids: Iterable[int] | None = None,
+) -> dict[Key, dt.datetime | None]:
+    """Желаемое состояние ChatEntitlement в области (user_ids × chat_ids) по источнику истины."""
+    cond = active_subscription_q() & Q(plan__all_channels=False, plan__plan_channels__isnull=False)
+    if user_ids is not None:
+        cond &= Q(user_id__in=list(user_ids))
+    if chat_ids is not None:
+        cond &= Q(plan__plan_channels__chat_id__in=list(chat_ids))
+    # один filter() — значит, values/annotate переиспользуют тот же джойн plan_channels
+    return _aggregate(Subscription.objects.filter(cond), "plan__plan_channels__chat_id")
+
+
+def compute_projects(
+    user_ids: Iterable[int] | None = None,
+    project_ids: Iterable | None = None,
+) -> dict[tuple, dt.datetime | None]:
+    """Желаемое состояние ProjectEntitlement: подписки на тарифы с all_channels=True."""
+    cond = active_subscription_q() & Q(plan__all_channels=True)
+    if user_ids is not None:
+        cond &= Q(user_id__in=list(user_ids))
+    if project_ids is not None:
+        cond &= Q(plan__project_id__in=list(project_ids))
+    return _aggregate(Subscription.objects.filter(cond), "plan__project_id")
+
+
+def _scoped(model, user_ids, target_ids):
+    qs = model.objects.all()
+    if user_ids is not None:
+        qs = qs.filter(user_id__in=list(user_ids))
+    if target_ids is not None:
+        target = "chat_id" if model is ChatEntitlement else "project_id"
+        qs = qs.filter(**{f"{target}__in": list(target_ids)})
+    return qs
+
+
+def _diff(model, desired, user_ids, target_ids):
+    target = "chat_id" if model is ChatEntitlement else "project_id"
+    actual = {
+        (u, t): (pk, until)
+        for pk, u, t, until in _scoped(model, user_ids, target_ids).values_list("pk", "user_id", target, "valid_until")
+    }
+    missing = [k for k in desired if k not in actual]
+    extra = [pk for k, (pk, _) in actual.items() if k not in desired]
+    changed = [k for k, (_, until) in actual.items() if k in desired and desired[k] != until]
+    return desired, missing, extra, changed
+
+
+def diff(
+    user_ids: Iterable[int] | None = None,
+    chat_ids: Iterable[int] | None = None,
+):
+    """
+    Сравнивает ChatEntitlement с источником истины в области.
+    Возвращает (desired, missing, extra_pks, changed): ключи, которых нет; pk лишних строк;
+    ключи с другим valid_until.
+    """
+    user_ids = None if user_ids is None else list(user_ids)
+    chat_ids = None if chat_ids is None else list(chat_ids)
+    return _diff(ChatEntitlement, compute(user_ids, chat_ids), user_ids, chat_ids)
+
+
+def diff_projects(
+    user_ids: Iterable[int] | None = None,
+    project_ids: Iterable | None = None,
+):
+    """То же, что diff(), для ProjectEntitlement."""
+    user_ids = None if user_ids is None else list(user_ids)
+    project_ids = None if project_ids is None else list(project_ids)
+    return _diff(ProjectEntitlement, compute_projects(user_ids, project_ids), user_ids, project_ids)
+
+
+def _apply(model, desired, missing, extra, changed) -> set[tuple]:
+    """Пишет разницу; возвращает ключи (user_id, chat/project) затронутых строк."""
+    field = "chat" if model is ChatEntitlement else "project"
+    touched = set()
+    if extra:
+        touched |= set(model.objects.filter(pk__in=extra).values_list("user_id", f"{field}_id"))
+        model.objects.filter(pk__in=extra).delete()
+    upsert = missing + changed
+    if upsert:
+        model.objects.bulk_create(
+            [model(user_id=u, **{f"{field}_id": t}, valid_until=desired[(u, t)]) for u, t in upsert],
+            update_conflicts=True,
+            unique_fields=["user", field],
+            update_fields=["valid_until", "updated_at"],
+        )
+        touched |= set(upsert)
+    return touched
+
+
+def refresh(
+    *,
+    user_ids: Iterable[int] | None = None,
+    chat_ids: Iterable[int] | None = None,
+    project_ids: Iterable | None = None,
+) -> int:
+    """
+    Приводит таблицы к источнику истины в области. Возвращает число изменённых строк.
+
+    ChatEntitlement пересчитывается при заданных user_ids/chat_ids, ProjectEntitlement —
+    при заданных user_ids/project_ids (смена PlanChannel проектных прав не касается).
+    """
+    if user_ids is None and chat_ids is None and project_ids is None:
+        raise ValueError("refresh() needs user_ids, chat_ids and/or project_ids; use rebuild_entitlements for a full pass")
+    user_ids = None if user_ids is None else list(user_ids)
+    chat_ids = None if chat_ids is None else list(chat_ids)
+    project_ids = None if project_ids is None else list(project_ids)
+    changes = 0
+    with transaction.atomic():
+        if user_ids is not None or chat_ids is not None:
+            desired, missing, extra, changed = diff(user_ids, chat_ids)
+            touched = _apply(ChatEntitlement, desired, missing, extra, changed)
+            if touched:
+                changes += len(touched)
+                access_cache.invalidate(user_ids=user_ids or (), chat_ids=chat_ids or ())
+                chat_bitmap.sync(touched)
+        if user_ids is not None or project_ids is not None:
+            desired, missing, extra, changed = diff_projects(user_ids, project_ids)
+            touched = _apply(ProjectEntitlement, desired, missing, extra, changed)
+            if touched:
+                changes += len(touched)
+                # кэш решений адресован (user, chat) — сдвигаем версии затронутых пользователей
+                access_cache.invalidate(user_ids={u for u, _ in touched})
+                chat_bitmap.sync(chat_bitmap.project_pairs(touched))
+    return changes
+
+
+def valid_rows(user_ids: Iterable[int], chat_ids: Iterable[int]):
+    """
+    (user_id, chat_id, valid_until) из обеих таблиц одним запросом: прямое право на чат
+    и право на проект, к которому привязан чат. На пару может прийти две строки.
+    """
+    user_ids, chat_ids = list(user_ids), list(chat_ids)
+    direct = (
+        ChatEntitlement.objects
+        .filter(user_id__in=user_ids, chat_id__in=chat_ids)
+        .values_list("user_id", "chat_id", "valid_until")
+    )
+    via_project = (
+        ProjectEntitlement.objects
+        .filter(user_id__in=user_ids, project__telegram_chats__id__in=chat_ids)
+        .values_list("user_id", "project__telegram_chats__id", "valid_until")
+    )
+    return direct.union(via_project, all=True)
+
+
+def merge_rows(rows) -> dict[Key, dt.datetime | None]:
+    """Сводит строки valid_rows к одному valid_until на пару: NULL (бессрочно) или максимум."""
+    out: dict[Key, dt.datetime | None] = {}
+    for u, c, until in rows:
+        key = (u, c)
+        if key not in out:
+            out[key] = until
+        elif out[key] is not None and (until is None or until > out[key]):
+            out[key] = until
+    return out
+
+
+def held_pairs(user_ids: Iterable[int]) -> set[Key]:
+    """Все (user, chat), на которые у пользователей сейчас есть строки прав (с учётом проектных)."""
+    user_ids = list(user_ids)
+    direct = ChatEntitlement.objects.filter(user_id__in=user_ids).values_list("user_id", "chat_id")
+    via_project = (
+        ProjectEntitlement.objects
+        .filter(user_id__in=user_ids, project__telegram_chats__isnull=False)
+        .values_list("user_id", "project__telegram_chats__id")
+    )
+    return set(direct.union(via_project, all=True))
+
+
+def has_access(user_id: int, chat_id: int, at: dt.datetime | None = None) -> bool:
+    """Один запрос: право на чат или на его проект."""
+    found = merge_rows(valid_rows([user_id], [chat_id]))
+    if not found:
+        return False
+    until = found[(user_id, chat_id)]
+    return until is None or until > (at or timezone.now())
+
+
+def check_many(
+    pairs: Iterable[tuple[int | None, int | None, int]],
+    at: dt.datetime | None = None,
+    chunk_size: int = BULK_CHUNK,
+) -> Iterator[dict]:
+    """
+    Массовая проверка доступа. pairs — (user_id, telegram_id, chat_id), задан один из
+    первых двух. Результаты отдаются лениво в порядке входа; на каждый чанк —
+    не больше двух запросов: резолв telegram_id → user (мимо кэша accounts/telegram_ids.py)
+    и выборка прав по user × chat.
+    """
+    at = at or timezone.now()
+    it = iter(pairs)
+    while chunk := list(islice(it, chunk_size)):
+        tg_ids = {tg for u, tg, _ in chunk if u is None and tg is not None}
+        by_tg = telegram_ids.resolve_many(tg_ids) if tg_ids else {}
+        resolved = [(u if u is not None else by_tg.get(tg), tg, c) for u, tg, c in chunk]
+
+        user_ids = {u for u, _, _ in resolved if u is not None}
+        chat_ids = {c for _, _, c in resolved}
+        valid = merge_rows(valid_rows(user_ids, chat_ids)) if user_ids else {}
+        for u, tg, c in resolved:
+            key = (u, c)
+            allowed = key in valid and (valid[key] is None or valid[key] > at)
+            yield {"user": u, "telegram_id": tg, "chat": c, "allowed": allowed}
+
+
+def entitled_telegram_ids(chat_id: int, at: dt.datetime | None = None) -> Iterator[int]:
+    """
+    telegram_id всех, у кого сейчас есть право на чат (прямое или через проект).
+    UNION убирает дубли на стороне БД; `.iterator()` на Postgres идёт через серверный
+    курсор, так что память не зависит от размера ростера.
+    """
+    at = at or timezone.now()
+    valid = Q(valid_until__isnull=True) | Q(valid_until__gt=at)
+    direct = (
+        ChatEntitlement.objects
+        .filter(valid, chat_id=chat_id, user__telegram_id__isnull=False)
+        .values_list("user__telegram_id", flat=True)
+    )
+    via_project = (
+        ProjectEntitlement.objects
+        .filter(valid, project__telegram_chats__id=chat_id, user__telegram_id__isnull=False)
+        .values_list("user__telegram_id", flat=True)
+    )
+    return direct.union(via_project).iterator(chunk_size=ROSTER_CHUNK)
+
+
+def render_roster(telegram_ids: Iterable[int], fmt: str = "ndjson", batch: int = 1000) -> Iterator[str]:
+    """Кадры для StreamingHttpResponse / файла: строки пачками, а не по одной."""
+    if fmt == "csv":
+        yield "telegram_id\n"
+        line = "{}\n"
+    else:
+        line = '{{"telegram_id": {}}}\n'
+    it = iter(telegram_ids)
+    while ids := list(islice(it, batch)):
+        yield "".join(line.format(tg) for tg in ids)
@@ -0,0 +1,192 @@
+"""
+Журнал жизненного цикла подписок (`SubscriptionEvent`): только INSERT, строки не меняются.
+
+Запись — в той же транзакции, что и изменение подписки:
+- одиночные save() — сигнал `log_subscription_event` (clubs/signals.py);
+- массовые UPDATE (истечение, оплата, автопродление, bulk-операции) сигналов не шлют —
+  они вызывают `record()` сами, одним `bulk_create` на пачку.
+
+Хранение. На Postgres таблица секционирована по `created_at` помесячно
+(`clubs_subscriptionevent_yYYYYmMM` + секция DEFAULT, см. миграцию 0008):
+- `ensure_partitions()` заранее создаёт секции на ближайшие месяцы (команда
+  `partition_subscription_events` — раз в сутки по расписанию); строки месяца, успевшие
+  попасть в DEFAULT (секцию не создали вовремя), переносятся в новую секцию — иначе
+  Postgres отказывается создавать секцию, пересекающуюся со строками DEFAULT;
+- `drop_before()` отсоединяет и удаляет секции целиком (DETACH + DROP — без DELETE
+  по строкам, без раздувания таблицы и долгого VACUUM).
+На остальных СУБД таблица обычная, `drop_before()` удаляет старые строки пачками.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import re
+from typing import Iterable
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import rollups
+from .models import Subscription, SubscriptionEvent
+
+Kind = SubscriptionEvent.Kind
+
+logger = logging.getLogger("clubs.event_log")
+
+TABLE = SubscriptionEvent._meta.db_table
+DEFAULT = f"{TABLE}_default"
+PARTITIONS_AHEAD = getattr(settings, "SUBSCRIPTION_EVENT_PARTITIONS_AHEAD", 2)
+DELETE_CHUNK = getattr(settings, "SUBSCRIPTION_EVENT_DELETE_CHUNK", 5000)
+
+_PARTITION = re.compile(rf"^{TABLE}_y(\d{{4}})m(\d{{2}})$")
+
+# (subscription_id, user_id, plan_id, status, ends_at)
+Row = tuple[int, int, int, str, "dt.datetime | None"]
+
+
+def row(sub: Subscription) -> Row:
+    return sub.pk, sub.user_id, sub.plan_id, sub.status, sub.ends_at
+
+
+def record(
+    kind: str,
+    rows: Iterable[Row],
+    prev_plan_id: int | None = None,
+    at: dt.datetime | None = None,
+    prev_status: str | None = None,
+) -> int:
+    """
+    Добавляет по событию `kind` на каждую строку и обновляет дневные итоги тарифов
+    (`rollups.apply`). Вызывать в транзакции изменения. `prev_status` — статус до
+    изменения (None — подписка только что создана или статус не менялся).
+    """
+    at = at or timezone.now()
+    events = [
+        SubscriptionEvent(
+            kind=kind, subscription_id=pk, user_id=user_id, plan_id=plan_id, prev_plan_id=prev_plan_id,
+            prev_status=prev_status, status=status, ends_at=ends_at, created_at=at,
+        )
+        for pk, user_id, plan_id, status, ends_at in rows
+    ]
+    if events:
+        SubscriptionEvent.objects.bulk_create(events)
+        rollups.apply(events)
+    return len(events)
+
+
+# ---------- секции ----------
+
+def _month(d: dt.date) -> dt.date:
+    return d.replace(day=1)
+
+
+def _next_month(d: dt.date) -> dt.date:
+    return dt.date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+
+def partition_name(month: dt.date) -> str:
+    return f"{TABLE}_y{month:%Y}m{month:%m}"
+
+
+def partitioned() -> bool:
+    return connection.vendor == "postgresql"
+
+
+def partitions() -> dict[str, dt.date]:
+    """Помесячные секции таблицы: имя → первый день месяца (DEFAULT не входит)."""
+    if not partitioned():
+        return {}
+    with connection.cursor() as cur:
+        cur.execute(
+            """
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = %s
+            """,
+            [TABLE],
+        )
+        names = [r[0] for r in cur.fetchall()]
+    found = {}
+    for name in names:
+        m = _PARTITION.match(name)
+        if m:
+            found[name] = dt.date(int(m[1]), int(m[2]), 1)
+    return found
+
+
+def ensure_partitions(ahead: int = PARTITIONS_AHEAD, today: dt.date | None = None) -> list[str]:
+    """Секции на текущий и `ahead` следующих месяцев. Возвращает имена созданных."""
+    if not partitioned():
+        return []
+    existing = partitions()
+    month = _month(today or timezone.localdate())
+    created = []
+    for _ in range(ahead + 1):
+        name = partition_name(month)
+        if name not in existing:
+            _create_partition(name, month, _next_month(month))
+            created.append(name)
+        month = _next_month(month)
+    return created
+
+
+def _create_partition(name: str, lo: dt.date, hi: dt.date) -> None:
+    """
+    CREATE ... PARTITION OF. Если в DEFAULT уже есть строки диапазона — одной транзакцией:
+    DETACH DEFAULT, создать секцию, перенести строки, ATTACH DEFAULT обратно (запись в
+    журнал на это время ждёт блокировку таблицы).
+    """
+    bounds = [lo.isoformat(), hi.isoformat()]
+    create = f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)"
+    with transaction.atomic(), connection.cursor() as cur:
+        cur.execute(f"LOCK TABLE {TABLE} IN SHARE ROW EXCLUSIVE MODE")
+        cur.execute(f"SELECT count(*) FROM {DEFAULT} WHERE created_at >= %s AND created_at < %s", bounds)
+        stray = cur.fetchone()[0]
+        if not stray:
+            cur.execute(create, bounds)
+            return
+        logger.warning("%s: %s rows for %s in DEFAULT, moving to %s", TABLE, stray, f"{lo:%Y-%m}", name)
+        columns = ", ".join(f.column for f in SubscriptionEvent._meta.concrete_fields)
+        cur.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {DEFAULT}")
+        cur.execute(create, bounds)
+        cur.execute(
+            f"INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM {DEFAULT} "
+            f"WHERE created_at >= %s AND created_at < %s",
+            bounds,
+        )
+        cur.execute(f"DELETE FROM {DEFAULT} WHERE created_at >= %s AND created_at < %s", bounds)
+        cur.execute(f"ALTER TABLE {TABLE} ATTACH PARTITION {DEFAULT} DEFAULT")
+
+
+def drop_before(month: dt.date) -> int:
+    """
+    Удаляет события раньше `month` (первого дня месяца). Postgres — секции целиком
+    (возвращает число удалённых секций) плюс старые строки из DEFAULT; иначе —
+    DELETE пачками по DELETE_CHUNK (возвращает число строк).
+    """
+    cutoff = _month(month)
+    if not partitioned():
+        return _delete_rows(dt.datetime.combine(cutoff, dt.time.min, tzinfo=timezone.get_current_timezone()))
+    old = sorted(name for name, start in partitions().items() if start < cutoff)
+    with connection.cursor() as cur:
+        for name in old:
+            # DETACH отдельно от DROP: секция сразу перестаёт участвовать в запросах
+            with transaction.atomic():
+                cur.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+                cur.execute(f"DROP TABLE {name}")
+        cur.execute(f"DELETE FROM {DEFAULT} WHERE created_at < %s", [cutoff.isoformat()])
+    return len(old)
+
+
+def _delete_rows(before: dt.datetime) -> int:
+    total = 0
+    while True:
+        pks = list(
+            SubscriptionEvent.objects.filter(created_at__lt=before)
+            .order_by("pk").values_list("pk", flat=True)[:DELETE_CHUNK]
+        )
+        if not pks:
+            return total
+        total += SubscriptionEvent.objects.filter(pk__in=pks).delete()[0]
@@ -0,0 +1,103 @@
+"""
+Планировщик истечения подписок.
+
+Подписка с `status=active` и `ends_at <= now()` переводится в `expired` пачками:
+- выборка идёт по индексу `(status, ends_at)` и забирает не больше `batch_size` строк,
+  `select_for_update(skip_locked=True)` позволяет запускать несколько воркеров;
+- статус меняется одним UPDATE на пачку; сигналы при этом не срабатывают, поэтому
+  места в тарифах (`seats.release`), права (`entitlements.refresh`), журнал подписок
+  (`event_log`) и SSE-события обновляются здесь же явно;
+- для пар (пользователь, чат), у которых после пересчёта пропало право, в той же
+  транзакции ставятся действия «удалить из чата» (`telegram_outbox`) — их выполняет
+  relay; пачка в Bot API не ходит, а откат не оставляет удалённых за живую подписку.
+
+`tick()` ограничивает работу за один проход (`max_batches`), команда
+`expire_subscriptions --loop` крутит его бесконечно с паузой между проходами.
+"""
+from __future__ import annotations
+
+import datetime as dt
+from collections import Counter
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apiCommuniPay.sse import events
+
+from . import entitlements, event_log, seats, telegram_outbox
+from .models import Subscription
+
+BATCH_SIZE = getattr(settings, "SUBSCRIPTION_EXPIRY_BATCH", 500)
+MAX_BATCHES = getattr(settings, "SUBSCRIPTION_EXPIRY_MAX_BATCHES", 20)
+
+
+@dataclass
+class BatchResult:
+    expired: int = 0
+    revoked: list[tuple[int, int]] = field(default_factory=list)   # (user_id, chat_id)
+    queued: int = 0
+
+
+def expire_batch(now: dt.datetime | None = None, batch_size: int = BATCH_SIZE, kick: bool = True) -> BatchResult:
+    """Истекает одну пачку подписок; kick — поставить удаление из чатов в очередь Telegram."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        due = list(
+            Subscription.objects
+            .select_for_update(skip_locked=True)
+            .filter(status="active", ends_at__lte=now)
+            .order_by("ends_at")
+            .values_list("pk", "user_id", "plan_id", "ends_at")[:batch_size]
+        )
+        if not due:
+            return BatchResult()
+        pks = [pk for pk, *_ in due]
+        user_ids = {u for _, u, _, _ in due}
+
+        before = entitlements.held_pairs(user_ids)
+        expired = (
+            Subscription.objects
+            .filter(pk__in=pks, status="active")
+            .update(status="expired", updated_at=now)
+        )
+        for plan_id, n in Counter(plan_id for _, _, plan_id, _ in due).items():
+            seats.release(plan_id, n)
+        event_log.record(event_log.Kind.EXPIRED, [
+            (pk, user_id, plan_id, "expired", ends_at) for pk, user_id, plan_id, ends_at in due
+        ], at=now, prev_status="active")
+        entitlements.refresh(user_ids=user_ids)
+        revoked = sorted(before - entitlements.held_pairs(user_ids))
+        queued = telegram_outbox.kick_pairs(revoked, key=f"expired:{now.timestamp():.0f}") if kick else 0
+
+        for pk, user_id, plan_id, ends_at in due:
+            events.publish_user_event(user_id, events.SUBSCRIPTION_EXPIRED, {
+                "subscription_id": pk,
+                "plan_id": plan_id,
+                "status": "expired",
+                "ends_at": ends_at.isoformat(),
+            })
+    return BatchResult(expired=expired, revoked=revoked, queued=queued)
+
+
+def tick(
+    now: dt.datetime | None = None,
+    batch_size: int = BATCH_SIZE,
+    max_batches: int = MAX_BATCHES,
+    kick: bool = True,
+) -> dict:
+    """Один проход: не больше max_batches пачек. Возвращает счётчики для логов/команды."""
+    now = now or timezone.now()
+    stats = {"batches": 0, "expired": 0, "revoked": 0, "queued": 0}
+    for _ in range(max_batches):
+        res = expire_batch(now, batch_size, kick)
+        if not res.expired:
+            break
+        stats["batches"] += 1
+        stats["expired"] += res.expired
+        stats["revoked"] += len(res.revoked)
+        stats["queued"] += res.queued
+        if res.expired < batch_size:
+            break
+    return stats
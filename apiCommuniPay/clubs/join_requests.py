@@ -0,0 +1,136 @@
+"""
+Обработка ожидающих JoinRequest пачками (команда `process_join_requests`).
+
+Заявки заводит вебхук (`common/webhook.py` → `open_request`): пользователь попросился
+в чат, права ещё нет, но есть подписка `pending` на тариф с этим чатом — заявка ждёт
+оплаты, а после уведомления провайдера её подтверждает `clubs/payments.py`.
+
+Пачка:
+- забирается `select_for_update(skip_locked=True)` в порядке pk — несколько воркеров
+  получают непересекающиеся пачки, строку, занятую другим воркером (или
+  `payments.process_batch`), просто пропускают;
+- право проверяется одним `entitlements.check_many` на всю пачку, подписки,
+  ожидающие оплату, — одним запросом;
+- решения пишутся одним `bulk_update`, SSE-события — явно (сигналы при
+  `bulk_update` не срабатывают), approve/decline для Telegram ставятся в очередь
+  (`telegram_outbox`) в той же транзакции — Bot API вызывает relay, строки пачки
+  на время сетевых вызовов не блокируются.
+
+Решение по заявке:
+- есть право — `confirmed` и approve в Telegram;
+- права нет, но у пользователя есть подписка `pending` на этот тариф — заявка ждёт
+  оплаты и остаётся `pending` (её решит `clubs/payments.py`);
+- иначе — `rejected` и decline в Telegram.
+Пользователь без telegram_id или неактивный чат — решение пишется только в БД.
+"""
+from __future__ import annotations
+
+import datetime as dt
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apiCommuniPay.sse import events
+
+from . import entitlements, telegram_outbox
+from apiCommuniPay.common.models import TelegramChat
+
+from .models import JoinRequest, Subscription
+
+BATCH_SIZE = getattr(settings, "JOIN_REQUEST_BATCH", 50)
+MAX_BATCHES = getattr(settings, "JOIN_REQUEST_MAX_BATCHES", 20)
+
+
+def open_request(user_id: int, chat: TelegramChat) -> JoinRequest | None:
+    """
+    Заявка в чат для подписки, ждущей оплаты. Без такой подписки — None (Telegram сам
+    держит заявку висеть); повторная заявка в тот же чат новую строку не создаёт.
+    """
+    plan_id = (
+        Subscription.objects
+        .filter(user_id=user_id, status="pending")
+        .filter(Q(plan__channels=chat) | Q(plan__all_channels=True, plan__project_id=chat.project_id))
+        .order_by("-created_at")
+        .values_list("plan_id", flat=True)
+        .first()
+    )
+    if plan_id is None:
+        return None
+    existing = JoinRequest.objects.filter(user_id=user_id, chat=chat, status="pending").first()
+    return existing or JoinRequest.objects.create(user_id=user_id, chat=chat, plan_id=plan_id)
+
+
+def process_batch(after: int = 0, now: dt.datetime | None = None, batch_size: int = BATCH_SIZE) -> dict:
+    """Одна пачка заявок с pk > after в одной транзакции. Возвращает счётчики и `last` — последний pk."""
+    now = now or timezone.now()
+    stats = {"claimed": 0, "confirmed": 0, "rejected": 0, "waiting": 0, "last": after}
+    with transaction.atomic():
+        batch = list(
+            JoinRequest.objects
+            .select_for_update(skip_locked=True, of=("self",))
+            .filter(status="pending", pk__gt=after)
+            .select_related("user", "chat")
+            .order_by("pk")[:batch_size]
+        )
+        if not batch:
+            return stats
+        stats["claimed"], stats["last"] = len(batch), batch[-1].pk
+
+        allowed = {
+            (r["user"], r["chat"])
+            for r in entitlements.check_many([(jr.user_id, None, jr.chat_id) for jr in batch], at=now)
+            if r["allowed"]
+        }
+        awaiting_payment = set(
+            Subscription.objects
+            .filter(status="pending", user_id__in={jr.user_id for jr in batch}, plan_id__in={jr.plan_id for jr in batch})
+            .values_list("user_id", "plan_id")
+        )
+
+        decided = []
+        for jr in batch:
+            if (jr.user_id, jr.chat_id) in allowed:
+                status = "confirmed"
+            elif (jr.user_id, jr.plan_id) in awaiting_payment:
+                stats["waiting"] += 1
+                continue
+            else:
+                status = "rejected"
+            jr.status, jr.confirmed_at = status, now if status == "confirmed" else None
+            decided.append(jr)
+            stats[status] += 1
+
+        JoinRequest.objects.bulk_update(decided, ["status", "confirmed_at"])
+        telegram_outbox.decide_join_requests(
+            (jr.pk, jr.user.telegram_id, jr.chat.tg_id, jr.chat.status, jr.status == "confirmed") for jr in decided
+        )
+        for jr in decided:
+            events.publish_user_event(jr.user_id, events.JOIN_REQUEST_DECIDED, {
+                "join_request_id": jr.pk,
+                "chat_id": jr.chat_id,
+                "plan_id": jr.plan_id,
+                "status": jr.status,
+            })
+    return stats
+
+
+def tick(now: dt.datetime | None = None, batch_size: int = BATCH_SIZE, max_batches: int = MAX_BATCHES) -> dict:
+    """
+    Один проход по ожидающим заявкам: не больше max_batches пачек. Курсор по pk —
+    оставшиеся pending (ждут оплаты) не забираются повторно в том же проходе.
+    """
+    total = {"batches": 0, "claimed": 0, "confirmed": 0, "rejected": 0, "waiting": 0}
+    after = 0
+    for _ in range(max_batches):
+        stats = process_batch(after, now, batch_size)
+        if not stats["claimed"]:
+            break
+        after = stats.pop("last")
+        total["batches"] += 1
+        for k, v in stats.items():
+            total[k] += v
+        if stats["claimed"] < batch_size:
+            break
+    return total
@@ -0,0 +1,246 @@
+"""
+Бенчмарк оформления подписки end to end на фейковом провайдере (common/fake_payments.py):
+
+    start_checkout → уведомление на вебхук → process_payments → Subscription active
+    → ChatEntitlement виден.
+
+N оформлений идут из --concurrency потоков; основной поток тем временем доставляет
+уведомления провайдера на /api/payments/webhook/fake/ (через тестовый клиент — с
+проверкой подписи и записью во входящий ящик) и крутит `payments.process_batch`.
+
+В отчёте (JSON, --output):
+- throughput — оформлений до видимого права в секунду;
+- задержка оформление → право (p50/p95/p99/max) и задержка ответа вебхука;
+- аномалии: продано сверх лимита, расхождение счётчика мест, больше одной активной
+  подписки у пользователя, оплачено без активации, зависшие платежи, сколько
+  дублей/перестановок уведомлений было поглощено.
+
+Для прогона создаются отдельные проект, чат, тариф и пользователи; в конце удаляются
+(--keep — оставить).
+"""
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.db.models import Count
+from django.test import Client, override_settings
+
+from apiCommuniPay.clubs import payments
+from apiCommuniPay.clubs.models import ChatEntitlement, Payment, PaymentCallback, Plan, PlanSeats, Subscription
+from apiCommuniPay.common import fake_payments
+from apiCommuniPay.common.models import TelegramChat
+from apiCommuniPay.common.services import get_provider
+from apiCommuniPay.projects.models import Project
+
+PROVIDER = "fake"
+
+
+def _pct(data: list[float], p: float) -> float | None:
+    if not data:
+        return None
+    data = sorted(data)
+    return round(data[min(len(data) - 1, int(p * len(data)))] * 1000, 3)
+
+
+class Command(BaseCommand):
+    help = "Checkout throughput benchmark on the fake payment provider, JSON report"
+
+    def add_arguments(self, p):
+        p.add_argument("--checkouts", type=int, default=200)
+        p.add_argument("--concurrency", type=int, default=8)
+        p.add_argument("--limit", type=int, help="Plan.limit (по умолчанию без лимита)")
+        p.add_argument("--latency-ms", type=float, default=20.0)
+        p.add_argument("--failure-rate", type=float, default=0.0)
+        p.add_argument("--decline-rate", type=float, default=0.0)
+        p.add_argument("--duplicate-rate", type=float, default=0.1)
+        p.add_argument("--reorder-rate", type=float, default=0.1)
+        p.add_argument("--batch", type=int, default=payments.BATCH_SIZE)
+        p.add_argument("--timeout", type=float, default=60.0)
+        p.add_argument("--seed", type=int, default=42)
+        p.add_argument("--output", default="checkout_bench_report.json")
+        p.add_argument("--keep", action="store_true", help="не удалять созданные данные")
+
+    def handle(self, *args, **o):
+        providers = {PROVIDER: "apiCommuniPay.common.fake_payments.FakePaymentProvider"}
+        with override_settings(PAYMENT_PROVIDERS=providers):
+            provider = get_provider(PROVIDER)
+            provider.configure(
+                latency_ms=o["latency_ms"], failure_rate=o["failure_rate"], decline_rate=o["decline_rate"],
+                duplicate_rate=o["duplicate_rate"], reorder_rate=o["reorder_rate"], seed=o["seed"],
+            )
+            provider.outbox.clear()
+            fixture = self._setup(o)
+            try:
+                report = self._run(provider, fixture, o)
+            finally:
+                if not o["keep"]:
+                    self._teardown(fixture)
+
+        with open(o["output"], "w") as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(json.dumps(report["results"]))
+        self.stdout.write(json.dumps(report["anomalies"]))
+        self.stdout.write(self.style.SUCCESS(f"Report: {o['output']}"))
+
+    # ---------- данные ----------
+
+    def _setup(self, o) -> dict:
+        User = get_user_model()
+        tag = uuid.uuid4().hex[:8]
+        owner = User.objects.create_user(username=f"bench_owner_{tag}", password=None)
+        project = Project.objects.create(owner=owner, name=f"bench {tag}")
+        chat = TelegramChat.objects.create(
+            tg_id=-(10**12 + int(tag, 16)), type=TelegramChat.ChatType.SUPERGROUP, project=project,
+        )
+        plan = Plan.objects.create(project=project, name="bench", price=Decimal("1.00"), limit=o["limit"])
+        plan.channels.add(chat)
+        User.objects.bulk_create(
+            [User(username=f"bench_{tag}_{i}") for i in range(o["checkouts"])], batch_size=500,
+        )
+        users = list(User.objects.filter(username__startswith=f"bench_{tag}_").order_by("pk"))
+        return {"owner": owner, "project": project, "chat": chat, "plan": plan, "users": users}
+
+    def _teardown(self, fx) -> None:
+        Subscription.objects.filter(plan=fx["plan"]).delete()
+        get_user_model().objects.filter(pk__in=[u.pk for u in fx["users"]]).delete()
+        fx["project"].delete()
+        fx["owner"].delete()
+
+    # ---------- прогон ----------
+
+    def _run(self, provider, fx, o) -> dict:
+        plan, chat = fx["plan"], fx["chat"]
+        started: dict[int, float] = {}      # user_id → начало оформления
+        errors = {"checkout": 0, "provider": 0, "db_busy": 0}
+        threaded = o["concurrency"] > 1
+
+        def checkout(user):
+            t0 = time.perf_counter()
+            try:
+                _, res = payments.start_checkout(user, plan, provider=PROVIDER)
+                if res.ok:
+                    started[user.pk] = t0
+                else:
+                    errors["provider"] += 1
+            except Exception:
+                # в т.ч. PlanSoldOut при проверке мест до платежа
+                errors["checkout"] += 1
+            finally:
+                if threaded:
+                    connection.close()
+
+        client = Client(raise_request_exception=False)
+        url = f"/api/payments/webhook/{PROVIDER}/"
+        acks: list[float] = []
+        sent = {"callbacks": 0, "retried": 0}
+        visible: dict[int, float] = {}
+
+        def deliver():
+            for body, signature in provider.drain():
+                t = time.perf_counter()
+                r = client.post(url, data=body, content_type="application/json",
+                                **{"HTTP_" + fake_payments.SIGNATURE_HEADER.upper().replace("-", "_"): signature})
+                if r.status_code != 200:
+                    # провайдер повторит доставку, как настоящий
+                    provider.redeliver([(body, signature)])
+                    sent["retried"] += 1
+                    continue
+                acks.append(time.perf_counter() - t)
+                sent["callbacks"] += 1
+
+        def observe():
+            waiting = [u for u in started if u not in visible]
+            if not waiting:
+                return
+            now = time.perf_counter()
+            for user_id in ChatEntitlement.objects.filter(chat=chat, user_id__in=waiting).values_list("user_id", flat=True):
+                visible[user_id] = now
+
+        wall0 = time.perf_counter()
+        pool = None
+        if threaded:
+            pool = ThreadPoolExecutor(max_workers=o["concurrency"])
+            futures = [pool.submit(checkout, u) for u in fx["users"]]
+        else:
+            futures = []
+            for u in fx["users"]:
+                checkout(u)
+
+        deadline = time.monotonic() + o["timeout"]
+        while time.monotonic() < deadline:
+            try:
+                deliver()
+                stats = payments.process_batch(batch_size=o["batch"])
+                observe()
+            except OperationalError:
+                # SQLite под параллельной записью: «database is locked» — пробуем снова
+                errors["db_busy"] += 1
+                time.sleep(0.01)
+                continue
+            checkouts_done = all(f.done() for f in futures)
+            pending = Payment.objects.filter(subscription__plan=plan, status=Payment.Status.PENDING).exists()
+            if checkouts_done and not pending and not provider.outbox and not stats["callbacks"]:
+                break
+            if not stats["callbacks"]:
+                time.sleep(0.005)
+        wall = time.perf_counter() - wall0
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+        latencies = [visible[u] - started[u] for u in visible]
+        return {
+            "config": {k: o[k] for k in (
+                "checkouts", "concurrency", "limit", "latency_ms", "failure_rate",
+                "decline_rate", "duplicate_rate", "reorder_rate", "batch",
+            )},
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "results": {
+                "wall_s": round(wall, 3),
+                "checkouts_started": len(started),
+                "entitlements_visible": len(visible),
+                "throughput_per_s": round(len(visible) / wall, 2) if wall else None,
+                "latency_ms_p50": _pct(latencies, 0.50),
+                "latency_ms_p95": _pct(latencies, 0.95),
+                "latency_ms_p99": _pct(latencies, 0.99),
+                "latency_ms_max": _pct(latencies, 1.0),
+                "webhook_ack_ms_p50": _pct(acks, 0.50),
+                "webhook_ack_ms_p99": _pct(acks, 0.99),
+                "errors": errors,
+            },
+            "anomalies": self._anomalies(plan, sent),
+        }
+
+    def _anomalies(self, plan, sent) -> dict:
+        subs = Subscription.objects.filter(plan=plan)
+        active = subs.filter(status="active").count()
+        used = PlanSeats.objects.filter(plan=plan).values_list("used", flat=True).first() or 0
+        by_status = dict(
+            Payment.objects.filter(subscription__plan=plan)
+            .values_list("status").annotate(n=Count("pk")).values_list("status", "n")
+        )
+        stored = PaymentCallback.objects.filter(
+            provider=PROVIDER, provider_payment_id__in=Payment.objects.filter(subscription__plan=plan)
+            .values("provider_payment_id"),
+        ).count()
+        return {
+            "oversold": max(0, active - plan.limit) if plan.limit is not None else 0,
+            "seat_counter_drift": used - active,
+            "duplicate_active": (
+                subs.filter(status="active").values("user_id").annotate(n=Count("pk")).filter(n__gt=1).count()
+            ),
+            "paid_not_active": (
+                Payment.objects.filter(subscription__plan=plan, status=Payment.Status.SUCCEEDED)
+                .exclude(subscription__status="active").count()
+            ),
+            "stuck_pending": by_status.get(Payment.Status.PENDING, 0),
+            "sold_out_refunds": by_status.get(Payment.Status.SOLD_OUT, 0),
+            "declined": by_status.get(Payment.Status.FAILED, 0),
+            "callbacks_accepted": sent["callbacks"],
+            "callbacks_retried": sent["retried"],
+            "callbacks_deduplicated": sent["callbacks"] - stored,
+        }
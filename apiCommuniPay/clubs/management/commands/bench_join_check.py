@@ -0,0 +1,96 @@
+"""
+Бенчмарк быстрого пути одобрения заявок: компактный ростер чата (clubs/chat_bitmap.py)
+против ORM (резолв telegram_id → user + entitlements.has_access).
+
+Берётся N проверок для чата: доля --hit-ratio — telegram_id с правом, остальные — без.
+Для каждого пути меряются пропускная способность, p50/p99 задержки и число SQL-запросов.
+Отчёт — JSON (--output).
+"""
+import json
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from apiCommuniPay.clubs import chat_bitmap, entitlements
+from apiCommuniPay.common.models import TelegramChat
+
+
+def _pct(data: list[float], p: float) -> float | None:
+    if not data:
+        return None
+    data = sorted(data)
+    return round(data[min(len(data) - 1, int(p * len(data)))] * 1e6, 2)
+
+
+class Command(BaseCommand):
+    help = "Join-approval check benchmark: chat roster bitmap vs ORM"
+
+    def add_arguments(self, p):
+        p.add_argument("chat", help="pk чата или его Telegram id")
+        p.add_argument("--checks", type=int, default=20_000)
+        p.add_argument("--hit-ratio", type=float, default=0.2, help="доля проверок с правом")
+        p.add_argument("--output", default="join_check_report.json")
+
+    def handle(self, *args, **o):
+        key = int(o["chat"])
+        chat = TelegramChat.objects.filter(tg_id=key).first() or TelegramChat.objects.filter(pk=key).first()
+        if chat is None:
+            raise CommandError(f"Chat {key} not found")
+
+        entitled = list(entitlements.entitled_telegram_ids(chat.pk))
+        top = max(entitled, default=0)
+        rnd = random.Random(42)
+        ids = [
+            rnd.choice(entitled) if entitled and rnd.random() < o["hit_ratio"] else top + rnd.randint(1, 10**9)
+            for _ in range(o["checks"])
+        ]
+        User = get_user_model()
+
+        def orm(tg_user_id):
+            user_pk = User.objects.filter(telegram_id=tg_user_id).values_list("pk", flat=True).first()
+            return bool(user_pk) and entitlements.has_access(user_pk, chat.pk)
+
+        def bitmap(tg_user_id):
+            return chat_bitmap.may_have_access(chat.tg_id, tg_user_id)
+
+        chat_bitmap.get(chat.tg_id)   # прогрев: построение ростера не входит в замер
+        report = {
+            "chat": chat.pk,
+            "roster": len(entitled),
+            "checks": len(ids),
+            "results": {"bitmap": self._run(bitmap, ids), "orm": self._run(orm, ids)},
+        }
+        mismatches = sum(bitmap(tg) != orm(tg) for tg in ids[:1000])
+        report["mismatches_first_1000"] = mismatches
+        with open(o["output"], "w") as f:
+            json.dump(report, f, indent=2)
+        for name, res in report["results"].items():
+            self.stdout.write(f"{name}: {json.dumps(res)}")
+        self.stdout.write(self.style.SUCCESS(f"Report: {o['output']}"))
+
+    def _run(self, fn, ids) -> dict:
+        queries = [0]
+
+        def count(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        latencies = []
+        allowed = 0
+        with connection.execute_wrapper(count):
+            t0 = time.perf_counter()
+            for tg in ids:
+                s = time.perf_counter()
+                allowed += fn(tg)
+                latencies.append(time.perf_counter() - s)
+            wall = time.perf_counter() - t0
+        return {
+            "ops_per_s": round(len(ids) / wall) if wall else None,
+            "latency_us_p50": _pct(latencies, 0.50),
+            "latency_us_p99": _pct(latencies, 0.99),
+            "allowed": allowed,
+            "queries": queries[0],
+        }
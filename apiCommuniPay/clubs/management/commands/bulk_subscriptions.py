@@ -0,0 +1,39 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apiCommuniPay.clubs import bulk_ops, seats
+from apiCommuniPay.clubs.models import Plan
+
+
+class Command(BaseCommand):
+    help = "Bulk subscription operations for a plan: extend N days, migrate to another plan, cancel"
+
+    def add_arguments(self, p):
+        p.add_argument("plan", type=int)
+        p.add_argument("op", choices=bulk_ops.OPS)
+        p.add_argument("--days", type=int, help="на сколько дней продлить (extend)")
+        p.add_argument("--to-plan", type=int, help="целевой тариф (migrate)")
+        p.add_argument("--chunk", type=int, default=bulk_ops.CHUNK_SIZE, help="подписок на один UPDATE")
+        p.add_argument("--dry-run", action="store_true", help="только посчитать")
+
+    def handle(self, *args, **o):
+        plan = Plan.objects.filter(pk=o["plan"]).first()
+        if plan is None:
+            raise CommandError(f"Plan {o['plan']} not found")
+        kw = {"dry_run": o["dry_run"], "chunk_size": o["chunk"]}
+        try:
+            if o["op"] == "extend":
+                if not o["days"] or o["days"] < 1:
+                    raise CommandError("--days is required for extend")
+                result = bulk_ops.extend(plan, o["days"], **kw)
+            elif o["op"] == "migrate":
+                to_plan = Plan.objects.filter(pk=o["to_plan"]).first() if o["to_plan"] else None
+                if to_plan is None:
+                    raise CommandError("--to-plan is required for migrate")
+                result = bulk_ops.migrate(plan, to_plan, **kw)
+            else:
+                result = bulk_ops.cancel(plan, **kw)
+        except (ValueError, seats.PlanSoldOut) as e:
+            raise CommandError(str(e))
+        self.stdout.write(json.dumps(result.as_dict()))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apiCommuniPay.clubs import expiry
+
+
+class Command(BaseCommand):
+    help = "Expire due subscriptions in bounded batches and queue removal of members who lost access"
+
+    def add_arguments(self, p):
+        p.add_argument("--batch", type=int, default=expiry.BATCH_SIZE, help="подписок за одну транзакцию")
+        p.add_argument("--max-batches", type=int, default=expiry.MAX_BATCHES, help="пачек за один проход")
+        p.add_argument("--loop", action="store_true", help="работать непрерывно")
+        p.add_argument("--interval", type=float, default=30.0, help="пауза между проходами, сек")
+        p.add_argument("--no-kick", action="store_true", help="не удалять пользователей из чатов")
+
+    def handle(self, *args, **o):
+        while True:
+            stats = expiry.tick(batch_size=o["batch"], max_batches=o["max_batches"], kick=not o["no_kick"])
+            if stats["expired"] or not o["loop"]:
+                self.stdout.write(
+                    f"Expired: {stats['expired']}  batches: {stats['batches']}  "
+                    f"revoked: {stats['revoked']}  queued: {stats['queued']}"
+                )
+            if not o["loop"]:
+                return
+            # пачки кончились раньше лимита — ждём; упёрлись в лимит — сразу следующий проход
+            if stats["batches"] < o["max_batches"]:
+                time.sleep(o["interval"])
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apiCommuniPay.clubs import entitlements
+from apiCommuniPay.common.models import TelegramChat
+
+
+class Command(BaseCommand):
+    help = "Stream telegram_ids entitled to a TelegramChat (NDJSON or CSV)"
+
+    def add_arguments(self, p):
+        p.add_argument("chat", help="pk чата или его Telegram id (tg_id)")
+        p.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+        p.add_argument("--output", help="файл; по умолчанию stdout")
+
+    def handle(self, *args, **o):
+        try:
+            key = int(o["chat"])
+        except ValueError:
+            raise CommandError("chat must be an integer")
+        chat = TelegramChat.objects.filter(pk=key).first() or TelegramChat.objects.filter(tg_id=key).first()
+        if chat is None:
+            raise CommandError(f"TelegramChat {key} not found")
+
+        frames = entitlements.render_roster(entitlements.entitled_telegram_ids(chat.pk), o["format"])
+        if not o["output"]:
+            for frame in frames:
+                self.stdout.write(frame, ending="")
+            return
+        with open(o["output"], "w") as f:
+            f.writelines(frames)
@@ -0,0 +1,50 @@
+import csv
+import json
+from dataclasses import asdict, fields
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from apiCommuniPay.clubs import subscriber_import
+from apiCommuniPay.projects.models import Project
+
+
+class Command(BaseCommand):
+    help = "Import subscribers of a project from CSV (telegram_id or email, plan, ends_at)"
+
+    def add_arguments(self, p):
+        p.add_argument("project", help="id проекта (UUID)")
+        p.add_argument("file", help="путь к CSV")
+        p.add_argument("--chunk", type=int, default=subscriber_import.CHUNK_SIZE, help="строк на транзакцию")
+        p.add_argument("--errors", default="import_errors.csv", help="отчёт об ошибочных строках (CSV)")
+
+    def handle(self, *args, **o):
+        try:
+            project = Project.objects.filter(pk=o["project"]).first()
+        except ValidationError:
+            project = None
+        if project is None:
+            raise CommandError(f"Project {o['project']} not found")
+
+        def progress(stats):
+            self.stdout.write(
+                f"rows: {stats.rows}  subscriptions: {stats.subscriptions_created}  "
+                f"users: {stats.users_created}  skipped: {stats.skipped}  errors: {stats.errors}"
+            )
+
+        with open(o["file"], newline="", encoding="utf-8-sig") as src, \
+                open(o["errors"], "w", newline="", encoding="utf-8") as report:
+            writer = csv.DictWriter(report, [f.name for f in fields(subscriber_import.RowError)])
+            writer.writeheader()
+            try:
+                stats = subscriber_import.import_csv(
+                    project, src, chunk_size=max(1, o["chunk"]),
+                    on_progress=progress, on_error=lambda e: writer.writerow(asdict(e)),
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+        self.stdout.write(json.dumps(stats.as_dict()))
+        if stats.errors:
+            self.stdout.write(self.style.WARNING(f"Errors: {stats.errors}, see {o['errors']}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("OK"))
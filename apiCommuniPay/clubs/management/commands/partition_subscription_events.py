@@ -0,0 +1,26 @@
+import datetime as dt
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apiCommuniPay.clubs import event_log
+
+
+class Command(BaseCommand):
+    help = "Create upcoming monthly partitions of the subscription event log and drop old ones"
+
+    def add_arguments(self, p):
+        p.add_argument("--ahead", type=int, default=event_log.PARTITIONS_AHEAD, help="месяцев вперёд")
+        p.add_argument("--drop-before", metavar="YYYY-MM", help="удалить события раньше этого месяца")
+
+    def handle(self, *args, **o):
+        for name in event_log.ensure_partitions(o["ahead"]):
+            self.stdout.write(f"created {name}")
+        if o["drop_before"]:
+            try:
+                month = dt.datetime.strptime(o["drop_before"], "%Y-%m").date()
+            except ValueError:
+                raise CommandError("--drop-before: expected YYYY-MM")
+            dropped = event_log.drop_before(month)
+            unit = "partitions" if event_log.partitioned() else "rows"
+            self.stdout.write(f"dropped {dropped} {unit} before {month:%Y-%m}")
+        self.stdout.write(self.style.SUCCESS("OK"))
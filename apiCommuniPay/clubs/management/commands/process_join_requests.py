@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apiCommuniPay.clubs import join_requests
+
+
+class Command(BaseCommand):
+    help = "Decide pending join requests in batches and queue approve/decline for Telegram"
+
+    def add_arguments(self, p):
+        p.add_argument("--batch", type=int, default=join_requests.BATCH_SIZE, help="заявок за одну транзакцию")
+        p.add_argument("--max-batches", type=int, default=join_requests.MAX_BATCHES, help="пачек за один проход")
+        p.add_argument("--loop", action="store_true", help="работать непрерывно")
+        p.add_argument("--interval", type=float, default=5.0, help="пауза между проходами, сек")
+
+    def handle(self, *args, **o):
+        while True:
+            stats = join_requests.tick(batch_size=o["batch"], max_batches=o["max_batches"])
+            if stats["confirmed"] or stats["rejected"] or not o["loop"]:
+                self.stdout.write("  ".join(f"{k}: {v}" for k, v in stats.items()))
+            if not o["loop"]:
+                return
+            if stats["batches"] < o["max_batches"]:
+                time.sleep(o["interval"])
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apiCommuniPay.clubs import payments
+
+
+class Command(BaseCommand):
+    help = "Process payment provider callbacks in batches: activate paid subscriptions, decide join requests"
+
+    def add_arguments(self, p):
+        p.add_argument("--batch", type=int, default=payments.BATCH_SIZE, help="уведомлений за одну транзакцию")
+        p.add_argument("--max-batches", type=int, default=payments.MAX_BATCHES, help="пачек за один проход")
+        p.add_argument("--loop", action="store_true", help="работать непрерывно")
+        p.add_argument("--interval", type=float, default=1.0, help="пауза между проходами, сек")
+
+    def handle(self, *args, **o):
+        while True:
+            stats = payments.tick(batch_size=o["batch"], max_batches=o["max_batches"])
+            if stats["batches"] or not o["loop"]:
+                self.stdout.write("  ".join(f"{k}: {v}" for k, v in stats.items()))
+            if not o["loop"]:
+                return
+            if stats["batches"] < o["max_batches"]:
+                time.sleep(o["interval"])
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apiCommuniPay.clubs import entitlements
+from apiCommuniPay.common.models import TelegramChat
+from apiCommuniPay.projects.models import Project
+
+
+class Command(BaseCommand):
+    help = "Verify ChatEntitlement/ProjectEntitlement against subscriptions (and repair unless --check)"
+
+    def add_arguments(self, p):
+        p.add_argument("--check", action="store_true", help="только сверить, ничего не менять")
+        p.add_argument("--chunk", type=int, default=200, help="чатов (проектов) за один проход")
+
+    def handle(self, *args, **o):
+        totals = {"missing": 0, "extra": 0, "changed": 0}
+        chats = self._pass(
+            TelegramChat, o, totals,
+            lambda chunk: entitlements.diff(chat_ids=chunk),
+            lambda chunk: entitlements.refresh(chat_ids=chunk),
+        )
+        projects = self._pass(
+            Project, o, totals,
+            lambda chunk: entitlements.diff_projects(project_ids=chunk),
+            lambda chunk: entitlements.refresh(project_ids=chunk),
+        )
+
+        self.stdout.write(
+            f"Chats: {chats}  projects: {projects}  missing: {totals['missing']}  "
+            f"extra: {totals['extra']}  changed: {totals['changed']}"
+        )
+        drift = sum(totals.values())
+        if o["check"] and drift:
+            raise CommandError(f"Entitlement drift: {drift} rows")
+        self.stdout.write(self.style.SUCCESS("OK" if not drift else f"Repaired: {drift}"))
+
+    def _pass(self, model, o, totals, diff, refresh) -> int:
+        ids = list(model.objects.order_by("pk").values_list("pk", flat=True))
+        for i in range(0, len(ids), o["chunk"]):
+            chunk = ids[i:i + o["chunk"]]
+            _, missing, extra, changed = diff(chunk)
+            totals["missing"] += len(missing)
+            totals["extra"] += len(extra)
+            totals["changed"] += len(changed)
+            if not o["check"] and (missing or extra or changed):
+                refresh(chunk)
+        return len(ids)
@@ -0,0 +1,30 @@
+import datetime as dt
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apiCommuniPay.clubs import rollups
+from apiCommuniPay.clubs.models import Plan
+
+
+class Command(BaseCommand):
+    help = "Backfill daily plan stats (active, MRR, churn) from subscriptions"
+
+    def add_arguments(self, p):
+        p.add_argument("plans", nargs="*", type=int, help="pk тарифов (по умолчанию — все)")
+        p.add_argument("--project", help="только тарифы проекта (UUID)")
+        p.add_argument("--since", metavar="YYYY-MM-DD", help="пересчитать с этого дня (по умолчанию — всю историю)")
+
+    def handle(self, *args, **o):
+        plans = Plan.objects.all()
+        if o["plans"]:
+            plans = plans.filter(pk__in=o["plans"])
+        if o["project"]:
+            plans = plans.filter(project_id=o["project"])
+        since = None
+        if o["since"]:
+            try:
+                since = dt.date.fromisoformat(o["since"])
+            except ValueError:
+                raise CommandError("--since: expected YYYY-MM-DD")
+        written = rollups.rebuild(plans, since)
+        self.stdout.write(self.style.SUCCESS(f"Rows written: {written}"))
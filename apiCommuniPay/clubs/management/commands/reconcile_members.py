@@ -0,0 +1,28 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from apiCommuniPay.clubs import reconcile
+from apiCommuniPay.common.models import TelegramChat
+
+
+class Command(BaseCommand):
+    help = "Reconcile Telegram chat members with paid entitlements (kick / approve only the diff)"
+
+    def add_arguments(self, p):
+        p.add_argument("chats", nargs="*", type=int, help="pk чатов (по умолчанию — все активные с проектом)")
+        p.add_argument("--dry-run", action="store_true", help="только посчитать действия")
+
+    def handle(self, *args, **o):
+        qs = TelegramChat.objects.filter(project__isnull=False)
+        qs = qs.filter(pk__in=o["chats"]) if o["chats"] else qs.filter(status=TelegramChat.ChatStatus.ACTIVE)
+        totals = {"chats": 0, "kick": 0, "approve": 0, "kicked": 0, "approved": 0}
+        for chat in qs.order_by("pk").iterator():
+            diff = reconcile.reconcile(chat, dry_run=o["dry_run"])
+            row = diff.as_dict()
+            totals["chats"] += 1
+            for key in ("kick", "approve", "kicked", "approved"):
+                totals[key] += row[key]
+            if row["kick"] or row["approve"]:
+                self.stdout.write(json.dumps(row))
+        self.stdout.write(self.style.SUCCESS(json.dumps(totals)))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apiCommuniPay.clubs import seats
+
+
+class Command(BaseCommand):
+    help = "Recompute PlanSeats counters from active subscriptions"
+
+    def add_arguments(self, p):
+        p.add_argument("plans", nargs="*", type=int, help="pk тарифов (по умолчанию — все)")
+        p.add_argument("--check", action="store_true", help="только сообщить о расхождениях (код выхода ≠ 0)")
+
+    def handle(self, *args, **o):
+        if o["check"]:
+            drift = self._drift(o["plans"] or None)
+        else:
+            drift = seats.recount(o["plans"] or None)
+        for plan_id, (was, now) in sorted(drift.items()):
+            self.stdout.write(f"plan {plan_id}: {was} → {now}")
+        if o["check"] and drift:
+            raise CommandError(f"Seat counters drift in {len(drift)} plans")
+        self.stdout.write(self.style.SUCCESS("OK" if not drift else f"Repaired: {len(drift)}"))
+
+    def _drift(self, plan_ids):
+        # тот же пересчёт, но с откатом — ничего не меняем
+        with transaction.atomic():
+            drift = seats.recount(plan_ids)
+            transaction.set_rollback(True)
+        return drift
@@ -0,0 +1,31 @@
+import datetime as dt
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apiCommuniPay.clubs import telegram_outbox
+
+
+class Command(BaseCommand):
+    help = "Send queued Telegram actions (kick, approve, decline) in batches with retries"
+
+    def add_arguments(self, p):
+        p.add_argument("--batch", type=int, default=telegram_outbox.BATCH_SIZE, help="действий за одну пачку")
+        p.add_argument("--max-batches", type=int, default=telegram_outbox.MAX_BATCHES, help="пачек за один проход")
+        p.add_argument("--loop", action="store_true", help="работать непрерывно")
+        p.add_argument("--interval", type=float, default=2.0, help="пауза между проходами, сек")
+        p.add_argument("--purge-days", type=int, default=None, help="удалить выполненные действия старше N дней")
+
+    def handle(self, *args, **o):
+        if o["purge_days"] is not None:
+            n = telegram_outbox.purge(timezone.now() - dt.timedelta(days=o["purge_days"]))
+            self.stdout.write(f"Purged: {n}")
+        while True:
+            stats = telegram_outbox.tick(batch_size=o["batch"], max_batches=o["max_batches"])
+            if stats["claimed"] or not o["loop"]:
+                self.stdout.write("  ".join(f"{k}: {v}" for k, v in stats.items()))
+            if not o["loop"]:
+                return
+            if stats["batches"] < o["max_batches"]:
+                time.sleep(o["interval"])
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from apiCommuniPay.clubs import renewal
+
+
+class Command(BaseCommand):
+    help = "Charge recurring subscriptions due for renewal; extension follows the provider callback (resumes an unfinished run)"
+
+    def add_arguments(self, p):
+        p.add_argument("--chunk", type=int, default=renewal.CHUNK_SIZE, help="подписок за пачку")
+        p.add_argument("--concurrency", type=int, default=renewal.CONCURRENCY, help="параллельных запросов к провайдеру")
+        p.add_argument("--provider", help="имя провайдера из PAYMENT_PROVIDERS")
+        p.add_argument("--max-chunks", type=int, help="остановиться после N пачек (продолжить — следующим запуском)")
+        p.add_argument("--new", action="store_true", help="начать новый прогон, не продолжая незавершённый")
+
+    def handle(self, *args, **o):
+        run = renewal.start() if o["new"] else None
+        run = renewal.run(
+            run, chunk_size=o["chunk"], concurrency=o["concurrency"],
+            provider=o["provider"], max_chunks=o["max_chunks"],
+        )
+        state = "finished" if run.finished_at else f"paused at ({run.cursor_ends_at}, {run.cursor_pk})"
+        self.stdout.write(
+            f"Run {run.pk} {state}  charged: {run.charged}  failed: {run.failed}  skipped: {run.skipped}"
+        )
@@ -0,0 +1,32 @@
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Q
+
+
+def backfill_used(apps, schema_editor):
+    """Счётчики для существующих тарифов — по числу активных подписок (как `recount_seats`)."""
+    Plan = apps.get_model('clubs', 'Plan')
+    PlanSeats = apps.get_model('clubs', 'PlanSeats')
+    counts = Plan.objects.annotate(n=Count('subscriptions', filter=Q(subscriptions__status='active')))
+    PlanSeats.objects.bulk_create(
+        [PlanSeats(plan_id=pk, used=n) for pk, n in counts.values_list('pk', 'n').iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clubs', '0004_plan_all_channels_projectentitlement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlanSeats',
+            fields=[
+                ('plan', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='seats', serialize=False, to='clubs.plan')),
+                ('used', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_used, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clubs', '0005_planseats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='subscription',
+            name='status',
+            field=models.CharField(default='active', help_text='pending / active / expired / canceled', max_length=16),
+        ),
+        migrations.CreateModel(
+            name='Payment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=32)),
+                ('provider_payment_id', models.CharField(blank=True, max_length=128, null=True)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('currency', models.CharField(default='RUB', max_length=3)),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('succeeded', 'Оплачен'), ('failed', 'Отклонён'), ('sold_out', 'Нет мест (возврат)')], default='pending', max_length=16)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('subscription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='clubs.subscription')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('provider', 'provider_payment_id'), name='payment_provider_id_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PaymentCallback',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=32)),
+                ('provider_payment_id', models.CharField(max_length=128)),
+                ('status', models.CharField(max_length=16)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.CharField(blank=True, default='', max_length=255)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['received_at'], name='payment_callback_todo')],
+                'constraints': [models.UniqueConstraint(fields=('provider', 'provider_payment_id', 'status'), name='payment_callback_uniq')],
+            },
+        ),
+    ]
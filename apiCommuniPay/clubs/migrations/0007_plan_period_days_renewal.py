@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clubs', '0006_payment_paymentcallback'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plan',
+            name='period_days',
+            field=models.PositiveIntegerField(blank=True, help_text='Период автопродления, дней', null=True),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.CreateModel(
+            name='RenewalRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cutoff', models.DateTimeField()),
+                ('cursor_ends_at', models.DateTimeField(blank=True, null=True)),
+                ('cursor_pk', models.BigIntegerField(default=0)),
+                ('renewed', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('skipped', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,89 @@
+"""
+Журнал подписок. На Postgres — таблица, секционированная по месяцам (created_at);
+секции на текущий и два следующих месяца создаются здесь, дальше —
+командой `partition_subscription_events`. На остальных СУБД — обычная таблица.
+"""
+import datetime
+
+from django.db import migrations, models
+import django.utils.timezone
+
+TABLE = "clubs_subscriptionevent"
+
+
+def _months(start: datetime.date, n: int):
+    y, m = start.year, start.month
+    for _ in range(n):
+        nxt = (y + m // 12, m % 12 + 1)
+        yield datetime.date(y, m, 1), datetime.date(nxt[0], nxt[1], 1)
+        y, m = nxt
+
+
+def create_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        schema_editor.create_model(apps.get_model("clubs", "SubscriptionEvent"))
+        return
+    schema_editor.execute(f"""
+        CREATE TABLE {TABLE} (
+            id bigint GENERATED BY DEFAULT AS IDENTITY,
+            kind varchar(16) NOT NULL,
+            subscription_id bigint NOT NULL,
+            user_id bigint NOT NULL,
+            plan_id bigint NOT NULL,
+            prev_plan_id bigint NULL,
+            status varchar(16) NOT NULL,
+            ends_at timestamp with time zone NULL,
+            created_at timestamp with time zone NOT NULL,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    schema_editor.execute(f"CREATE INDEX subevent_sub_created ON {TABLE} (subscription_id, created_at)")
+    schema_editor.execute(f"CREATE INDEX subevent_plan_created ON {TABLE} (plan_id, created_at)")
+    schema_editor.execute(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+    for lo, hi in _months(datetime.date.today(), 3):
+        schema_editor.execute(
+            f"CREATE TABLE {TABLE}_y{lo:%Y}m{lo:%m} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{lo.isoformat()}') TO ('{hi.isoformat()}')"
+        )
+
+
+def drop_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        schema_editor.delete_model(apps.get_model("clubs", "SubscriptionEvent"))
+        return
+    schema_editor.execute(f"DROP TABLE {TABLE} CASCADE")   # вместе с секциями
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clubs', '0007_plan_period_days_renewal'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='SubscriptionEvent',
+                    fields=[
+                        ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                        ('kind', models.CharField(choices=[('created', 'Создана'), ('activated', 'Активирована'), ('renewed', 'Продлена'), ('extended', 'Срок сдвинут'), ('expired', 'Истекла'), ('canceled', 'Отменена'), ('plan_changed', 'Сменён тариф')], max_length=16)),
+                        ('subscription_id', models.BigIntegerField()),
+                        ('user_id', models.BigIntegerField()),
+                        ('plan_id', models.BigIntegerField()),
+                        ('prev_plan_id', models.BigIntegerField(blank=True, null=True)),
+                        ('status', models.CharField(max_length=16)),
+                        ('ends_at', models.DateTimeField(blank=True, null=True)),
+                        ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                    ],
+                    options={
+                        'indexes': [
+                            models.Index(fields=['subscription_id', 'created_at'], name='subevent_sub_created'),
+                            models.Index(fields=['plan_id', 'created_at'], name='subevent_plan_created'),
+                        ],
+                    },
+                ),
+            ],
+            database_operations=[migrations.RunPython(create_table, drop_table)],
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0001_initial'),
+        ('clubs', '0008_subscriptionevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscriptionevent',
+            name='prev_status',
+            field=models.CharField(blank=True, max_length=16, null=True),
+        ),
+        migrations.CreateModel(
+            name='PlanDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('active', models.IntegerField(default=0)),
+                ('new', models.PositiveIntegerField(default=0)),
+                ('churned', models.PositiveIntegerField(default=0)),
+                ('renewed', models.PositiveIntegerField(default=0)),
+                ('mrr', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='clubs.plan')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='plan_stats', to='projects.project')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['project', 'day'], name='plan_stats_project_day')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='plandailystats',
+            constraint=models.UniqueConstraint(fields=('plan', 'day'), name='plan_daily_stats_uniq'),
+        ),
+    ]
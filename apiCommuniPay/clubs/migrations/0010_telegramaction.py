@@ -0,0 +1,31 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clubs', '0009_plandailystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelegramAction',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('kick', 'Удалить из чата'), ('approve', 'Одобрить заявку'), ('decline', 'Отклонить заявку')], max_length=16)),
+                ('chat_tg_id', models.BigIntegerField()),
+                ('user_tg_id', models.BigIntegerField()),
+                ('dedup_key', models.CharField(max_length=128, unique=True)),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('sent', 'Выполнено'), ('failed', 'Ошибка')], default='pending', max_length=16)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'available_at'], name='tgaction_status_available')],
+            },
+        ),
+    ]
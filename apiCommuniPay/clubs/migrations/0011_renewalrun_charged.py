@@ -0,0 +1,16 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clubs', '0010_telegramaction'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='renewalrun',
+            old_name='renewed',
+            new_name='charged',
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clubs', '0011_renewalrun_charged'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='telegramaction',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Ожидает'), ('sent', 'Выполнено'), ('failed', 'Ошибка'), ('skipped', 'Не требуется')], default='pending', max_length=16),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clubs', '0012_telegramaction_skipped'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='subscriptionevent',
+            name='kind',
+            field=models.CharField(choices=[('created', 'Создана'), ('activated', 'Активирована'), ('renewed', 'Продлена'), ('extended', 'Срок сдвинут'), ('expired', 'Истекла'), ('canceled', 'Отменена'), ('suspended', 'Снова ждёт оплаты'), ('deleted', 'Удалена'), ('plan_changed', 'Сменён тариф')], max_length=16),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0004_chatmember'),
+        ('clubs', '0013_subscriptionevent_kinds'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JoinRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает оплату'), ('confirmed', 'Подтверждено'), ('rejected', 'Отклонено')], default='pending', max_length=16)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('confirmed_at', models.DateTimeField(blank=True, null=True)),
+                ('chat', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='common.telegramchat')),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='clubs.plan')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['user', 'status'], name='clubs_joinr_user_id_9a8ab6_idx'),
+                    models.Index(fields=['chat', 'status'], name='clubs_joinr_chat_id_5b5b45_idx'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clubs', '0014_joinrequest'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Ожидает'), ('succeeded', 'Оплачен'), ('failed', 'Отклонён'), ('sold_out', 'Нет мест (возврат)'), ('refund', 'Не применён (возврат)')], default='pending', max_length=16),
+        ),
+    ]
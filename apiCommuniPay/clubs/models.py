@@ -6,6 +6,14 @@
 - PlanChannel: таблица-связка между тарифом и Telegram-чатом того же проекта.
 - Subscription: подписка пользователя на тариф (active/expired/canceled).
 - JoinRequest: служебная сущность — запрос на добавление в чат/канал по тарифу.
+- ChatEntitlement: материализованное право (user, chat) → valid_until для быстрых проверок доступа.
+- ProjectEntitlement: то же на уровне проекта — для тарифов «все чаты проекта».
+- PlanSeats: счётчик занятых мест тарифа для соблюдения Plan.limit.
+- Payment / PaymentCallback: платёж за подписку у провайдера и входящие уведомления о нём.
+- RenewalRun: контрольная точка прогона автопродления.
+- SubscriptionEvent: журнал изменений подписок (только добавление), по месяцам.
+- PlanDailyStats: дневные итоги тарифа (активные подписчики, MRR, отток) для дашбордов.
+- TelegramAction: очередь действий в Telegram (outbox), пишется в транзакции изменения.
 
 Ключевые инварианты и правила:
 - Тариф (Plan) всегда принадлежит ровно одному проекту.
@@ -48,11 +56,17 @@ class Plan(models.Model):
     description : str
         Необязательное подробное описание.
     limit : int | None
-        Необязательный «жёсткий» лимит активных подписчиков.
+        Необязательный «жёсткий» лимит активных подписчиков; соблюдается через
+        счётчик `PlanSeats` (см. `clubs/seats.py`).
     price : Decimal
         Неотрицательная цена тарифа; дополнительно защищена CheckConstraint в БД.
     is_public : bool
         Флаг публичной видимости тарифа.
+    all_channels : bool
+        Тариф даёт доступ ко всем чатам проекта, включая подключённые позже.
+        Строки `PlanChannel` для такого тарифа не нужны и при расчёте прав не учитываются.
+    period_days : int | None
+        Период автопродления; пусто — тариф не продлевается (`clubs/renewal.py`).
     channels : M2M[TelegramChat]
         Привязанные чаты/каналы через промежуточную модель `PlanChannel`.
 
@@ -68,6 +82,8 @@ class Plan(models.Model):
     limit = models.PositiveIntegerField(null=True, blank=True, help_text="Максимум подписчиков в тарифе")
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     is_public = models.BooleanField(default=True, db_index=True)
+    all_channels = models.BooleanField(default=False, help_text="Доступ ко всем чатам проекта")
+    period_days = models.PositiveIntegerField(null=True, blank=True, help_text="Период автопродления, дней")
 
     channels = models.ManyToManyField(
         TelegramChat, through="PlanChannel", related_name="plans", blank=True
@@ -122,7 +138,8 @@ class Subscription(models.Model):
     plan : Plan
         Тариф; удаление тарифа заблокировано, пока есть подписки (PROTECT).
     status : str
-        Текущий статус жизненного цикла: `active`, `expired` или `canceled`.
+        Текущий статус жизненного цикла: `pending` (ждёт оплату), `active`, `expired`
+        или `canceled`.
     starts_at / ends_at : datetime
         Временные границы подписки. Метод `is_expired()` — удобная проверка.
     created_at / updated_at : datetime
@@ -130,7 +147,8 @@ class Subscription(models.Model):
 
     Индексы
     -------
-    Индекс по `(user, status)` ускоряет типовые выборки активных подписок.
+    Индекс по `(user, status)` ускоряет типовые выборки активных подписок;
+    `(status, ends_at)` — выборку истёкших для планировщика (`clubs/expiry.py`).
     """
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="subscriptions")
@@ -139,7 +157,7 @@ class Subscription(models.Model):
     status = models.CharField(
         max_length=16,
         default="active",
-        help_text="active / expired / canceled",
+        help_text="pending / active / expired / canceled",
     )
 
     starts_at = models.DateTimeField(auto_now_add=True)
@@ -150,6 +168,7 @@ class Subscription(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=["user", "status"]),
+            models.Index(fields=["status", "ends_at"], name="sub_status_ends_at"),
         ]
 
     def is_expired(self) -> bool:
@@ -159,6 +178,22 @@ class Subscription(models.Model):
         return f"Subscription(user={self.user_id}, plan={self.plan_id}, status={self.status})"
 
 
+class PlanSeats(models.Model):
+    """
+    Число активных подписок тарифа — счётчик для `Plan.limit`.
+
+    Меняется только атомарными `UPDATE ... SET used = used ± n` в той же транзакции,
+    что и подписка; занятие места — условное (`used < limit`), поэтому продать
+    больше лимита нельзя даже при параллельных покупках. Сверка — `recount_seats`.
+    """
+
+    plan = models.OneToOneField(Plan, on_delete=models.CASCADE, primary_key=True, related_name="seats")
+    used = models.PositiveIntegerField(default=0)
+
+    def __str__(self) -> str:  # pragma: no cover
+        return f"PlanSeats(plan={self.plan_id}, used={self.used})"
+
+
 class JoinRequest(models.Model):
     """
     Служебная сущность: запрос на добавление пользователя в конкретный чат/канал по тарифу.
@@ -209,3 +244,292 @@ class JoinRequest(models.Model):
 
     def __str__(self) -> str:  # pragma: no cover
         return f"JoinRequest(user={self.user_id}, chat={self.chat_id}, plan={self.plan_id}, status={self.status})"
+
+
+class ChatEntitlement(models.Model):
+    """
+    Денормализованное право пользователя на чат: одна строка на пару (user, chat).
+
+    Производная от Subscription → Plan → PlanChannel; поддерживается инкрементально
+    сигналами (см. `clubs/entitlements.py`), сверяется командой `rebuild_entitlements`.
+    Проверка доступа — один lookup по уникальному индексу (user, chat) вместо джойна.
+
+    Поля
+    ----
+    user / chat : FK
+        Пара, для которой есть хотя бы одна активная подписка с доступом к чату.
+    valid_until : datetime | None
+        Максимальный `ends_at` среди таких подписок; NULL — бессрочно.
+        Истёкшие строки не мешают: доступ проверяется как `valid_until > now()`.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="chat_entitlements")
+    chat = models.ForeignKey(TelegramChat, on_delete=models.CASCADE, related_name="entitlements")
+    valid_until = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "chat"], name="entitlement_user_chat_uniq"),
+        ]
+
+    def is_valid(self, at=None) -> bool:
+        return self.valid_until is None or self.valid_until > (at or timezone.now())
+
+    def __str__(self) -> str:  # pragma: no cover
+        return f"ChatEntitlement(user={self.user_id}, chat={self.chat_id}, until={self.valid_until})"
+
+
+class ProjectEntitlement(models.Model):
+    """
+    Право пользователя на все чаты проекта: одна строка на пару (user, project).
+
+    Производная от подписок на тарифы с `all_channels=True`. Подключение нового чата
+    к проекту ничего сюда не пишет — доступ к чату проверяется через `chat.project_id`.
+    Поддерживается вместе с ChatEntitlement (см. `clubs/entitlements.py`).
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="project_entitlements")
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="entitlements")
+    valid_until = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "project"], name="entitlement_user_project_uniq"),
+        ]
+
+    def is_valid(self, at=None) -> bool:
+        return self.valid_until is None or self.valid_until > (at or timezone.now())
+
+    def __str__(self) -> str:  # pragma: no cover
+        return f"ProjectEntitlement(user={self.user_id}, project={self.project_id}, until={self.valid_until})"
+
+
+class Payment(models.Model):
+    """
+    Платёж за подписку у внешнего провайдера (`common/services.PaymentProvider`).
+
+    Создаётся вместе с подпиской `status=pending` при оформлении (`clubs/payments.py`)
+    или перед списанием за продление (`clubs/renewal.py`, с `idempotency_key` на период);
+    `provider_payment_id` записывается после ответа провайдера. Переходы статуса —
+    только из `pending`, поэтому повторные и запоздавшие уведомления ничего не меняют.
+
+    Статусы
+    -------
+    pending   — ждём уведомление;
+    succeeded — оплачено, подписка активирована (продлена — для платежа автопродления);
+    failed    — провайдер отклонил платёж, подписка отменена;
+    sold_out  — оплачено, но мест в тарифе уже нет: подписка отменена, нужен возврат;
+    refund    — оплачено, но применить не к чему (подписку отменили до оплаты, срок
+                продлеваемой подписки сменился): нужен возврат.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Ожидает"
+        SUCCEEDED = "succeeded", "Оплачен"
+        FAILED = "failed", "Отклонён"
+        SOLD_OUT = "sold_out", "Нет мест (возврат)"
+        REFUND = "refund", "Не применён (возврат)"
+
+    provider = models.CharField(max_length=32)
+    provider_payment_id = models.CharField(max_length=128, null=True, blank=True)
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, unique=True)
+    subscription = models.ForeignKey(Subscription, on_delete=models.CASCADE, related_name="payments")
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=3, default="RUB")
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    # аренда вызова провайдера: прогон автопродления, взявший платёж (clubs/renewal.py)
+    claimed_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["provider", "provider_payment_id"], name="payment_provider_id_uniq"),
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover
+        return f"Payment({self.provider}:{self.provider_payment_id}, status={self.status})"
+
+
+class PaymentCallback(models.Model):
+    """
+    Входящее уведомление провайдера — «входящий ящик» для фоновой обработки.
+
+    Вебхук только проверяет подпись и вставляет строку; уникальность
+    `(provider, provider_payment_id, status)` отсекает повторные доставки того же
+    события на уровне БД. Обработчик (`payments.process_batch`) выбирает строки
+    с `processed_at IS NULL` по частичному индексу.
+    """
+
+    provider = models.CharField(max_length=32)
+    provider_payment_id = models.CharField(max_length=128)
+    status = models.CharField(max_length=16)
+    payload = models.JSONField(default=dict, blank=True)
+
+    received_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    error = models.CharField(max_length=255, blank=True, default="")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["provider", "provider_payment_id", "status"], name="payment_callback_uniq",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["received_at"], name="payment_callback_todo",
+                         condition=Q(processed_at__isnull=True)),
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover
+        return f"PaymentCallback({self.provider}:{self.provider_payment_id} {self.status})"
+
+
+class RenewalRun(models.Model):
+    """
+    Контрольная точка прогона автопродления (`clubs/renewal.py`).
+
+    `cutoff` фиксируется при старте: списание заводится по подпискам с `ends_at <= cutoff`,
+    срок сдвигается по уведомлению провайдера (`clubs/payments.py`).
+    Курсор `(cursor_ends_at, cursor_pk)` — последняя обработанная подписка в порядке
+    `(ends_at, pk)`; сдвигается в той же транзакции, что и результаты пачки, поэтому
+    после падения прогон продолжается со следующей незакоммиченной пачки.
+    """
+
+    cutoff = models.DateTimeField()
+    cursor_ends_at = models.DateTimeField(null=True, blank=True)
+    cursor_pk = models.BigIntegerField(default=0)
+
+    charged = models.PositiveIntegerField(default=0)   # платёж создан, продление — по уведомлению
+    failed = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self) -> str:  # pragma: no cover
+        return f"RenewalRun({self.pk}, cutoff={self.cutoff}, finished={self.finished_at})"
+
+
+class SubscriptionEvent(models.Model):
+    """
+    Журнал жизненного цикла подписок — строки только добавляются (`clubs/event_log.py`).
+
+    Пишется в той же транзакции, что и изменение подписки: сигналами для одиночных
+    save() и явно — в массовых путях (истечение, оплата, продление, bulk-операции).
+    Ссылки — простые id без FK: история переживает удаление подписки или пользователя.
+
+    На Postgres таблица секционирована по `created_at` помесячно (PRIMARY KEY
+    `(id, created_at)`, секция DEFAULT для страховки); аналитика по периоду читает только
+    нужные секции, старые удаляются целиком (`partition_subscription_events`).
+    На SQLite — обычная таблица, удаление старых строк — DELETE пачками.
+    """
+
+    class Kind(models.TextChoices):
+        CREATED = "created", "Создана"
+        ACTIVATED = "activated", "Активирована"
+        RENEWED = "renewed", "Продлена"
+        EXTENDED = "extended", "Срок сдвинут"
+        EXPIRED = "expired", "Истекла"
+        CANCELED = "canceled", "Отменена"
+        SUSPENDED = "suspended", "Снова ждёт оплаты"   # active → pending
+        DELETED = "deleted", "Удалена"
+        PLAN_CHANGED = "plan_changed", "Сменён тариф"
+
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=16, choices=Kind.choices)
+    subscription_id = models.BigIntegerField()
+    user_id = models.BigIntegerField()
+    plan_id = models.BigIntegerField()
+    prev_plan_id = models.BigIntegerField(null=True, blank=True)
+    prev_status = models.CharField(max_length=16, null=True, blank=True)
+    status = models.CharField(max_length=16)
+    ends_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["subscription_id", "created_at"], name="subevent_sub_created"),
+            models.Index(fields=["plan_id", "created_at"], name="subevent_plan_created"),
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover
+        return f"SubscriptionEvent({self.kind}, sub={self.subscription_id}, at={self.created_at})"
+
+
+class PlanDailyStats(models.Model):
+    """
+    Итоги тарифа за день — дашборд проекта читает эти строки, а не подписки (`clubs/rollups.py`).
+
+    Обновляется инкрементально в той же транзакции, что и событие журнала подписок:
+    `active` и `mrr` — значения на конец дня (строка дня начинается с итогов предыдущей),
+    `new` / `churned` / `renewed` — счётчики переходов за день. Полный пересчёт —
+    команда `rebuild_plan_stats`.
+    """
+
+    project = models.ForeignKey(Project, related_name="plan_stats", on_delete=models.CASCADE)
+    plan = models.ForeignKey(Plan, related_name="daily_stats", on_delete=models.CASCADE)
+    day = models.DateField()
+    active = models.IntegerField(default=0)
+    new = models.PositiveIntegerField(default=0)
+    churned = models.PositiveIntegerField(default=0)
+    renewed = models.PositiveIntegerField(default=0)
+    mrr = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["plan", "day"], name="plan_daily_stats_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["project", "day"], name="plan_stats_project_day"),
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover
+        return f"PlanDailyStats(plan={self.plan_id}, day={self.day}, active={self.active})"
+
+
+class TelegramAction(models.Model):
+    """
+    Действие в Telegram (удалить из чата, одобрить/отклонить заявку) — transactional outbox
+    (`clubs/telegram_outbox.py`).
+
+    Строка пишется в той же транзакции, что и изменение подписки или заявки: откат
+    отменяет и действие, коммит гарантирует, что оно будет выполнено. Отправляет
+    отдельный воркер (`relay_telegram_outbox`), веб-запросы и пачки в Bot API не ходят.
+    `dedup_key` уникален — повтор того же решения (ретрай вебхука, повторный проход)
+    второй строки не создаёт.
+    """
+
+    class Kind(models.TextChoices):
+        KICK = "kick", "Удалить из чата"
+        APPROVE = "approve", "Одобрить заявку"
+        DECLINE = "decline", "Отклонить заявку"
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Ожидает"
+        SENT = "sent", "Выполнено"
+        FAILED = "failed", "Ошибка"
+        SKIPPED = "skipped", "Не требуется"   # kick: право на чат вернулось до отправки
+
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=16, choices=Kind.choices)
+    chat_tg_id = models.BigIntegerField()
+    user_tg_id = models.BigIntegerField()
+    dedup_key = models.CharField(max_length=128, unique=True)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)   # не раньше — ретрай или аренда воркером
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "available_at"], name="tgaction_status_available"),
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover
+        return f"TelegramAction({self.kind}, chat={self.chat_tg_id}, user={self.user_tg_id}, {self.status})"
@@ -0,0 +1,385 @@
+"""
+Оплата подписок через внешнего провайдера (`common/services.PaymentProvider`).
+
+Оформление (`start_checkout`):
+- в одной транзакции создаются подписка `status=pending` (место в тарифе ещё не занято)
+  и Payment; затем — вызов `provider.create_payment`, его id пишется в Payment; отказ
+  или исключение провайдера — платёж `failed`, подписка `canceled`.
+
+Приём уведомлений (`ingest`, вебхук `PaymentWebhookView`):
+- подпись проверяет провайдер, уведомления вставляются в PaymentCallback одним
+  `INSERT ... ON CONFLICT DO NOTHING` — повторная доставка того же события отсекается
+  уникальным индексом, ответ уходит сразу, без блокировок и бизнес-логики.
+
+Обработка (`process_batch`, команда `process_payments`):
+- пачка необработанных уведомлений забирается `select_for_update(skip_locked=True)`,
+  платежи пачки блокируются и читаются одним запросом;
+- переход статуса только из `pending`: дубли и запоздавшие уведомления не меняют уже
+  решённый платёж (out-of-order — первое терминальное событие побеждает);
+- оплаченные подписки занимают место (`seats.acquire`) и активируются UPDATE на срок
+  (`now + period_days` тарифа; без периода — `ends_at` оформления), оплаченное
+  автопродление (`clubs/renewal.py`) сдвигает срок на период,
+  при нехватке мест платёж помечается `sold_out` (нужен возврат);
+- оплата, которую применить уже не к чему (подписку отменили, пока она ждала оплаты,
+  или срок продлеваемой подписки с тех пор сменился), помечается `refund` — место
+  не занимается, в лог пишется предупреждение;
+- ожидающие JoinRequest пользователей по этим тарифам подтверждаются (отклоняются при
+  неуспехе) одним UPDATE, approve/decline в Telegram ставятся в очередь (`telegram_outbox`);
+  сигналы при массовых UPDATE не срабатывают, поэтому права
+  (`entitlements.refresh`), журнал подписок (`event_log`) и SSE-события обновляются здесь явно;
+- уведомление о платеже, которого ещё нет (колбэк обогнал запись id после
+  `create_payment`), ждёт `PAYMENT_ORPHAN_GRACE` секунд, потом помечается ошибкой;
+  `tick()` идёт по ящику курсором (received_at, pk), поэтому ждущие уведомления
+  не забираются повторно в том же проходе и не задерживают следующие.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import logging
+from collections import defaultdict
+from decimal import Decimal
+from typing import Iterable
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apiCommuniPay.common.services import PaymentNotification, PaymentResult, get_provider
+from apiCommuniPay.sse import events
+
+from . import entitlements, event_log, seats, telegram_outbox
+from .models import JoinRequest, Payment, PaymentCallback, Plan, Subscription
+
+logger = logging.getLogger("clubs.payments")
+
+BATCH_SIZE = getattr(settings, "PAYMENT_BATCH", 200)
+MAX_BATCHES = getattr(settings, "PAYMENT_MAX_BATCHES", 20)
+ORPHAN_GRACE = getattr(settings, "PAYMENT_ORPHAN_GRACE", 300)
+CURRENCY = getattr(settings, "PAYMENT_CURRENCY", "RUB")
+
+# значения статусов строками: ключи словарей ниже приходят и из БД, и от провайдера
+PENDING, SUCCEEDED, FAILED, SOLD_OUT, REFUND = (s.value for s in Payment.Status)
+TERMINAL = {SUCCEEDED, FAILED}
+
+
+def amount_minor(amount: Decimal) -> int:
+    """Сумма в копейках — так её ждёт `PaymentProvider.create_payment`."""
+    return int(amount * 100)
+
+
+def renewal_key(subscription_id: int, ends_at: dt.datetime) -> str:
+    """Ключ платежа автопродления: подписка и конец продлеваемого периода (`clubs/renewal.py`)."""
+    return f"renew:{subscription_id}:{int(ends_at.timestamp())}"
+
+
+def _renews(payment: Payment) -> bool:
+    """Платёж автопродления за текущий период подписки (срок с тех пор не менялся)."""
+    sub = payment.subscription
+    return sub.ends_at is not None and payment.idempotency_key == renewal_key(sub.pk, sub.ends_at)
+
+
+def _applicable(payment: Payment, plans: dict[int, Plan]) -> bool:
+    """
+    Оплату есть к чему применить: оформление ещё ждёт активации, продление — за текущий
+    период активной или истёкшей подписки тарифа с периодом.
+    """
+    sub = payment.subscription
+    if not (payment.idempotency_key or "").startswith("renew:"):
+        return sub.status == "pending"
+    return sub.status in ("active", "expired") and _renews(payment) and bool(plans[sub.plan_id].period_days)
+
+
+def start_checkout(
+    user,
+    plan: Plan,
+    provider: str | None = None,
+    ends_at: dt.datetime | None = None,
+) -> tuple[Payment, PaymentResult]:
+    """
+    Подписка `pending` + платёж у провайдера. PlanSoldOut — мест нет уже сейчас
+    (окончательно место занимается при активации).
+    """
+    if seats.free_seats(plan) == 0:
+        raise seats.PlanSoldOut(plan.pk)
+    name = provider or getattr(settings, "PAYMENT_DEFAULT_PROVIDER", None)
+    backend = get_provider(name)
+    with transaction.atomic():
+        sub = Subscription.objects.create(user=user, plan=plan, status="pending", ends_at=ends_at)
+        payment = Payment.objects.create(
+            provider=name, subscription=sub, amount=plan.price, currency=CURRENCY,
+        )
+
+    try:
+        res = backend.create_payment(
+            amount_minor(plan.price), CURRENCY, {"payment": payment.pk, "subscription": sub.pk},
+        )
+    except Exception as e:
+        # таймаут или ошибка провайдера — как отказ: платёж failed, подписка отменена
+        logger.exception("checkout: create_payment for payment=%s failed", payment.pk)
+        res = PaymentResult(ok=False, error=f"provider error: {e.__class__.__name__}")
+    if res.ok:
+        payment.provider_payment_id = res.provider_payment_id
+        Payment.objects.filter(pk=payment.pk).update(provider_payment_id=res.provider_payment_id)
+    else:
+        now = timezone.now()
+        payment.status, payment.processed_at = FAILED, now
+        Payment.objects.filter(pk=payment.pk).update(status=payment.status, processed_at=now)
+        with transaction.atomic():
+            if Subscription.objects.filter(pk=sub.pk, status="pending").update(status="canceled", updated_at=now):
+                event_log.record(
+                    event_log.Kind.CANCELED, [(sub.pk, user.pk, plan.pk, "canceled", ends_at)],
+                    at=now, prev_status=PENDING,
+                )
+    return payment, res
+
+
+def ingest(provider: str, notifications: Iterable[PaymentNotification]) -> int:
+    """Кладёт уведомления во входящий ящик. Дубли отбрасываются БД. Возвращает число переданных."""
+    rows = [
+        PaymentCallback(
+            provider=provider,
+            provider_payment_id=str(n.provider_payment_id),
+            status=n.status,
+            payload=n.raw or {},
+        )
+        for n in notifications
+    ]
+    PaymentCallback.objects.bulk_create(rows, ignore_conflicts=True)
+    return len(rows)
+
+
+def _decide(batch: list[PaymentCallback], payments: dict, now: dt.datetime) -> tuple[dict, list]:
+    """
+    Итог по каждому платежу пачки (первое терминальное уведомление в порядке получения)
+    и список обработанных уведомлений. Уведомления о ещё неизвестных платежах в пределах
+    ORPHAN_GRACE остаются в ящике.
+    """
+    outcome: dict[int, str] = {}
+    done = []
+    for cb in batch:
+        payment = payments.get((cb.provider, cb.provider_payment_id))
+        if payment is None:
+            if (now - cb.received_at).total_seconds() < ORPHAN_GRACE:
+                continue
+            cb.error = "unknown payment"
+            logger.warning("payment callback %s:%s: unknown payment", cb.provider, cb.provider_payment_id)
+        elif cb.status in TERMINAL and payment.status == PENDING and payment.pk not in outcome:
+            outcome[payment.pk] = cb.status
+        cb.processed_at = now
+        done.append(cb)
+    return outcome, done
+
+
+def process_batch(
+    now: dt.datetime | None = None,
+    batch_size: int = BATCH_SIZE,
+    after: tuple[dt.datetime, int] | None = None,
+) -> dict:
+    """
+    Обрабатывает одну пачку уведомлений после курсора `after` (received_at, pk) в одной
+    транзакции. Возвращает счётчики и `last` — курсор последнего забранного уведомления.
+    """
+    now = now or timezone.now()
+    stats = {
+        "claimed": 0, "callbacks": 0, "activated": 0, "renewed": 0, "failed": 0, "sold_out": 0, "refund": 0,
+        "confirmed": 0, "rejected": 0, "last": after,
+    }
+    with transaction.atomic():
+        todo = PaymentCallback.objects.select_for_update(skip_locked=True).filter(processed_at__isnull=True)
+        if after is not None:
+            todo = todo.filter(Q(received_at__gt=after[0]) | Q(received_at=after[0], pk__gt=after[1]))
+        batch = list(todo.order_by("received_at", "pk")[:batch_size])
+        if not batch:
+            return stats
+        stats["claimed"], stats["last"] = len(batch), (batch[-1].received_at, batch[-1].pk)
+
+        by_provider = defaultdict(set)
+        for cb in batch:
+            by_provider[cb.provider].add(cb.provider_payment_id)
+        payments = {}
+        for provider, ids in by_provider.items():
+            for p in (
+                Payment.objects
+                .select_for_update()
+                .filter(provider=provider, provider_payment_id__in=ids)
+                .select_related("subscription")
+            ):
+                payments[(p.provider, p.provider_payment_id)] = p
+
+        outcome, done = _decide(batch, payments, now)
+        stats["callbacks"] = len(done)
+        decided = {p.pk: p for p in payments.values() if p.pk in outcome}
+
+        plans = Plan.objects.in_bulk({p.subscription.plan_id for p in decided.values()})
+        result: dict[str, list[Payment]] = defaultdict(list)
+        for pk, status in outcome.items():
+            payment = decided[pk]
+            sub = payment.subscription
+            if status == SUCCEEDED and not _applicable(payment, plans):
+                logger.warning(
+                    "payment %s: paid, but subscription %s is %s now — refund needed", payment.pk, sub.pk, sub.status,
+                )
+                status = REFUND
+            # место нужно оформлению и продлению, которое пришло уже после истечения
+            elif status == SUCCEEDED and sub.status in ("pending", "expired"):
+                try:
+                    seats.acquire(plans[sub.plan_id])
+                except seats.PlanSoldOut:
+                    status = SOLD_OUT
+            result[status].append(payment)
+
+        for status, group in result.items():
+            Payment.objects.filter(pk__in=[p.pk for p in group]).update(status=status, processed_at=now)
+        _activate(result[SUCCEEDED], plans, now, stats)
+        _renew(result[SUCCEEDED], plans, now, stats)
+        _cancel(result[FAILED] + result[SOLD_OUT], now, stats)
+        stats["failed"] = len(result[FAILED])
+        stats["sold_out"] = len(result[SOLD_OUT])
+        stats["refund"] = len(result[REFUND])
+
+        PaymentCallback.objects.bulk_update(done, ["processed_at", "error"])
+    return stats
+
+
+def _activate(paid: list[Payment], plans: dict[int, Plan], now: dt.datetime, stats: dict) -> None:
+    """
+    Оплаченные подписки → active. Срок тарифа с периодом отсчитывается от активации
+    (`now + period_days`) — иначе продление (`clubs/renewal.py`) её никогда не выберет;
+    тариф без периода оставляет `ends_at` как есть.
+    """
+    subs = [p.subscription for p in paid if p.subscription.status == "pending"]
+    if not subs:
+        return
+    by_ends_at: dict[dt.datetime | None, list[Subscription]] = defaultdict(list)
+    for s in subs:
+        period = plans[s.plan_id].period_days
+        if period:
+            s.ends_at = now + dt.timedelta(days=period)
+        by_ends_at[s.ends_at].append(s)
+    # один UPDATE на срок: у подписок одного тарифа в пачке он общий
+    stats["activated"] = sum(
+        Subscription.objects
+        .filter(pk__in=[s.pk for s in group], status="pending")
+        .update(status="active", ends_at=ends_at, updated_at=now)
+        for ends_at, group in by_ends_at.items()
+    )
+    entitlements.refresh(user_ids={s.user_id for s in subs})
+    event_log.record(event_log.Kind.ACTIVATED, [(s.pk, s.user_id, s.plan_id, "active", s.ends_at) for s in subs], at=now, prev_status=PENDING)
+    for s in subs:
+        events.publish_user_event(s.user_id, events.SUBSCRIPTION_ACTIVATED, {
+            "subscription_id": s.pk,
+            "plan_id": s.plan_id,
+            "status": "active",
+            "ends_at": s.ends_at.isoformat() if s.ends_at else None,
+        })
+    stats["confirmed"] = _decide_join_requests(subs, "confirmed", now)
+
+
+def _renew(paid: list[Payment], plans: dict[int, Plan], now: dt.datetime, stats: dict) -> None:
+    """
+    Оплаченные платежи автопродления → `ends_at + period_days`. Подписка, успевшая
+    истечь до уведомления, снова активна (место занято выше). Неприменимые продления
+    сюда не доходят — они уже помечены `refund`.
+    """
+    subs, lapsed = [], []
+    for p in paid:
+        sub = p.subscription
+        if not (p.idempotency_key or "").startswith("renew:"):
+            continue
+        if sub.status == "expired":
+            lapsed.append(sub)
+        period = plans[sub.plan_id].period_days
+        sub.status, sub.ends_at, sub.updated_at = "active", sub.ends_at + dt.timedelta(days=period), now
+        subs.append(sub)
+    if not subs:
+        return
+    # строки подписок заблокированы вместе с платежами (select_for_update + select_related)
+    Subscription.objects.bulk_update(subs, ["status", "ends_at", "updated_at"])
+    stats["renewed"] = len(subs)
+    entitlements.refresh(user_ids={s.user_id for s in subs})
+    lapsed_pks = {s.pk for s in lapsed}
+    event_log.record(
+        event_log.Kind.RENEWED, [event_log.row(s) for s in subs if s.pk not in lapsed_pks], at=now, prev_status="active",
+    )
+    event_log.record(event_log.Kind.ACTIVATED, [event_log.row(s) for s in lapsed], at=now, prev_status="expired")
+    for s in subs:
+        events.publish_user_event(s.user_id, events.SUBSCRIPTION_RENEWED, {
+            "subscription_id": s.pk,
+            "plan_id": s.plan_id,
+            "status": "active",
+            "ends_at": s.ends_at.isoformat(),
+        })
+
+
+def _cancel(unpaid: list[Payment], now: dt.datetime, stats: dict) -> None:
+    subs = [p.subscription for p in unpaid if p.subscription.status == "pending"]
+    if not subs:
+        return
+    Subscription.objects.filter(pk__in=[s.pk for s in subs], status="pending").update(status="canceled", updated_at=now)
+    event_log.record(
+        event_log.Kind.CANCELED, [(s.pk, s.user_id, s.plan_id, "canceled", s.ends_at) for s in subs],
+        at=now, prev_status=PENDING,
+    )
+    for s in subs:
+        events.publish_user_event(s.user_id, events.SUBSCRIPTION_CANCELED, {
+            "subscription_id": s.pk,
+            "plan_id": s.plan_id,
+            "status": "canceled",
+            "ends_at": s.ends_at.isoformat() if s.ends_at else None,
+        })
+    stats["rejected"] = _decide_join_requests(subs, "rejected", now)
+
+
+def _decide_join_requests(subs: list[Subscription], status: str, now: dt.datetime) -> int:
+    """
+    Ожидающие заявки по парам (user, plan) этих подписок → status одним UPDATE;
+    approve/decline для Telegram — в очередь (`telegram_outbox`) в той же транзакции.
+    """
+    pairs = {(s.user_id, s.plan_id) for s in subs}
+    rows = [
+        row
+        for row in (
+            JoinRequest.objects
+            .filter(status="pending", user_id__in={u for u, _ in pairs}, plan_id__in={p for _, p in pairs})
+            .values_list("pk", "user_id", "chat_id", "plan_id", "user__telegram_id", "chat__tg_id", "chat__status")
+        )
+        if (row[1], row[3]) in pairs
+    ]
+    if not rows:
+        return 0
+    JoinRequest.objects.filter(pk__in=[r[0] for r in rows], status="pending").update(
+        status=status, confirmed_at=now if status == "confirmed" else None,
+    )
+    telegram_outbox.decide_join_requests(
+        (pk, user_tg, chat_tg, chat_status, status == "confirmed")
+        for pk, _, _, _, user_tg, chat_tg, chat_status in rows
+    )
+    for pk, user_id, chat_id, plan_id, *_ in rows:
+        events.publish_user_event(user_id, events.JOIN_REQUEST_DECIDED, {
+            "join_request_id": pk,
+            "chat_id": chat_id,
+            "plan_id": plan_id,
+            "status": status,
+        })
+    return len(rows)
+
+
+def tick(now: dt.datetime | None = None, batch_size: int = BATCH_SIZE, max_batches: int = MAX_BATCHES) -> dict:
+    """
+    Один проход: не больше max_batches пачек. Курсор — уведомления, которые ещё ждут
+    свой платёж (`ORPHAN_GRACE`), не забираются повторно в том же проходе.
+    """
+    total = {"batches": 0}
+    after = None
+    for _ in range(max_batches):
+        stats = process_batch(now, batch_size, after)
+        if not stats["claimed"]:
+            break
+        after = stats.pop("last")
+        total["batches"] += 1
+        for k, v in stats.items():
+            total[k] = total.get(k, 0) + v
+        if stats["claimed"] < batch_size:
+            break
+    return total
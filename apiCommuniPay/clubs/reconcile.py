@@ -0,0 +1,152 @@
+"""
+Сверка участников Telegram-чата с оплаченными правами.
+
+Для чата берутся три отсортированных массива telegram_id (`array('q')`, 8 байт на id):
+- members  — снимок участников (ChatMember) без админов и создателя;
+- entitled — у кого есть право на чат (`entitlements.entitled_telegram_ids`);
+- pending  — пользователи с JoinRequest(status=pending) на этот чат.
+
+Действия — разности слиянием за O(n + m):
+- kick    = members − entitled;
+- approve = (pending ∩ entitled) − members.
+
+Действия ставятся в очередь (`telegram_outbox`) только для этих множеств, так что
+прогон стоит O(diff) запросов к Telegram, а не O(участников). В той же транзакции
+удаляемые убираются из снимка, одобренные заявки переводятся в `confirmed`;
+Bot API вызывает relay, с ретраями и общим rate limit.
+"""
+from __future__ import annotations
+
+import logging
+from array import array
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from django.db import transaction
+from django.utils import timezone
+
+from apiCommuniPay.common.models import ChatMember, TelegramChat
+
+from . import entitlements, telegram_outbox
+from .models import JoinRequest
+
+logger = logging.getLogger("clubs.reconcile")
+
+
+def sorted_ids(ids: Iterable[int]) -> array:
+    """Отсортированный массив уникальных int64."""
+    out = array("q")
+    prev = None
+    for x in sorted(array("q", ids)):
+        if x != prev:
+            out.append(x)
+            prev = x
+    return out
+
+
+def difference(a: array, b: array) -> array:
+    """a − b для отсортированных массивов."""
+    out, j, m = array("q"), 0, len(b)
+    for x in a:
+        while j < m and b[j] < x:
+            j += 1
+        if j == m or b[j] != x:
+            out.append(x)
+    return out
+
+
+def intersection(a: array, b: array) -> array:
+    """a ∩ b для отсортированных массивов."""
+    out, i, j = array("q"), 0, 0
+    while i < len(a) and j < len(b):
+        if a[i] < b[j]:
+            i += 1
+        elif a[i] > b[j]:
+            j += 1
+        else:
+            out.append(a[i])
+            i += 1
+            j += 1
+    return out
+
+
+@dataclass
+class ChatDiff:
+    chat_id: int
+    members: int = 0
+    entitled: int = 0
+    kick: array = field(default_factory=lambda: array("q"))
+    approve: array = field(default_factory=lambda: array("q"))
+    kicked: int = 0
+    approved: int = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "chat": self.chat_id, "members": self.members, "entitled": self.entitled,
+            "kick": len(self.kick), "approve": len(self.approve),
+            "kicked": self.kicked, "approved": self.approved,
+        }
+
+
+def plan(chat: TelegramChat) -> ChatDiff:
+    """Считает минимальные множества действий, ничего не меняя."""
+    members = sorted_ids(
+        ChatMember.objects
+        .filter(chat=chat)
+        .exclude(status__in=ChatMember.ADMIN_STATUSES)
+        .values_list("tg_user_id", flat=True)
+        .iterator(chunk_size=entitlements.ROSTER_CHUNK)
+    )
+    entitled = sorted_ids(entitlements.entitled_telegram_ids(chat.pk))
+    pending = sorted_ids(
+        JoinRequest.objects
+        .filter(chat=chat, status="pending", user__telegram_id__isnull=False)
+        .values_list("user__telegram_id", flat=True)
+    )
+    return ChatDiff(
+        chat_id=chat.pk,
+        members=len(members),
+        entitled=len(entitled),
+        kick=difference(members, entitled),
+        approve=difference(intersection(pending, entitled), members),
+    )
+
+
+def apply(chat: TelegramChat, diff: ChatDiff) -> ChatDiff:
+    """
+    Ставит действия из diff в очередь Telegram одной транзакцией. `kicked` / `approved`
+    — сколько поставлено; выполнит их relay (`relay_telegram_outbox`).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        kicked = telegram_outbox.enqueue(
+            telegram_outbox.action(
+                telegram_outbox.Kind.KICK, chat.tg_id, tg_user_id,
+                f"kick:{chat.tg_id}:{tg_user_id}:reconcile:{now.timestamp():.0f}",
+            )
+            for tg_user_id in diff.kick
+        )
+        ChatMember.objects.filter(chat=chat, tg_user_id__in=list(diff.kick)).delete()
+
+        # по одной, чтобы сработали сигналы (SSE join_request.decided) — их O(diff)
+        approved = list(
+            JoinRequest.objects
+            .filter(chat=chat, status="pending", user__telegram_id__in=list(diff.approve))
+            .select_related("user")
+        )
+        for jr in approved:
+            jr.status, jr.confirmed_at = "confirmed", now
+            jr.save(update_fields=["status", "confirmed_at"])
+        telegram_outbox.decide_join_requests(
+            (jr.pk, jr.user.telegram_id, chat.tg_id, chat.status, True) for jr in approved
+        )
+
+    diff.kicked, diff.approved = kicked, len(approved)
+    return diff
+
+
+def reconcile(chat: TelegramChat, dry_run: bool = False) -> ChatDiff:
+    diff = plan(chat)
+    if dry_run or chat.status != TelegramChat.ChatStatus.ACTIVE:
+        return diff
+    return apply(chat, diff)
@@ -0,0 +1,202 @@
+"""
+Автопродление подписок на тарифы с `Plan.period_days`.
+
+Прогон (`RenewalRun`) фиксирует `cutoff = now + lead` и идёт по подпискам
+`status=active, ends_at <= cutoff` пачками в порядке `(ends_at, pk)`:
+- выборка — keyset-пагинация от курсора прогона по индексу `(status, ends_at)`,
+  без OFFSET и без повторного просмотра уже обработанных строк;
+- на каждую подписку и период заводится Payment с `idempotency_key =
+  renew:<pk>:<ends_at>` (`payments.renewal_key`, `bulk_create(ignore_conflicts=True)`);
+  если платёж с этим ключом уже есть — берётся он;
+- перед вызовом провайдера платежи берутся в аренду: короткая транзакция
+  `select_for_update(skip_locked=True)` ставит `claimed_until = now + LEASE` только
+  свободным платежам — второй процесс `renew` над тем же окном их пропустит (`skipped`)
+  и не вызовет провайдера, даже если тот не смотрит на ключ идемпотентности;
+- провайдер вызывается вне транзакции, не больше `concurrency` запросов одновременно;
+  ключ передаётся провайдеру, так что повтор после падения не спишет деньги дважды;
+- результаты пачки пишутся одной транзакцией: `bulk_update` платежей и сдвиг курсора прогона.
+
+`create_payment().ok` значит только «платёж создан», а не «оплачен»: платёж остаётся
+`pending` (`charged` в прогоне), срок подписки сдвигает обработчик уведомлений
+провайдера (`payments.process_batch` → `_renew`), как и при оформлении. Отказ в
+уведомлении — подписка не продлевается и истечёт обычным порядком (`clubs/expiry.py`).
+
+Возобновление: незавершённый прогон продолжает с курсора. Платёж `pending` без id
+провайдера (упали между вызовом и записью, таймаут) — повторный вызов с тем же ключом,
+когда истечёт аренда упавшего процесса; с id — ждёт уведомления, повторно не
+списывается; `succeeded` / `failed` — уже решён.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apiCommuniPay.common.services import PaymentResult, get_provider
+
+from .models import Payment, RenewalRun, Subscription
+from .payments import CURRENCY, FAILED, PENDING, amount_minor, renewal_key
+
+logger = logging.getLogger("clubs.renewal")
+
+CHUNK_SIZE = getattr(settings, "SUBSCRIPTION_RENEWAL_CHUNK", 500)
+CONCURRENCY = getattr(settings, "SUBSCRIPTION_RENEWAL_CONCURRENCY", 8)
+LEAD = getattr(settings, "SUBSCRIPTION_RENEWAL_LEAD", 60 * 60)
+LEASE = getattr(settings, "SUBSCRIPTION_RENEWAL_LEASE", 10 * 60)   # сек; больше вызова провайдера на пачку
+
+
+@dataclass
+class Due:
+    pk: int
+    user_id: int
+    plan_id: int
+    ends_at: dt.datetime
+    price: object
+    period_days: int
+    payment: Payment | None = None
+    result: PaymentResult | None = field(default=None, repr=False)
+
+    @property
+    def key(self) -> str:
+        return renewal_key(self.pk, self.ends_at)
+
+
+def start(cutoff: dt.datetime | None = None) -> RenewalRun:
+    return RenewalRun.objects.create(cutoff=cutoff or timezone.now() + dt.timedelta(seconds=LEAD))
+
+
+def current() -> RenewalRun | None:
+    """Последний незавершённый прогон — его и продолжаем."""
+    return RenewalRun.objects.filter(finished_at__isnull=True).order_by("-pk").first()
+
+
+def due_chunk(run: RenewalRun, chunk_size: int = CHUNK_SIZE) -> list[Due]:
+    qs = Subscription.objects.filter(
+        status="active", ends_at__lte=run.cutoff, plan__period_days__gt=0,   # 0 — продлевать не на что
+        # продлённая в этом прогоне подписка может снова попасть под cutoff — второй
+        # период за один прогон не списываем
+        updated_at__lt=run.started_at,
+    )
+    if run.cursor_ends_at is not None:
+        qs = qs.filter(
+            Q(ends_at__gt=run.cursor_ends_at) | Q(ends_at=run.cursor_ends_at, pk__gt=run.cursor_pk)
+        )
+    return [
+        Due(*row)
+        for row in qs.order_by("ends_at", "pk").values_list(
+            "pk", "user_id", "plan_id", "ends_at", "plan__price", "plan__period_days",
+        )[:chunk_size]
+    ]
+
+
+def _prepare(items: list[Due], provider: str) -> None:
+    """Платёж на каждый (подписка, период): новый или оставшийся от прерванного прогона."""
+    Payment.objects.bulk_create(
+        [
+            Payment(provider=provider, idempotency_key=d.key, subscription_id=d.pk, amount=d.price, currency=CURRENCY)
+            for d in items
+        ],
+        ignore_conflicts=True,
+    )
+    by_key = {p.idempotency_key: p for p in Payment.objects.filter(idempotency_key__in=[d.key for d in items])}
+    for d in items:
+        d.payment = by_key[d.key]
+
+
+def _claim(items: list[Due], now: dt.datetime) -> set[int]:
+    """
+    Берёт в аренду платежи, которые надо отправить провайдеру: `pending`, без id провайдера
+    (с id — уже создан, ждём уведомления) и не в аренде у другого процесса. Возвращает pk.
+    """
+    with transaction.atomic():
+        claimed = set(
+            Payment.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                pk__in=[d.payment.pk for d in items], status=PENDING, provider_payment_id__isnull=True,
+            )
+            .filter(Q(claimed_until__isnull=True) | Q(claimed_until__lt=now))
+            .values_list("pk", flat=True)
+        )
+        Payment.objects.filter(pk__in=claimed).update(claimed_until=now + dt.timedelta(seconds=LEASE))
+    return claimed
+
+
+def _charge(backend, items: list[Due], concurrency: int) -> None:
+    claimed = _claim(items, timezone.now())
+    todo = [d for d in items if d.payment.pk in claimed]
+
+    def call(d: Due) -> PaymentResult | None:
+        try:
+            return backend.create_payment(amount_minor(d.price), CURRENCY, {
+                "subscription": d.pk,
+                "payment": d.payment.pk,
+                "idempotency_key": d.key,
+                "renewal": True,
+            })
+        except Exception:
+            logger.exception("renewal: charge subscription=%s failed", d.pk)
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        for d, res in zip(todo, pool.map(call, todo)):
+            d.result = res
+
+
+def _write(run: RenewalRun, items: list[Due], now: dt.datetime) -> dict:
+    stats = {"charged": 0, "failed": 0, "skipped": 0}
+    with transaction.atomic():
+        payments = []
+        for d in items:
+            payment = d.payment
+            if d.result is None:
+                # исключение провайдера (повтор после аренды), платёж уже создан/решён или в аренде у другого прогона
+                stats["skipped"] += 1
+                continue
+            if d.result.ok:
+                payment.provider_payment_id = d.result.provider_payment_id or payment.provider_payment_id
+                stats["charged"] += 1
+            else:
+                payment.status, payment.processed_at = FAILED, now
+                stats["failed"] += 1
+            payments.append(payment)
+        Payment.objects.bulk_update(payments, ["status", "provider_payment_id", "processed_at"])
+
+        last = items[-1]
+        run.cursor_ends_at, run.cursor_pk = last.ends_at, last.pk
+        run.charged += stats["charged"]
+        run.failed += stats["failed"]
+        run.skipped += stats["skipped"]
+        run.save(update_fields=["cursor_ends_at", "cursor_pk", "charged", "failed", "skipped"])
+    return stats
+
+
+def run(
+    renewal: RenewalRun | None = None,
+    chunk_size: int = CHUNK_SIZE,
+    concurrency: int = CONCURRENCY,
+    provider: str | None = None,
+    max_chunks: int | None = None,
+) -> RenewalRun:
+    """Проходит прогон до конца (или max_chunks пачек). Без renewal — продолжает незавершённый или начинает новый."""
+    renewal = renewal or current() or start()
+    name = provider or getattr(settings, "PAYMENT_DEFAULT_PROVIDER", None)
+    backend = get_provider(name)
+    chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        items = due_chunk(renewal, chunk_size)
+        if not items:
+            renewal.finished_at = timezone.now()
+            renewal.save(update_fields=["finished_at"])
+            break
+        _prepare(items, name)
+        _charge(backend, items, concurrency)
+        _write(renewal, items, timezone.now())
+        chunks += 1
+    return renewal
@@ -0,0 +1,244 @@
+"""
+Дневные итоги тарифов (`PlanDailyStats`) для дашборда проекта: активные подписчики,
+MRR, новые, отток и продления — без сканирования подписок на каждый запрос.
+
+Инкрементальное обновление (`apply`) вызывает журнал подписок (`event_log.record`) в той
+же транзакции, что и изменение подписки. На (тариф, день) — одна строка:
+- первая за день создаётся с `active` / `mrr` последней предыдущей строки тарифа
+  (дней без событий в таблице нет — чтение переносит значения вперёд);
+- переходы пачки суммируются в памяти и применяются одним `UPDATE ... SET x = x + d`
+  на (тариф, день), поэтому параллельные транзакции не теряют друг друга.
+Правила: active ↔ не active (в т.ч. удаление подписки) — `new` / `churned` и ±1 к `active`; смена тарифа
+активной подписки переносит её между тарифами без new/churned; `renewed` — автопродления.
+
+MRR — активные × месячная цена тарифа: `price * 30 / period_days`, для тарифов без
+периода — `price`. Изменение цены пересчитывает MRR текущего дня (clubs/signals.py).
+
+Полный пересчёт — `rebuild()` (команда `rebuild_plan_stats`). Подписки, чья история
+есть в журнале (сохранилось событие `created`), пересчитываются повтором журнала теми же
+правилами `deltas()`, что и у `apply`: `new` — в день активации (оплаты), `churned` — в
+день истечения / отмены, смены тарифа переносят `active`. Подписки старше журнала (или
+с удалёнными секциями) — по строкам: активна с `starts_at` до перехода в
+expired/canceled (`updated_at`), отменённые неоплаченные оформления (есть платёж, нет
+успешного) не считаются, смены тарифа не восстанавливаются.
+"""
+from __future__ import annotations
+
+import datetime as dt
+from collections import Counter, defaultdict
+from decimal import Decimal
+from typing import Iterable
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, QuerySet, Subquery
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apiCommuniPay.projects.models import Project
+
+from .models import Payment, Plan, PlanDailyStats, Subscription, SubscriptionEvent
+
+MONTH_DAYS = 30
+COUNTERS = ("active", "new", "churned", "renewed")
+
+Kind = SubscriptionEvent.Kind
+
+
+def monthly_price(price: Decimal, period_days: int | None) -> Decimal:
+    if not period_days:
+        return price
+    return (price * MONTH_DAYS / period_days).quantize(Decimal("0.01"))
+
+
+def _is_active(status: str | None) -> int:
+    return 1 if status == "active" else 0
+
+
+def deltas(events: Iterable[SubscriptionEvent]) -> dict[tuple[int, dt.date], Counter]:
+    """Изменения счётчиков по (тариф, день) для пачки событий журнала."""
+    out: dict[tuple[int, dt.date], Counter] = defaultdict(Counter)
+    for e in events:
+        key = (e.plan_id, timezone.localdate(e.created_at))
+        if e.kind == Kind.PLAN_CHANGED:
+            # статус до смены; в bulk-переносе он не меняется и не передаётся
+            if e.prev_plan_id and _is_active(e.prev_status if e.prev_status is not None else e.status):
+                out[(e.prev_plan_id, key[1])]["active"] -= 1
+                out[key]["active"] += 1
+        elif e.kind in (Kind.ACTIVATED, Kind.EXPIRED, Kind.CANCELED, Kind.SUSPENDED, Kind.DELETED):
+            change = _is_active(e.status) - _is_active(e.prev_status)
+            out[key]["active"] += change
+            if change > 0:
+                out[key]["new"] += 1
+            elif change < 0:
+                out[key]["churned"] += 1
+        elif e.kind == Kind.RENEWED:
+            out[key]["renewed"] += 1
+    return {k: c for k, c in out.items() if any(c.values())}
+
+
+def _ensure_row(plan_id: int, project_id, day: dt.date, monthly: Decimal) -> None:
+    if PlanDailyStats.objects.filter(plan_id=plan_id, day=day).exists():
+        return
+    active = (
+        PlanDailyStats.objects.filter(plan_id=plan_id, day__lt=day)
+        .order_by("-day").values_list("active", flat=True).first()
+    ) or 0
+    PlanDailyStats.objects.bulk_create(
+        [PlanDailyStats(project_id=project_id, plan_id=plan_id, day=day, active=active, mrr=active * monthly)],
+        ignore_conflicts=True,
+    )
+
+
+def apply(events: Iterable[SubscriptionEvent]) -> None:
+    """Применяет пачку событий журнала к дневным итогам. Вызывать в транзакции изменения."""
+    changes = deltas(events)
+    if not changes:
+        return
+    plans = {
+        pk: (project_id, monthly_price(price, period_days))
+        for pk, project_id, price, period_days in Plan.objects.filter(pk__in={p for p, _ in changes})
+        .values_list("pk", "project_id", "price", "period_days")
+    }
+    for (plan_id, day), c in sorted(changes.items()):
+        if plan_id not in plans:
+            continue
+        project_id, monthly = plans[plan_id]
+        _ensure_row(plan_id, project_id, day, monthly)
+        PlanDailyStats.objects.filter(plan_id=plan_id, day=day).update(
+            mrr=F("mrr") + c["active"] * monthly,
+            **{name: F(name) + c[name] for name in COUNTERS if c[name]},
+        )
+
+
+def reprice(plan: Plan, day: dt.date | None = None) -> None:
+    """Цена или период тарифа изменились — MRR текущего дня по новой цене."""
+    day = day or timezone.localdate()
+    monthly = monthly_price(plan.price, plan.period_days)
+    _ensure_row(plan.pk, plan.project_id, day, monthly)
+    PlanDailyStats.objects.filter(plan=plan, day=day).update(mrr=F("active") * monthly)
+
+
+# ---------- чтение ----------
+
+def series(project: Project, start: dt.date, end: dt.date, plan_id: int | None = None) -> list[dict]:
+    """
+    Итоги проекта по дням [start, end]: active и mrr на конец дня, new / churned /
+    renewed за день, churn_rate = churned / active на начало дня. Читаются только
+    строки диапазона и по одной предыдущей строке на тариф.
+    """
+    qs = PlanDailyStats.objects.filter(project=project)
+    if plan_id is not None:
+        qs = qs.filter(plan_id=plan_id)
+    latest_before = (
+        PlanDailyStats.objects.filter(plan=OuterRef("plan"), day__lt=start).order_by("-day").values("day")[:1]
+    )
+    fields = ("plan_id", "day", "active", "mrr", "new", "churned", "renewed")
+    carried = {
+        r["plan_id"]: r
+        for r in qs.filter(day__lt=start, day=Subquery(latest_before)).values(*fields)
+    }
+    by_day = defaultdict(list)
+    for r in qs.filter(day__gte=start, day__lte=end).order_by("day").values(*fields):
+        by_day[r["day"]].append(r)
+
+    out = []
+    state = {p: (r["active"], r["mrr"]) for p, r in carried.items()}
+    day = start
+    while day <= end:
+        active_before = sum(a for a, _ in state.values())
+        new = churned = renewed = 0
+        for r in by_day.get(day, ()):
+            state[r["plan_id"]] = (r["active"], r["mrr"])
+            new, churned, renewed = new + r["new"], churned + r["churned"], renewed + r["renewed"]
+        out.append({
+            "day": day.isoformat(),
+            "active": sum(a for a, _ in state.values()),
+            "mrr": str(sum((m for _, m in state.values()), Decimal("0.00"))),
+            "new": new,
+            "churned": churned,
+            "renewed": renewed,
+            "churn_rate": round(churned / active_before, 4) if active_before else None,
+        })
+        day += dt.timedelta(days=1)
+    return out
+
+
+# ---------- пересчёт ----------
+
+def _plan_days(plan: Plan, tz) -> tuple[Counter, Counter, Counter, Counter]:
+    """Изменение active и new / churned / renewed по дням для тарифа — из журнала и подписок."""
+    moved, new, churned = Counter(), Counter(), Counter()
+    created = SubscriptionEvent.objects.filter(kind=Kind.CREATED)
+    logged = (
+        SubscriptionEvent.objects
+        .filter(Q(plan_id=plan.pk) | Q(kind=Kind.PLAN_CHANGED, prev_plan_id=plan.pk))
+        .filter(Exists(created.filter(subscription_id=OuterRef("subscription_id"))))
+        .only("kind", "plan_id", "prev_plan_id", "prev_status", "status", "created_at")
+        .order_by("created_at", "pk")
+    )
+    for (plan_id, day), c in deltas(logged.iterator(chunk_size=2000)).items():
+        if plan_id == plan.pk:
+            moved[day] += c["active"]
+            new[day] += c["new"]
+            churned[day] += c["churned"]
+
+    payments = Payment.objects.filter(subscription=OuterRef("pk"))
+    subs = (
+        Subscription.objects.filter(plan=plan).exclude(status="pending")
+        .exclude(Exists(created.filter(subscription_id=OuterRef("pk"))))   # уже посчитаны по журналу
+        .annotate(billed=Exists(payments), paid=Exists(payments.filter(status=Payment.Status.SUCCEEDED)))
+        .exclude(status="canceled", billed=True, paid=False)
+        .values_list("status", "starts_at", "updated_at")
+    )
+    for status, starts_at, updated_at in subs.iterator(chunk_size=2000):
+        day = timezone.localdate(starts_at, tz)
+        new[day] += 1
+        moved[day] += 1
+        if status != "active":
+            day = timezone.localdate(updated_at, tz)
+            churned[day] += 1
+            moved[day] -= 1
+    renewed = Counter(dict(
+        SubscriptionEvent.objects.filter(plan_id=plan.pk, kind=Kind.RENEWED)
+        .annotate(d=TruncDate("created_at", tzinfo=tz)).values_list("d").annotate(n=Count("pk"))
+        .values_list("d", "n")
+    ))
+    return moved, new, churned, renewed
+
+
+def rebuild(plans: QuerySet | None = None, since: dt.date | None = None) -> int:
+    """
+    Пересчитывает строки тарифов с дня `since` (по умолчанию — вся история), по
+    транзакции на тариф. Возвращает число записанных строк.
+    """
+    tz = timezone.get_current_timezone()
+    today = timezone.localdate()
+    written = 0
+    for plan in (plans if plans is not None else Plan.objects.all()).order_by("pk").iterator():
+        monthly = monthly_price(plan.price, plan.period_days)
+        with transaction.atomic():
+            moved, new, churned, renewed = _plan_days(plan, tz)
+            rows, active, seed = [], 0, 0
+            for day in sorted(set(moved) | set(new) | set(churned) | set(renewed)):
+                if day > today:
+                    break
+                active += moved[day]
+                if since is not None and day < since:
+                    seed = active
+                    continue
+                rows.append(PlanDailyStats(
+                    project_id=plan.project_id, plan=plan, day=day, active=active, mrr=active * monthly,
+                    new=new[day], churned=churned[day], renewed=renewed[day],
+                ))
+            if since is not None and (not rows or rows[0].day != since):
+                # значения на начало периода — перенос вперёд не возьмёт устаревшую строку до since
+                rows.insert(0, PlanDailyStats(
+                    project_id=plan.project_id, plan=plan, day=since, active=seed, mrr=seed * monthly,
+                ))
+            stale = PlanDailyStats.objects.filter(plan=plan)
+            if since is not None:
+                stale = stale.filter(day__gte=since)
+            stale.delete()
+            PlanDailyStats.objects.bulk_create(rows, batch_size=1000)
+        written += len(rows)
+    return written
@@ -0,0 +1,85 @@
+"""
+Места в тарифе (Plan.limit) на атомарных счётчиках PlanSeats.
+
+Место занимает подписка со `status=active`. Переходы учитываются в pre_save/post_delete
+подписки (`clubs/signals.py`) и в массовых операциях, которые сигналы обходят:
+- `acquire(plan, n)` — `UPDATE used = used + n WHERE used <= limit - n`; 0 обновлённых
+  строк значит «мест нет» → `PlanSoldOut`, и сохранение подписки не происходит;
+- `release(plan_id, n)` — `UPDATE used = used - n` (не ниже нуля).
+
+Стоимость не зависит от числа подписчиков: один UPDATE по первичному ключу.
+Вызывать внутри транзакции, в которой пишется подписка. `recount()` пересчитывает
+счётчики по таблице подписок (команда `recount_seats`).
+"""
+from __future__ import annotations
+
+from typing import Iterable
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+
+from .models import Plan, PlanSeats, Subscription
+
+
+class PlanSoldOut(Exception):
+    """В тарифе не осталось мест."""
+
+    def __init__(self, plan_id: int):
+        super().__init__(f"Plan {plan_id} has no free seats")
+        self.plan_id = plan_id
+
+
+def _ensure(plan_ids: Iterable[int]) -> None:
+    PlanSeats.objects.bulk_create([PlanSeats(plan_id=p) for p in plan_ids], ignore_conflicts=True)
+
+
+def acquire(plan: Plan, n: int = 1) -> None:
+    """Занимает n мест разом или бросает PlanSoldOut (не занимая ни одного)."""
+    if not n:
+        return
+    seats = PlanSeats.objects.filter(plan_id=plan.pk)
+    if plan.limit is not None:
+        seats = seats.filter(used__lte=plan.limit - n)
+    if seats.update(used=F("used") + n):
+        return
+    if not PlanSeats.objects.filter(plan_id=plan.pk).exists():
+        _ensure([plan.pk])
+        return acquire(plan, n)
+    raise PlanSoldOut(plan.pk)
+
+
+def release(plan_id: int, n: int = 1) -> None:
+    if n:
+        PlanSeats.objects.filter(plan_id=plan_id).update(used=Greatest(F("used") - n, 0))
+
+
+def free_seats(plan: Plan) -> int | None:
+    if plan.limit is None:
+        return None
+    used = PlanSeats.objects.filter(plan_id=plan.pk).values_list("used", flat=True).first() or 0
+    return max(0, plan.limit - used)
+
+
+def recount(plan_ids: Iterable[int] | None = None) -> dict[int, tuple[int, int]]:
+    """
+    Приводит счётчики к числу активных подписок. Возвращает {plan_id: (было, стало)}
+    для тарифов с расхождением.
+    """
+    plans = Plan.objects.all() if plan_ids is None else Plan.objects.filter(pk__in=list(plan_ids))
+    actual = list(plans.values_list("pk", flat=True))
+    _ensure(actual)
+    with transaction.atomic():
+        # блокируем счётчики: параллельные acquire/release подождут пересчёта
+        stored = dict(
+            PlanSeats.objects.select_for_update().filter(plan_id__in=list(actual)).values_list("plan_id", "used")
+        )
+        actual = dict(
+            Plan.objects.filter(pk__in=list(actual))
+            .annotate(n=Count("subscriptions", filter=Q(subscriptions__status="active")))
+            .values_list("pk", "n")
+        )
+        drift = {pk: (stored.get(pk, 0), n) for pk, n in actual.items() if stored.get(pk, 0) != n}
+        for pk, (_, n) in drift.items():
+            PlanSeats.objects.filter(plan_id=pk).update(used=n)
+    return drift
@@ -16,9 +16,11 @@ class PlanSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Plan
-        fields = ("id", "project", "name", "title", "price", "is_public", "channels")
+        fields = ("id", "project", "name", "title", "price", "is_public", "all_channels", "period_days", "channels")
         # project больше не read_only — мы выставим его из club в validate()
         read_only_fields = ("id",)
+        # 0 дней — продление списало бы деньги, не сдвинув срок; без автопродления — null
+        extra_kwargs = {"period_days": {"min_value": 1}}
 
     def validate(self, attrs):
         # name <- title (совместимость)
@@ -56,3 +58,58 @@ class SubscriptionSerializer(serializers.ModelSerializer):
             "cancel_at_period_end","created_at"
         ]
         read_only_fields = ["id","status","created_at","user","current_period_start","current_period_end"]
+
+
+class AccessPairSerializer(serializers.Serializer):
+    user = serializers.IntegerField(required=False, min_value=1)
+    telegram_id = serializers.IntegerField(required=False)
+    chat = serializers.IntegerField(min_value=1)
+
+    def validate(self, attrs):
+        if ("user" in attrs) == ("telegram_id" in attrs):
+            raise serializers.ValidationError("Укажите ровно одно из полей: user или telegram_id.")
+        return attrs
+
+
+class BulkAccessSerializer(serializers.Serializer):
+    """
+    Либо явный список пар `pairs`, либо короткая форма для одного чата:
+    `chat` + `telegram_ids` и/или `user_ids`.
+    """
+    MAX_PAIRS = 50_000
+
+    pairs = AccessPairSerializer(many=True, required=False)
+    chat = serializers.IntegerField(required=False, min_value=1)
+    telegram_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    user_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False)
+    stream = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, attrs):
+        pairs = [(p.get("user"), p.get("telegram_id"), p["chat"]) for p in attrs.get("pairs", [])]
+        chat = attrs.get("chat")
+        if attrs.get("telegram_ids") or attrs.get("user_ids"):
+            if chat is None:
+                raise serializers.ValidationError({"chat": "Обязателен вместе с telegram_ids/user_ids."})
+            pairs += [(None, tg, chat) for tg in attrs.get("telegram_ids", [])]
+            pairs += [(u, None, chat) for u in attrs.get("user_ids", [])]
+        if not pairs:
+            raise serializers.ValidationError("Нет пар для проверки.")
+        if len(pairs) > self.MAX_PAIRS:
+            raise serializers.ValidationError(f"Не больше {self.MAX_PAIRS} пар за запрос.")
+        attrs["normalized"] = pairs
+        return attrs
+
+
+class BulkSubscriptionOpSerializer(serializers.Serializer):
+    """Массовая операция над подписками тарифа (clubs/bulk_ops.py)."""
+    op = serializers.ChoiceField(choices=["extend", "migrate", "cancel"])
+    days = serializers.IntegerField(required=False, min_value=1, max_value=3650)
+    to_plan = serializers.PrimaryKeyRelatedField(queryset=Plan.objects.all(), required=False)
+    dry_run = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, attrs):
+        if attrs["op"] == "extend" and "days" not in attrs:
+            raise serializers.ValidationError({"days": "Обязателен для extend."})
+        if attrs["op"] == "migrate" and "to_plan" not in attrs:
+            raise serializers.ValidationError({"to_plan": "Обязателен для migrate."})
+        return attrs
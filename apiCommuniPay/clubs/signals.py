@@ -0,0 +1,248 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from apiCommuniPay.accounts.signals import telegram_id_changed
+from apiCommuniPay.common.models import TelegramChat
+from apiCommuniPay.sse import events
+
+from . import access_cache, chat_bitmap, entitlements, event_log, rollups, seats
+from .models import JoinRequest, Plan, PlanChannel, Subscription
+
+_SUBSCRIPTION_EVENTS = {
+    "active": events.SUBSCRIPTION_ACTIVATED,
+    "expired": events.SUBSCRIPTION_EXPIRED,
+    "canceled": events.SUBSCRIPTION_CANCELED,
+}
+
+
+@receiver(post_init, sender=Subscription)
+@receiver(post_init, sender=JoinRequest)
+def remember_initial_status(sender, instance, **kwargs):
+    """Запоминаем статус на момент загрузки, чтобы в post_save понять, менялся ли он."""
+    instance._initial_status = instance.status if instance.pk else None
+    if sender is Subscription:
+        instance._initial_access = _access_state(instance) if instance.pk else None
+        instance._initial_log = instance._initial_access
+
+
+def _access_state(sub: Subscription):
+    return sub.status, sub.ends_at, sub.plan_id
+
+
+# ---------- места в тарифе (Plan.limit) ----------
+
+def _seat(plan_id, status):
+    return plan_id if status == "active" else None
+
+
+@receiver(pre_save, sender=Subscription)
+def move_plan_seat(sender, instance: Subscription, **kwargs):
+    """
+    Подписка заняла / освободила / сменила место. Сначала занимаем новое — если мест
+    нет, PlanSoldOut прерывает сохранение до записи подписки.
+    """
+    initial = instance._initial_access
+    old = _seat(initial[2], initial[0]) if initial else None
+    new = _seat(instance.plan_id, instance.status)
+    if old == new:
+        return
+    if new is not None:
+        seats.acquire(instance.plan)
+    if old is not None:
+        seats.release(old)
+
+
+@receiver(post_delete, sender=Subscription)
+def release_plan_seat(sender, instance: Subscription, **kwargs):
+    initial = instance._initial_access
+    seat = _seat(initial[2], initial[0]) if initial else None
+    if seat is not None:
+        seats.release(seat)
+
+
+# ---------- ChatEntitlement ----------
+
+@receiver(post_save, sender=Subscription)
+def refresh_entitlements_on_subscription(sender, instance: Subscription, created, **kwargs):
+    """Пересчитываем права подписчика, только если поменялось то, что на них влияет."""
+    state = _access_state(instance)
+    if not created and instance._initial_access == state:
+        return
+    instance._initial_access = state
+    entitlements.refresh(user_ids=[instance.user_id])
+
+
+@receiver(post_delete, sender=Subscription)
+def refresh_entitlements_on_subscription_delete(sender, instance: Subscription, **kwargs):
+    entitlements.refresh(user_ids=[instance.user_id])
+
+
+@receiver(post_save, sender=PlanChannel)
+@receiver(post_delete, sender=PlanChannel)
+def refresh_entitlements_on_plan_channel(sender, instance: PlanChannel, **kwargs):
+    entitlements.refresh(chat_ids=[instance.chat_id])
+
+
+@receiver(m2m_changed, sender=Plan.channels.through)
+def refresh_entitlements_on_plan_channels(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    plan.channels.add/remove/set/clear идут через bulk-операции и не шлют post_save
+    у PlanChannel — ловим m2m_changed. reverse=True — это chat.plans.<...>.
+    """
+    if action == "pre_clear":
+        instance._cleared_chat_ids = (
+            [instance.pk] if reverse else list(instance.channels.values_list("pk", flat=True))
+        )
+        return
+    if action == "post_clear":
+        chat_ids = getattr(instance, "_cleared_chat_ids", [])
+    elif action in ("post_add", "post_remove"):
+        chat_ids = [instance.pk] if reverse else list(pk_set or ())
+    else:
+        return
+    if chat_ids:
+        entitlements.refresh(chat_ids=chat_ids)
+
+
+@receiver(post_init, sender=Plan)
+def remember_plan_mode(sender, instance: Plan, **kwargs):
+    # удаление каскадом грузит тарифы только с pk — отложенные поля не трогаем
+    loaded = bool(instance.pk) and not instance.get_deferred_fields()
+    instance._initial_all_channels = instance.all_channels if loaded else None
+    instance._initial_pricing = (instance.price, instance.period_days) if loaded else None
+
+
+@receiver(post_save, sender=Plan)
+def refresh_entitlements_on_plan_mode(sender, instance: Plan, created, **kwargs):
+    """
+    Тариф переключили между «выбранные чаты» и «все чаты проекта»: права по его
+    PlanChannel и проектные права его проекта пересчитываются.
+    """
+    previous = instance._initial_all_channels
+    instance._initial_all_channels = instance.all_channels
+    if created or previous == instance.all_channels:
+        return
+    chat_ids = list(instance.plan_channels.values_list("chat_id", flat=True))
+    if chat_ids:
+        entitlements.refresh(chat_ids=chat_ids)
+    entitlements.refresh(project_ids=[instance.project_id])
+
+
+@receiver(post_save, sender=Plan)
+def reprice_plan_stats(sender, instance: Plan, created, **kwargs):
+    """Новая цена или период — MRR текущего дня в дневных итогах (clubs/rollups.py)."""
+    previous = instance._initial_pricing
+    instance._initial_pricing = (instance.price, instance.period_days)
+    if created or previous is None or previous == instance._initial_pricing:
+        return
+    if instance.daily_stats.exists():
+        rollups.reprice(instance)
+
+
+@receiver(post_init, sender=TelegramChat)
+def remember_chat_project(sender, instance: TelegramChat, **kwargs):
+    instance._access_project = instance.project_id if instance.pk else None
+
+
+@receiver(post_save, sender=TelegramChat)
+def invalidate_access_on_chat_relink(sender, instance: TelegramChat, created, **kwargs):
+    """Проектные права проверяются через chat.project_id — при его смене кэш чата устарел."""
+    previous = instance._access_project
+    instance._access_project = instance.project_id
+    if not created and previous != instance.project_id:
+        access_cache.invalidate(chat_ids=[instance.pk])
+        tg_id = instance.tg_id
+        transaction.on_commit(lambda: chat_bitmap.invalidate([tg_id]))
+
+
+@receiver(telegram_id_changed)
+def invalidate_rosters_on_telegram_id(sender, instance, **kwargs):
+    """Ростеры чатов хранят telegram_id — старый id не должен проходить, новый должен."""
+    chat_bitmap.invalidate_user(instance.pk)
+
+
+# ---------- журнал подписок (clubs/event_log.py) ----------
+
+_LOG_KINDS = {
+    "active": event_log.Kind.ACTIVATED,
+    "expired": event_log.Kind.EXPIRED,
+    "canceled": event_log.Kind.CANCELED,
+    "pending": event_log.Kind.SUSPENDED,
+}
+
+
+@receiver(post_save, sender=Subscription)
+def log_subscription_event(sender, instance: Subscription, created, **kwargs):
+    """
+    Одиночный save() → события журнала в транзакции вызывающего кода.
+    Смена срока активной подписки вручную — `extended` (`renewed` пишет автопродление).
+    """
+    previous = instance._initial_log
+    state = _access_state(instance)
+    instance._initial_log = state
+    rows = [event_log.row(instance)]
+    if created:
+        event_log.record(event_log.Kind.CREATED, rows)
+        if instance.status == "active":
+            event_log.record(event_log.Kind.ACTIVATED, rows)
+        return
+    if previous is None or previous == state:
+        return
+    status, ends_at, plan_id = previous
+    if instance.plan_id != plan_id:
+        event_log.record(event_log.Kind.PLAN_CHANGED, rows, prev_plan_id=plan_id, prev_status=status)
+    if instance.status != status:
+        kind = _LOG_KINDS.get(instance.status)
+        if kind is not None:
+            event_log.record(kind, rows, prev_status=status)
+    elif instance.status == "active" and instance.ends_at != ends_at:
+        event_log.record(event_log.Kind.EXTENDED, rows, prev_status=status)
+
+
+@receiver(post_delete, sender=Subscription)
+def log_subscription_delete(sender, instance: Subscription, **kwargs):
+    """Удаление (в т.ч. каскадом от пользователя) — `deleted`; активная уходит из дневных итогов."""
+    previous = instance._initial_log
+    status = previous[0] if previous else instance.status
+    event_log.record(
+        event_log.Kind.DELETED,
+        [(instance.pk, instance.user_id, instance.plan_id, "deleted", instance.ends_at)],
+        prev_status=status,
+    )
+
+
+# ---------- события для /api/sse/me/ ----------
+
+
+@receiver(post_save, sender=Subscription)
+def publish_subscription_event(sender, instance: Subscription, created, **kwargs):
+    """active / expired / canceled → событие в канал подписчика."""
+    previous = instance._initial_status
+    instance._initial_status = instance.status
+    if not created and previous == instance.status:
+        return
+    event_type = _SUBSCRIPTION_EVENTS.get(instance.status)
+    if event_type is None:
+        return
+    events.publish_user_event(instance.user_id, event_type, {
+        "subscription_id": instance.pk,
+        "plan_id": instance.plan_id,
+        "status": instance.status,
+        "ends_at": instance.ends_at.isoformat() if instance.ends_at else None,
+    })
+
+
+@receiver(post_save, sender=JoinRequest)
+def publish_join_request_event(sender, instance: JoinRequest, created, **kwargs):
+    """Заявка вышла из pending (confirmed / rejected) → уведомляем пользователя."""
+    previous = instance._initial_status
+    instance._initial_status = instance.status
+    if instance.status == "pending" or previous == instance.status:
+        return
+    events.publish_user_event(instance.user_id, events.JOIN_REQUEST_DECIDED, {
+        "join_request_id": instance.pk,
+        "chat_id": instance.chat_id,
+        "plan_id": instance.plan_id,
+        "status": instance.status,
+    })
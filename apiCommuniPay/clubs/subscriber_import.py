@@ -0,0 +1,294 @@
+"""
+Импорт подписчиков проекта из CSV (переезд автора с другой платформы).
+
+Колонки: `telegram_id` или `email` (хотя бы одна), `plan` (id или название тарифа
+проекта), `ends_at` (ISO-дата или дата-время; пусто — бессрочно). Лишние колонки
+игнорируются.
+
+Файл читается потоком и обрабатывается пачками по `chunk_size` строк — в памяти
+только текущая пачка, так что память не растёт с размером файла:
+- пользователи пачки ищутся одним запросом по `telegram_id` и одним по `email`:
+  строка находит пользователя по любому из них (сначала `telegram_id`; по email —
+  если у найденного нет другого telegram_id), недостающие создаются `bulk_create`
+  (без пароля) и перечитываются;
+- подписки пачки вставляются одним `bulk_create` в своей транзакции вместе с
+  занятием мест (`seats.acquire` на тариф), пересчётом прав и журналом подписок —
+  сигналы при `bulk_create` не срабатывают, поэтому всё это делается здесь явно;
+  мест меньше, чем строк, — занимаются оставшиеся, ошибкой `plan sold out`
+  отклоняются только лишние строки (по порядку в файле);
+- уже действующая (active/pending) подписка пользователя на тот же тариф не
+  дублируется — повторный запуск того же файла ничего не меняет (`skipped`).
+
+Ошибочные строки не прерывают импорт: каждая уходит в `on_error(RowError)`,
+прогресс — в `on_progress(ImportStats)` после каждой пачки.
+"""
+from __future__ import annotations
+
+import csv
+import datetime as dt
+from dataclasses import asdict, dataclass
+from typing import Callable, Iterable, Iterator, TextIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from apiCommuniPay.accounts import telegram_ids
+from apiCommuniPay.projects.models import Project
+
+from . import entitlements, event_log, seats
+from .models import Plan, Subscription
+
+CHUNK_SIZE = getattr(settings, "SUBSCRIBER_IMPORT_CHUNK", 1000)
+
+
+@dataclass
+class RowError:
+    line: int
+    error: str
+    telegram_id: str = ""
+    email: str = ""
+    plan: str = ""
+
+
+@dataclass
+class ImportStats:
+    rows: int = 0
+    users_created: int = 0
+    subscriptions_created: int = 0
+    skipped: int = 0
+    errors: int = 0
+    chunks: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class _Row:
+    line: int
+    telegram_id: int | None
+    email: str
+    plan: Plan
+    ends_at: dt.datetime | None
+    user_id: int | None = None
+
+
+def read_csv(stream: TextIO) -> Iterator[tuple[int, dict]]:
+    """
+    (номер строки файла, словарь колонок). Заголовок проверяется сразу —
+    ValueError, если нет нужных колонок; строки читаются лениво.
+    """
+    reader = csv.DictReader(stream)
+    fields = {f.strip().lower() for f in reader.fieldnames or ()}
+    if "plan" not in fields or not fields & {"telegram_id", "email"}:
+        raise ValueError("CSV must have columns: telegram_id or email, plan, ends_at")
+
+    def records():
+        for record in reader:
+            yield reader.line_num, {(k or "").strip().lower(): (v or "").strip() for k, v in record.items()}
+
+    return records()
+
+
+def _parse_ends_at(value: str) -> dt.datetime | None:
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError("bad ends_at")
+        parsed = dt.datetime.combine(day, dt.time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _parse(line: int, raw: dict, plans: dict[str, Plan], now: dt.datetime) -> _Row:
+    tg, email = raw.get("telegram_id", ""), raw.get("email", "").lower()
+    if not tg and not email:
+        raise ValueError("telegram_id or email required")
+    try:
+        telegram_id = int(tg) if tg else None
+    except ValueError:
+        raise ValueError("bad telegram_id")
+    if telegram_id is None and "@" not in email:
+        raise ValueError("bad email")
+    plan = plans.get(raw.get("plan", "").casefold())
+    if plan is None:
+        raise ValueError("unknown plan")
+    ends_at = _parse_ends_at(raw.get("ends_at", ""))
+    if ends_at is not None and ends_at <= now:
+        raise ValueError("ends_at in the past")
+    return _Row(line, telegram_id, email, plan, ends_at)
+
+
+def _project_plans(project: Project) -> dict[str, Plan]:
+    plans = {}
+    for plan in Plan.objects.filter(project=project):
+        plans[str(plan.pk)] = plan
+        plans.setdefault(plan.name.casefold(), plan)
+    return plans
+
+
+def _error(row: _Row | dict, line: int, message: str) -> RowError:
+    if isinstance(row, _Row):
+        return RowError(line, message, str(row.telegram_id or ""), row.email, str(row.plan.pk))
+    return RowError(line, message, row.get("telegram_id", ""), row.get("email", ""), row.get("plan", ""))
+
+
+def _resolve_users(rows: list[_Row]) -> int:
+    """Проставляет user_id строкам пачки, создавая недостающих пользователей. Возвращает число созданных."""
+    User = get_user_model()
+
+    def lookup():
+        by_tg = dict(
+            User.objects.filter(telegram_id__in={r.telegram_id for r in rows if r.telegram_id is not None})
+            .values_list("telegram_id", "pk")
+        )
+        by_email = {}
+        for email, pk, tg in (
+            User.objects.filter(email__in={r.email for r in rows if r.email})
+            .order_by("-pk").values_list("email", "pk", "telegram_id")
+        ):
+            by_email[email] = (pk, tg)   # при дублях email — самый ранний пользователь
+        for r in rows:
+            r.user_id = by_tg.get(r.telegram_id)
+            if r.user_id is None and r.email in by_email:
+                pk, tg = by_email[r.email]
+                # email другого Telegram-аккаунта — не тот человек
+                if r.telegram_id is None or tg is None:
+                    r.user_id = pk
+
+    lookup()
+    missing = {}
+    for r in rows:
+        if r.user_id is None:
+            key = r.telegram_id if r.telegram_id is not None else r.email
+            missing.setdefault(key, r)
+    if not missing:
+        return 0
+    new = []
+    for r in missing.values():
+        user = User(
+            username=f"tg{r.telegram_id}" if r.telegram_id is not None else r.email[:150],
+            telegram_id=r.telegram_id,
+            email=r.email,
+        )
+        user.set_unusable_password()
+        new.append(user)
+    # конфликт username с уже существующим — строка останется без пользователя (ошибка)
+    User.objects.bulk_create(new, ignore_conflicts=True)
+    lookup()
+    known = {r.telegram_id: r.user_id for r in missing.values() if r.telegram_id is not None and r.user_id is not None}
+
+    def remember():
+        # резолвер вебхука мог закэшировать «нет такого пользователя»
+        for tg, pk in known.items():
+            telegram_ids.remember(tg, pk)
+
+    transaction.on_commit(remember)
+    return sum(1 for r in missing.values() if r.user_id is not None)
+
+
+def _acquire_up_to(plan: Plan, n: int) -> int:
+    """Занимает до n мест — сколько свободно. Возвращает число занятых."""
+    free = seats.free_seats(plan)
+    take = n if free is None else min(n, free)
+    while take:
+        try:
+            seats.acquire(plan, take)
+            return take
+        except seats.PlanSoldOut:
+            # места заняли параллельно — берём, сколько осталось
+            take = min(take - 1, seats.free_seats(plan))
+    return 0
+
+
+def _import_chunk(rows: list[_Row], stats: ImportStats, on_error) -> None:
+    with transaction.atomic():
+        stats.users_created += _resolve_users(rows)
+
+        live = set(
+            Subscription.objects.filter(
+                user_id__in={r.user_id for r in rows if r.user_id}, plan_id__in={r.plan.pk for r in rows},
+                status__in=("active", "pending"),
+            ).values_list("user_id", "plan_id")
+        )
+        todo: dict[int, list[_Row]] = {}
+        for r in rows:
+            if r.user_id is None:
+                stats.errors += 1
+                on_error(_error(r, r.line, "user could not be created"))
+            elif (r.user_id, r.plan.pk) in live:
+                stats.skipped += 1
+            else:
+                live.add((r.user_id, r.plan.pk))
+                todo.setdefault(r.plan.pk, []).append(r)
+
+        subs = []
+        for group in todo.values():
+            plan = group[0].plan
+            taken = _acquire_up_to(plan, len(group))
+            stats.errors += len(group) - taken
+            for r in group[taken:]:
+                on_error(_error(r, r.line, "plan sold out"))
+            subs += [
+                Subscription(user_id=r.user_id, plan=plan, status="active", ends_at=r.ends_at) for r in group[:taken]
+            ]
+        if not subs:
+            return
+        Subscription.objects.bulk_create(subs)
+        entitlements.refresh(user_ids={s.user_id for s in subs})
+        log = [event_log.row(s) for s in subs]
+        event_log.record(event_log.Kind.CREATED, log)
+        event_log.record(event_log.Kind.ACTIVATED, log)
+        stats.subscriptions_created += len(subs)
+
+
+def iter_import(
+    project: Project,
+    records: Iterable[tuple[int, dict]],
+    stats: ImportStats,
+    chunk_size: int = CHUNK_SIZE,
+    on_error: Callable[[RowError], None] | None = None,
+) -> Iterator[ImportStats]:
+    """Импортирует строки `read_csv` в тарифы проекта; отдаёт `stats` после каждой пачки."""
+    on_error = on_error or (lambda e: None)
+    plans = _project_plans(project)
+    now = timezone.now()
+    chunk: list[_Row] = []
+    for line, raw in records:
+        stats.rows += 1
+        try:
+            chunk.append(_parse(line, raw, plans, now))
+        except ValueError as e:
+            stats.errors += 1
+            on_error(_error(raw, line, str(e)))
+            continue
+        if len(chunk) >= chunk_size:
+            _import_chunk(chunk, stats, on_error)
+            stats.chunks += 1
+            chunk = []
+            yield stats
+    if chunk:
+        _import_chunk(chunk, stats, on_error)
+        stats.chunks += 1
+        yield stats
+
+
+def import_csv(
+    project: Project,
+    stream: TextIO,
+    chunk_size: int = CHUNK_SIZE,
+    on_progress: Callable[[ImportStats], None] | None = None,
+    on_error: Callable[[RowError], None] | None = None,
+) -> ImportStats:
+    stats = ImportStats()
+    for _ in iter_import(project, read_csv(stream), stats, chunk_size, on_error):
+        if on_progress:
+            on_progress(stats)
+    return stats
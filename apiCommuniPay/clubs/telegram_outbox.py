@@ -0,0 +1,236 @@
+"""
+Очередь действий в Telegram (transactional outbox, `TelegramAction`).
+
+Запись. Код, меняющий подписки и заявки (истечение, воркер заявок, оплата, вебхук),
+не вызывает Bot API сам — он добавляет строки через `enqueue()` в своей транзакции:
+- откат транзакции отменяет и действие (никого не удалим из чата за неистёкшую подписку);
+- после коммита действие не потеряется, даже если процесс тут же упадёт;
+- блокировки строк не держатся на время сетевых вызовов, веб-запрос Telegram не ждёт.
+Повтор того же решения отсекается уникальным `dedup_key` (`ON CONFLICT DO NOTHING`).
+
+Отправка — `relay_batch()` (команда `relay_telegram_outbox --loop`), три шага:
+1) короткая транзакция забирает пачку `select_for_update(skip_locked=True)` и сдвигает
+   `available_at` на `LEASE` секунд вперёд (аренда) — параллельные воркеры берут разные
+   строки, а строки упавшего воркера после истечения аренды заберёт следующий;
+2) вызовы Bot API — вне транзакции, через общий клиент с rate limit (`common/tg.py`);
+3) результаты пишутся одним `bulk_update`.
+
+Ровно один эффект. Повторно выполняется только действие, по которому воркер не успел
+записать результат, а сами действия идемпотентны: kick — ban + unban, повторное
+одобрение/отклонение уже решённой заявки Telegram отвергает с 400. Аренда помечает
+строку `error = IN_FLIGHT`, запись результата метку снимает; если метка на месте при
+следующей аренде, исход прошлой попытки неизвестен, и только тогда 400/403 значит
+«уже сделано» (`sent`). Иначе 400/403 — постоянная ошибка (`failed`), остальные
+ошибки — повтор с экспоненциальной паузой, не больше `MAX_ATTEMPTS` попыток.
+
+Kick ставится в очередь в момент потери права, а выполняется позже: перед отправкой
+право проверяется заново (`entitlements.valid_rows`), и если пользователь успел
+оплатить снова, действие помечается `skipped` без вызова Bot API.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import logging
+from typing import Iterable
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apiCommuniPay.common import tg
+from apiCommuniPay.common.tg import TelegramError
+from apiCommuniPay.common.models import TelegramChat
+
+from . import entitlements
+from .models import TelegramAction
+
+logger = logging.getLogger("clubs.telegram_outbox")
+
+Kind = TelegramAction.Kind
+Status = TelegramAction.Status
+
+BATCH_SIZE = getattr(settings, "TELEGRAM_OUTBOX_BATCH", 100)
+MAX_BATCHES = getattr(settings, "TELEGRAM_OUTBOX_MAX_BATCHES", 20)
+LEASE = getattr(settings, "TELEGRAM_OUTBOX_LEASE", 120)               # сек; больше пачки при TELEGRAM_API_RATE
+MAX_ATTEMPTS = getattr(settings, "TELEGRAM_OUTBOX_MAX_ATTEMPTS", 8)
+BACKOFF = getattr(settings, "TELEGRAM_OUTBOX_BACKOFF", 30)            # сек, удваивается с каждой попыткой
+MAX_BACKOFF = 3600
+PERMANENT = (400, 403)
+IN_FLIGHT = "in flight"   # аренда взята, результат ещё не записан
+
+_SEND = {
+    Kind.KICK: "kick_chat_member",
+    Kind.APPROVE: "approve_chat_join_request",
+    Kind.DECLINE: "decline_chat_join_request",
+}
+
+
+def action(kind: str, chat_tg_id: int, user_tg_id: int, key: str) -> TelegramAction:
+    return TelegramAction(kind=kind, chat_tg_id=chat_tg_id, user_tg_id=user_tg_id, dedup_key=key[:128])
+
+
+def enqueue(actions: Iterable[TelegramAction]) -> int:
+    """Добавляет действия в транзакции вызывающего; дубли по `dedup_key` пропускаются."""
+    actions = list(actions)
+    if actions:
+        TelegramAction.objects.bulk_create(actions, ignore_conflicts=True)
+    return len(actions)
+
+
+def kick_pairs(pairs: Iterable[tuple[int, int]], key: str) -> int:
+    """
+    Удаление из чатов по парам (user_id, chat_id) — id в БД. Пропускает пользователей
+    без telegram_id и чаты, где бот не админ. `key` различает поводы (момент истечения и т.п.).
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return 0
+    tg_users = dict(
+        get_user_model().objects
+        .filter(pk__in={u for u, _ in pairs}, telegram_id__isnull=False)
+        .values_list("pk", "telegram_id")
+    )
+    tg_chats = dict(
+        TelegramChat.objects
+        .filter(pk__in={c for _, c in pairs}, status=TelegramChat.ChatStatus.ACTIVE)
+        .values_list("pk", "tg_id")
+    )
+    return enqueue(
+        action(Kind.KICK, tg_chats[c], tg_users[u], f"kick:{tg_chats[c]}:{tg_users[u]}:{key}")
+        for u, c in pairs
+        if u in tg_users and c in tg_chats
+    )
+
+
+def decide_join_requests(rows: Iterable[tuple[int, int | None, int, str, bool]]) -> int:
+    """
+    Решения по заявкам: строки (join_request_id, user telegram_id, chat tg_id, статус чата,
+    approve). Ключ — заявка и решение: повторное решение той же заявки второй раз не уйдёт.
+    """
+    actions = []
+    for pk, user_tg, chat_tg, chat_status, approve in rows:
+        if user_tg is None or chat_status != TelegramChat.ChatStatus.ACTIVE:
+            continue
+        kind = Kind.APPROVE if approve else Kind.DECLINE
+        actions.append(action(kind, chat_tg, user_tg, f"jr:{pk}:{kind.value}"))
+    return enqueue(actions)
+
+
+# ---------- отправка ----------
+
+def claim(now: dt.datetime, batch_size: int = BATCH_SIZE) -> list[TelegramAction]:
+    """Забирает пачку готовых действий в аренду на LEASE секунд."""
+    with transaction.atomic():
+        batch = list(
+            TelegramAction.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=Status.PENDING, available_at__lte=now)
+            .order_by("available_at", "pk")[:batch_size]
+        )
+        if batch:
+            TelegramAction.objects.filter(pk__in=[a.pk for a in batch]).update(
+                available_at=now + dt.timedelta(seconds=LEASE), attempts=F("attempts") + 1, error=IN_FLIGHT,
+            )
+    for a in batch:
+        # метка прошлой аренды не снята — воркер упал между вызовом и записью результата
+        a.outcome_unknown = a.error == IN_FLIGHT
+        a.attempts += 1
+    return batch
+
+
+def _status_code(exc: Exception) -> int | None:
+    return exc.status_code if isinstance(exc, TelegramError) else None
+
+
+def _describe(exc: Exception) -> str:
+    """Текст ошибки для `error` и логов: у `TelegramError` он без токена, у прочих — только класс."""
+    return str(exc)[:1000] if isinstance(exc, TelegramError) else type(exc).__name__
+
+
+def _entitled(batch: list[TelegramAction], now: dt.datetime) -> set[tuple[int, int]]:
+    """(chat tg_id, user telegram_id) из kick-действий пачки, у которых право на чат снова есть."""
+    kicks = [a for a in batch if a.kind == Kind.KICK]
+    if not kicks:
+        return set()
+    users = dict(
+        get_user_model().objects
+        .filter(telegram_id__in={a.user_tg_id for a in kicks})
+        .values_list("pk", "telegram_id")
+    )
+    chats = dict(TelegramChat.objects.filter(tg_id__in={a.chat_tg_id for a in kicks}).values_list("pk", "tg_id"))
+    if not users or not chats:
+        return set()
+    valid = entitlements.merge_rows(entitlements.valid_rows(users, chats))
+    return {
+        (chats[c], users[u])
+        for (u, c), until in valid.items()
+        if until is None or until > now
+    }
+
+
+def _send(a: TelegramAction, now: dt.datetime) -> str:
+    """Выполняет действие и проставляет результат в объект. Возвращает итоговый статус."""
+    try:
+        getattr(tg, _SEND[a.kind])(a.chat_tg_id, a.user_tg_id)
+    except Exception as e:
+        code = _status_code(e)
+        a.error = _describe(e)
+        if code in PERMANENT and getattr(a, "outcome_unknown", False) and a.kind != Kind.KICK:
+            # прошлая попытка дошла до Telegram, но результат не записан — заявка уже решена
+            a.status, a.sent_at = Status.SENT, now
+        elif code in PERMANENT or a.attempts >= MAX_ATTEMPTS:
+            logger.warning("action %s (%s) failed: %s", a.pk, a.kind, a.error)
+            a.status = Status.FAILED
+        else:
+            a.available_at = now + dt.timedelta(seconds=min(BACKOFF * 2 ** (a.attempts - 1), MAX_BACKOFF))
+        return a.status
+    a.status, a.sent_at, a.error = Status.SENT, now, ""
+    return a.status
+
+
+def relay_batch(now: dt.datetime | None = None, batch_size: int = BATCH_SIZE) -> dict:
+    """Одна пачка: аренда, вызовы Bot API вне транзакции, запись результатов."""
+    now = now or timezone.now()
+    batch = claim(now, batch_size)
+    stats = {"claimed": len(batch), "sent": 0, "failed": 0, "skipped": 0, "retry": 0}
+    if not batch:
+        return stats
+    entitled = _entitled(batch, now)
+    for a in batch:
+        if a.kind == Kind.KICK and (a.chat_tg_id, a.user_tg_id) in entitled:
+            a.status, a.sent_at, a.error = Status.SKIPPED, now, ""
+        else:
+            _send(a, timezone.now())
+        stats["retry" if a.status == Status.PENDING else a.status] += 1
+    TelegramAction.objects.bulk_update(batch, ["status", "sent_at", "available_at", "error"])
+    return stats
+
+
+def tick(now: dt.datetime | None = None, batch_size: int = BATCH_SIZE, max_batches: int = MAX_BATCHES) -> dict:
+    """Один проход: не больше max_batches пачек."""
+    total = {"batches": 0, "claimed": 0, "sent": 0, "failed": 0, "skipped": 0, "retry": 0}
+    for _ in range(max_batches):
+        stats = relay_batch(now, batch_size)
+        if not stats["claimed"]:
+            break
+        total["batches"] += 1
+        for k, v in stats.items():
+            total[k] += v
+        if stats["claimed"] < batch_size:
+            break
+    return total
+
+
+def purge(before: dt.datetime, chunk: int = 5000) -> int:
+    """Удаляет выполненные действия старше `before` пачками. Возвращает число строк."""
+    total = 0
+    while True:
+        pks = list(
+            TelegramAction.objects.filter(status__in=(Status.SENT, Status.SKIPPED), sent_at__lt=before)
+            .order_by("pk").values_list("pk", flat=True)[:chunk]
+        )
+        if not pks:
+            return total
+        total += TelegramAction.objects.filter(pk__in=pks).delete()[0]
@@ -1,6 +1,6 @@
 from rest_framework.routers import DefaultRouter
 from django.urls import path, include
-from .views import PlanViewSet, SubscriptionViewSet, ChatAccessView
+from .views import PlanViewSet, SubscriptionViewSet, ChatAccessView, BulkChatAccessView, ChatRosterView, AccessCacheStatsView, CheckoutView, PaymentWebhookView, ProjectDailyStatsView, SubscriberImportView
 
 router = DefaultRouter()
 router.register(r"plans", PlanViewSet, basename="plan")
@@ -9,4 +9,11 @@ router.register(r"subscriptions", SubscriptionViewSet, basename="subscription")
 urlpatterns = [
     path("", include(router.urls)),
     path("chats/<int:pk>/access/", ChatAccessView.as_view(), name="chat-access"),
+    path("chats/access/bulk/", BulkChatAccessView.as_view(), name="chat-access-bulk"),
+    path("chats/access/stats/", AccessCacheStatsView.as_view(), name="chat-access-stats"),
+    path("chats/<int:pk>/roster/", ChatRosterView.as_view(), name="chat-roster"),
+    path("payments/checkout/", CheckoutView.as_view(), name="payment-checkout"),
+    path("payments/webhook/<str:provider>/", PaymentWebhookView.as_view(), name="payment-webhook"),
+    path("projects/<uuid:pk>/subscribers/import/", SubscriberImportView.as_view(), name="subscriber-import"),
+    path("projects/<uuid:pk>/stats/daily/", ProjectDailyStatsView.as_view(), name="project-daily-stats"),
 ]
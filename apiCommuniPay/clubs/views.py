@@ -1,15 +1,26 @@
-from datetime import timedelta
+import io
+import json
+from dataclasses import asdict
+from datetime import date, timedelta
 from django.utils import timezone
-from rest_framework import viewsets, permissions, decorators, response, status
+from rest_framework import viewsets, permissions, decorators, exceptions, response, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Q, Subquery
+from django.core.exceptions import ImproperlyConfigured
 
-from .models import Plan, Subscription
-from .serializers import PlanSerializer, SubscriptionSerializer  # ClubSerializer removed
+from . import access_cache, bulk_ops, entitlements, payments, rollups, seats, subscriber_import
+from .models import Plan, PlanChannel, Subscription
+from .serializers import BulkAccessSerializer, BulkSubscriptionOpSerializer, PlanSerializer, SubscriptionSerializer  # ClubSerializer removed
 
 from apiCommuniPay.common.models import TelegramChat
+from apiCommuniPay.common.permissions import IsPlatformStaff
+from apiCommuniPay.common.services import get_provider
+from apiCommuniPay.projects.models import Project, ProjectMember
+from apiCommuniPay.projects.permissions import CanManageProject
 
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
@@ -59,7 +70,12 @@ class PlanViewSet(viewsets.ModelViewSet):
 
         chat_pk = self.request.query_params.get("chat")
         if chat_pk:
-            qs = qs.filter(channels__id=chat_pk)
+            # тарифы с этим чатом в PlanChannel + тарифы «все чаты» его проекта
+            chat_project = TelegramChat.objects.filter(pk=chat_pk).values("project_id")[:1]
+            qs = qs.filter(
+                Q(pk__in=PlanChannel.objects.filter(chat_id=chat_pk).values("plan_id"))
+                | Q(all_channels=True, project_id=Subquery(chat_project))
+            )
 
         return qs
 
@@ -71,14 +87,39 @@ class PlanViewSet(viewsets.ModelViewSet):
             raise permissions.PermissionDenied("Not allowed to create plan in foreign project")
         serializer.save()
 
+    @decorators.action(detail=True, methods=["post"], url_path="subscriptions/bulk")
+    def bulk_subscriptions(self, request, pk=None):
+        """
+        POST /api/plans/<id>/subscriptions/bulk/ — массовая операция над подписками тарифа.
+
+        body: {"op": "extend", "days": 7} | {"op": "migrate", "to_plan": <id>} | {"op": "cancel"},
+        плюс "dry_run": true — только посчитать. Только владелец проекта.
+        """
+        plan = self.get_object()
+        ser = BulkSubscriptionOpSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        data = ser.validated_data
+        try:
+            if data["op"] == "extend":
+                result = bulk_ops.extend(plan, data["days"], dry_run=data["dry_run"])
+            elif data["op"] == "migrate":
+                result = bulk_ops.migrate(plan, data["to_plan"], dry_run=data["dry_run"])
+            else:
+                result = bulk_ops.cancel(plan, dry_run=data["dry_run"])
+        except ValueError as e:
+            raise exceptions.ValidationError({"to_plan": [str(e)]})
+        except seats.PlanSoldOut:
+            raise exceptions.ValidationError({"to_plan": ["В тарифе не осталось мест."]})
+        return response.Response(result.as_dict())
+
 
 class SubscriptionViewSet(viewsets.ModelViewSet):
     """
     Подписки текущего пользователя.
 
-    При создании подписки здесь не вычисляется срок действия —
-    ожидается, что это сделает бизнес-логика/платёжный обработчик
-    или поле `ends_at` будет заполнено сериализатором/данными запроса.
+    Создать подписку здесь нельзя: оформление — только через оплату
+    (`CheckoutView`, POST /api/payments/checkout/), активирует её обработчик
+    уведомлений провайдера (clubs/payments.py).
     """
 
     serializer_class = SubscriptionSerializer
@@ -93,16 +134,23 @@ class SubscriptionViewSet(viewsets.ModelViewSet):
             .order_by("-created_at", "id")
         )
 
-    def perform_create(self, serializer):
-        # по умолчанию активная, без автоматического вычисления `ends_at`
-        serializer.save(user=self.request.user, status=self.request.data.get("status", "active"))
+    def create(self, request, *args, **kwargs):
+        raise exceptions.MethodNotAllowed(request.method, detail="Оформление подписки — POST /api/payments/checkout/.")
+
+    def perform_update(self, serializer):
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except seats.PlanSoldOut:
+            raise exceptions.ValidationError({"plan": ["В тарифе не осталось мест."]})
 
     @decorators.action(detail=True, methods=["post"])
     def cancel(self, request, pk=None):
         sub = self.get_object()
         # простой сценарий — помечаем как отменённую сразу
         sub.status = "canceled"
-        sub.save(update_fields=["status"])
+        with transaction.atomic():
+            sub.save(update_fields=["status"])
         return response.Response({"ok": True}, status=status.HTTP_200_OK)
 
 
@@ -111,18 +159,237 @@ class ChatAccessView(APIView):
     Простая проверка доступа пользователя к Telegram-чату на основе активных подписок.
 
     Пользователь имеет доступ, если существует *активная* подписка на план,
-    который привязан к этому чату через M2M `Plan.channels`.
+    который привязан к этому чату через M2M `Plan.channels` либо открывает все чаты
+    проекта (`Plan.all_channels`).
     Под активной понимаем: `status == 'active'` И (`ends_at` пусто ИЛИ `ends_at > now()`).
+    Само правило материализовано в ChatEntitlement, решения кэшируются
+    (clubs/access_cache.py) — повторный вызов не ходит в БД до изменения прав.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk: int):
+        chat = get_object_or_404(TelegramChat, pk=pk)
+        allowed = access_cache.has_access(request.user.pk, chat.pk)
+        return Response({"chat_id": chat.id, "allowed": allowed})
+
+
+def manageable_chat_ids(user, chat_ids) -> set[int]:
+    """Из chat_ids — те, чьим проектом пользователь управляет (owner/admin). Один запрос."""
+    qs = TelegramChat.objects.filter(pk__in=chat_ids)
+    if not getattr(user, "is_platform_staff", False):
+        qs = qs.filter(
+            project__memberships__user=user,
+            project__memberships__role__in=[ProjectMember.Role.OWNER, ProjectMember.Role.ADMIN],
+        )
+    return set(qs.values_list("pk", flat=True))
+
+
+class BulkChatAccessView(APIView):
+    """
+    POST /api/chats/access/bulk/ — «кому из этих N пользователей можно остаться в чате X».
+
+    body: {"pairs": [{"telegram_id": 1, "chat": 5}, {"user": 7, "chat": 5}, ...]}
+       или {"chat": 5, "telegram_ids": [...], "user_ids": [...]}
+    Отвечают владельцы/админы проектов этих чатов и сотрудники платформы.
+    Запросов к БД — фиксированное число на чанк (см. entitlements.check_many), а не на пару.
+    Для больших входов (или "stream": true) ответ идёт NDJSON-стримом, по строке на пару.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    STREAM_THRESHOLD = entitlements.BULK_CHUNK
+
+    def post(self, request):
+        ser = BulkAccessSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        pairs = ser.validated_data["normalized"]
+
+        chat_ids = {c for _, _, c in pairs}
+        forbidden = chat_ids - manageable_chat_ids(request.user, chat_ids)
+        if forbidden:
+            return Response(
+                {"detail": "Нет прав на чаты", "chats": sorted(forbidden)},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        results = entitlements.check_many(pairs)
+        if ser.validated_data["stream"] or len(pairs) > self.STREAM_THRESHOLD:
+            return StreamingHttpResponse(
+                (json.dumps(r) + "\n" for r in results),
+                content_type="application/x-ndjson",
+            )
+        return Response({"results": list(results)})
+
+
+class ChatRosterView(APIView):
+    """
+    GET /api/chats/<pk>/roster/?output=ndjson|csv — все telegram_id, кому положен доступ в чат.
+
+    Нужен для сверки участников Telegram-чата. Ответ стримится, выборка идёт
+    серверным курсором (entitlements.entitled_telegram_ids) — память постоянна
+    даже для чатов на сотни тысяч участников.
     """
 
     permission_classes = [permissions.IsAuthenticated]
+    CONTENT_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
 
     def get(self, request, pk: int):
+        fmt = request.query_params.get("output", "ndjson")
+        if fmt not in self.CONTENT_TYPES:
+            return Response({"output": "ndjson или csv"}, status=status.HTTP_400_BAD_REQUEST)
         chat = get_object_or_404(TelegramChat, pk=pk)
-        now = timezone.now()
-        allowed = Subscription.objects.filter(
-            user=request.user,
-            status="active",
-            plan__channels=chat,
-        ).filter(Q(ends_at__isnull=True) | Q(ends_at__gt=now)).exists()
-        return Response({"chat_id": chat.id, "allowed": allowed})
\ No newline at end of file
+        if chat.pk not in manageable_chat_ids(request.user, [chat.pk]):
+            return Response({"detail": "Нет прав на чат"}, status=status.HTTP_403_FORBIDDEN)
+
+        rows = entitlements.render_roster(entitlements.entitled_telegram_ids(chat.pk), fmt)
+        response = StreamingHttpResponse(rows, content_type=self.CONTENT_TYPES[fmt])
+        if fmt == "csv":
+            response["Content-Disposition"] = f'attachment; filename="chat-{chat.pk}-roster.csv"'
+        return response
+
+
+class AccessCacheStatsView(APIView):
+    """GET /api/chats/access/stats/ — hit/miss кэша решений (сотрудники платформы)."""
+
+    permission_classes = [IsPlatformStaff]
+
+    def get(self, request):
+        return Response(access_cache.stats())
+
+class CheckoutView(APIView):
+    """
+    POST /api/payments/checkout/ — оформить подписку на тариф через платёжного провайдера.
+
+    body: {"plan": <id>, "provider": "<имя из PAYMENT_PROVIDERS>"?}
+    Создаёт подписку `pending` и платёж; подписка активируется после уведомления
+    провайдера (clubs/payments.py). В ответе — данные провайдера для оплаты.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        try:
+            plan_id = int(request.data.get("plan"))
+        except (TypeError, ValueError):
+            raise exceptions.ValidationError({"plan": ["Укажите тариф."]})
+        plan = get_object_or_404(Plan, pk=plan_id, is_public=True)
+        try:
+            payment, res = payments.start_checkout(request.user, plan, provider=request.data.get("provider"))
+        except ImproperlyConfigured:
+            raise exceptions.ValidationError({"provider": ["Неизвестный платёжный провайдер."]})
+        except seats.PlanSoldOut:
+            raise exceptions.ValidationError({"plan": ["В тарифе не осталось мест."]})
+        if not res.ok:
+            return Response({"detail": res.error or "Провайдер отклонил платёж"}, status=status.HTTP_502_BAD_GATEWAY)
+        return Response({
+            "payment": payment.pk,
+            "subscription": payment.subscription_id,
+            "provider": payment.provider,
+            "provider_payment_id": payment.provider_payment_id,
+            "confirmation": res.raw or {},
+        }, status=status.HTTP_201_CREATED)
+
+
+class PaymentWebhookView(APIView):
+    """
+    POST /api/payments/webhook/<provider>/ — уведомления платёжного провайдера.
+
+    Только проверка подписи и вставка во входящий ящик (PaymentCallback), без
+    блокировок и бизнес-логики — ответ быстрый даже под нагрузкой. Активация подписок —
+    фоновая команда `process_payments`.
+    """
+
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+    throttle_classes = []
+
+    def post(self, request, provider: str):
+        try:
+            backend = get_provider(provider)
+        except ImproperlyConfigured:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        if not backend.verify_signature(request):
+            return Response({"detail": "bad signature"}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            notifications = backend.parse_notification(request)
+        except ValueError:
+            return Response({"detail": "bad payload"}, status=status.HTTP_400_BAD_REQUEST)
+        payments.ingest(provider, notifications)
+        return Response({"ok": True})
+
+
+class SubscriberImportView(APIView):
+    """
+    POST /api/projects/<pk>/subscribers/import/ — импорт подписчиков из CSV (multipart, поле `file`).
+
+    Колонки и правила — clubs/subscriber_import.py. Файл разбирается потоком, ответ —
+    NDJSON-стрим: строка `{"progress": {...}}` после каждой пачки и в конце
+    `{"result": {...}, "errors": [...]}` (первые ERROR_LIMIT ошибочных строк;
+    полный отчёт даёт команда `import_subscribers --errors`). Только owner/admin проекта.
+    """
+
+    permission_classes = [permissions.IsAuthenticated, CanManageProject]
+    ERROR_LIMIT = 1000
+
+    def post(self, request, pk):
+        project = get_object_or_404(Project, pk=pk)
+        self.check_object_permissions(request, project)
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({"file": ["Приложите CSV-файл."]}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            chunk_size = min(int(request.data.get("chunk", subscriber_import.CHUNK_SIZE)), 5000)
+        except (TypeError, ValueError):
+            return Response({"chunk": ["Должно быть числом."]}, status=status.HTTP_400_BAD_REQUEST)
+        # загрузка большего размера лежит во временном файле — читаем его построчно
+        stream = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+        try:
+            records = subscriber_import.read_csv(stream)
+        except (ValueError, UnicodeDecodeError) as e:
+            return Response({"file": [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+
+        stats = subscriber_import.ImportStats()
+        errors = []
+
+        def on_error(err):
+            if len(errors) < self.ERROR_LIMIT:
+                errors.append(asdict(err))
+
+        def lines():
+            for progress in subscriber_import.iter_import(project, records, stats, max(1, chunk_size), on_error):
+                yield json.dumps({"progress": progress.as_dict()}) + "\n"
+            yield json.dumps({"result": stats.as_dict(), "errors": errors}) + "\n"
+
+        return StreamingHttpResponse(lines(), content_type="application/x-ndjson")
+
+
+class ProjectDailyStatsView(APIView):
+    """
+    GET /api/projects/<pk>/stats/daily/?from=YYYY-MM-DD&to=YYYY-MM-DD&plan=<id>
+
+    Активные подписчики, MRR, новые, отток и продления проекта по дням — из дневных
+    итогов (clubs/rollups.py), а не из подписок. По умолчанию — последние 30 дней,
+    не больше MAX_DAYS за запрос. Доступно участникам проекта.
+    """
+
+    permission_classes = [permissions.IsAuthenticated, CanManageProject]
+    MAX_DAYS = 366
+
+    def get(self, request, pk):
+        project = get_object_or_404(Project, pk=pk)
+        self.check_object_permissions(request, project)
+        today = timezone.localdate()
+        try:
+            end = date.fromisoformat(request.query_params.get("to") or today.isoformat())
+            start = date.fromisoformat(request.query_params.get("from") or (end - timedelta(days=29)).isoformat())
+            plan_id = int(request.query_params["plan"]) if request.query_params.get("plan") else None
+        except ValueError:
+            return Response({"detail": "from/to — YYYY-MM-DD, plan — id тарифа"}, status=status.HTTP_400_BAD_REQUEST)
+        if start > end or (end - start).days >= self.MAX_DAYS:
+            return Response({"detail": f"Период — от 1 до {self.MAX_DAYS} дней"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "project": str(project.pk),
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "days": rollups.series(project, start, end, plan_id),
+        })
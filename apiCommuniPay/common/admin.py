@@ -1,6 +1,6 @@
 # apiCommuniPay/common/admin.py
 from django.contrib import admin
-from .models import ChatLinkIntent, TelegramChat
+from .models import ChatLinkIntent, ChatMember, TelegramChat
 
 @admin.register(TelegramChat)
 class TelegramChatAdmin(admin.ModelAdmin):
@@ -15,3 +15,10 @@ class ChatLinkIntentAdmin(admin.ModelAdmin):
     list_filter = ("status", "project")
     search_fields = ("token",)
 
+
+@admin.register(ChatMember)
+class ChatMemberAdmin(admin.ModelAdmin):
+    list_display = ("chat", "tg_user_id", "status", "updated_at")
+    list_filter = ("status",)
+    search_fields = ("tg_user_id", "chat__title")
+    list_select_related = ("chat",)
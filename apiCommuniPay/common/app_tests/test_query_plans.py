@@ -0,0 +1,250 @@
+"""
+Регрессия планов горячих запросов.
+
+Тесты исполняют настоящие пути кода (user_has_chat_access, ChatAccessView,
+PlanViewSet / ProjectViewSet.get_queryset, поиск ChatLinkIntent в вебхуке), ловят их SQL
+и прогоняют через EXPLAIN на засеянном наборе данных. Проверяем, что по «большим»
+таблицам нет полного сканирования, то есть у запроса есть пригодный индекс.
+Если миграция уберёт или испортит нужный индекс, тест упадёт.
+
+SQLite на таких объёмах почти всегда берёт подходящий индекс, поэтому локально проверяется только его
+наличие и пригодность. На Postgres засеянные тысячи строк — мало, и по маленьким
+таблицам планировщик честно выбирает Seq Scan; поэтому в этих проверках seq scan
+запрещается (`enable_seqscan = off`), и Seq Scan в плане значит «индекса нет».
+Выбор индекса без принуждения и оценку строк в корне плана проверяют только тесты
+`test_postgres_*` — в SQLite-прогоне они пропускаются.
+"""
+import datetime as dt
+import json
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from apiCommuniPay.clubs import entitlements, expiry
+from apiCommuniPay.clubs.models import Plan, PlanChannel, Subscription
+from apiCommuniPay.clubs.views import PlanViewSet
+from apiCommuniPay.common import webhook
+from apiCommuniPay.common.access import user_has_chat_access
+from apiCommuniPay.common.models import ChatLinkIntent, TelegramChat
+from apiCommuniPay.projects.models import Project, ProjectMember
+from apiCommuniPay.projects.views import ProjectViewSet
+
+User = get_user_model()
+
+USERS = 2000
+PROJECTS = 100
+CHATS_PER_PROJECT = 4
+PLANS_PER_PROJECT = 5
+SUBS_PER_USER = 3
+INTENTS = 3000
+MAX_ROOT_ROWS = 50   # оценка строк в корне плана для точечных запросов (только Postgres)
+ON_POSTGRES = skipUnless(connection.vendor == "postgresql", "план без принуждения проверяется только на Postgres")
+
+
+def explain(sql: str, seqscan: bool = False) -> list[str]:
+    """
+    Узлы плана строками вида «<операция> <таблица> [<индекс>]».
+    На Postgres без `seqscan` полное сканирование запрещено на время EXPLAIN.
+    """
+    with connection.cursor() as cur:
+        if connection.vendor == "postgresql":
+            cur.execute("SET enable_seqscan = " + ("on" if seqscan else "off"))
+            try:
+                cur.execute("EXPLAIN (FORMAT JSON) " + sql)
+                raw = cur.fetchone()[0]
+            finally:
+                cur.execute("RESET enable_seqscan")
+            plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+            nodes, stack = [], [plan]
+            while stack:
+                node = stack.pop()
+                nodes.append(node)
+                stack.extend(node.get("Plans", ()))
+            explain.root_rows = plan["Plan Rows"]
+            return [
+                f"{n['Node Type']} {n.get('Relation Name', '')} {n.get('Index Name', '')}".strip()
+                for n in nodes
+            ]
+        cur.execute("EXPLAIN QUERY PLAN " + sql)
+        explain.root_rows = None
+        return [row[-1] for row in cur.fetchall()]
+
+
+def full_scans(lines: list[str], tables: set[str]) -> list[str]:
+    """Узлы, читающие таблицу целиком (SQLite: `SCAN t` без индекса; Postgres: Seq Scan)."""
+    bad = []
+    for line in lines:
+        parts = line.split()
+        if line.startswith("Seq Scan") and parts[2] in tables:
+            bad.append(line)
+        elif parts[:1] == ["SCAN"] and parts[1] in tables and "INDEX" not in line:
+            bad.append(line)
+    return bad
+
+
+class QueryPlanTests(TestCase):
+    HOT_TABLES = {
+        Subscription._meta.db_table,
+        Plan._meta.db_table,
+        PlanChannel._meta.db_table,
+        TelegramChat._meta.db_table,
+        ChatLinkIntent._meta.db_table,
+        ProjectMember._meta.db_table,
+        Project._meta.db_table,
+        "clubs_chatentitlement",
+        "clubs_projectentitlement",
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        users = User.objects.bulk_create(
+            [User(username=f"u{i}", telegram_id=10_000 + i) for i in range(USERS)]
+        )
+        projects = Project.objects.bulk_create([
+            Project(owner=users[i], name=f"p{i}", slug=f"p{i}") for i in range(PROJECTS)
+        ])
+        ProjectMember.objects.bulk_create([
+            ProjectMember(project=p, user=users[(i * 7 + k) % USERS], role=ProjectMember.Role.VIEWER)
+            for i, p in enumerate(projects) for k in range(1, 6)
+        ])
+        chats = TelegramChat.objects.bulk_create([
+            TelegramChat(tg_id=-100_000 - i * CHATS_PER_PROJECT - k, type="supergroup", project=p,
+                         status=TelegramChat.ChatStatus.ACTIVE)
+            for i, p in enumerate(projects) for k in range(CHATS_PER_PROJECT)
+        ])
+        plans = Plan.objects.bulk_create([
+            Plan(project=p, name=f"plan{k}", price=Decimal("1.00"), is_public=bool(k % 2),
+                 all_channels=(k == 0))
+            for p in projects for k in range(PLANS_PER_PROJECT)
+        ])
+        PlanChannel.objects.bulk_create([
+            PlanChannel(plan=plan, chat=chats[(i // PLANS_PER_PROJECT) * CHATS_PER_PROJECT + k])
+            for i, plan in enumerate(plans) for k in range(i % CHATS_PER_PROJECT + 1)
+        ])
+        Subscription.objects.bulk_create([
+            Subscription(
+                user=u, plan=plans[(i * 13 + k * 31) % len(plans)],
+                status=("active", "expired", "canceled")[(i + k) % 3],
+                ends_at=now + dt.timedelta(days=(i + k) % 60 - 30),
+            )
+            for i, u in enumerate(users) for k in range(SUBS_PER_USER)
+        ])
+        ChatLinkIntent.objects.bulk_create([
+            ChatLinkIntent(
+                project=projects[(i + i // USERS) % PROJECTS], initiator=users[i % USERS], token=f"proj_seed{i}",
+                tg_user_id=(20_000 + i) if i % 2 else None,
+                tg_request_id=(30_000 + i) if i % 3 else None,
+                chat_id=(-100_000 - i) if i % 5 == 0 else None,
+                status=ChatLinkIntent.Status.EXPIRED if i % 10 else ChatLinkIntent.Status.PENDING,
+                expires_at=now + dt.timedelta(minutes=i % 30 - 15),
+            )
+            for i in range(INTENTS)
+        ])
+        entitlements.refresh(user_ids=[u.pk for u in users])
+
+        with connection.cursor() as cur:
+            cur.execute("ANALYZE")
+        cls.user, cls.chat, cls.project = users[42], chats[17], projects[3]
+
+    def setUp(self):
+        cache.clear()
+
+    def assertIndexed(self, queries, tables=None):
+        tables = tables or self.HOT_TABLES
+        self.assertTrue(queries, "нет запросов для проверки")
+        for q in queries:
+            lines = explain(q["sql"])
+            self.assertEqual(full_scans(lines, tables), [], f"{q['sql']}\n" + "\n".join(lines))
+
+    def assertUsesIndex(self, queries, name, seqscan=False):
+        plans = ["\n".join(explain(q["sql"], seqscan)) for q in queries]
+        self.assertTrue(any(name in p for p in plans), f"{name} не используется:\n" + "\n\n".join(plans))
+
+    def capture(self, fn):
+        with CaptureQueriesContext(connection) as ctx:
+            fn()
+        return ctx.captured_queries
+
+    def view_queryset(self, viewset, action="list", **params):
+        request = Request(APIRequestFactory().get("/", params))
+        request.user = self.user
+        view = viewset(request=request, action=action, format_kwarg=None, kwargs={})
+        return view.get_queryset()
+
+    def test_user_has_chat_access(self):
+        self.assertIndexed(self.capture(lambda: user_has_chat_access(self.user, self.chat)))
+
+    def test_chat_access_view(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertIndexed(self.capture(lambda: client.get(f"/api/chats/{self.chat.pk}/access/")))
+
+    def test_plan_queryset_by_project_and_chat(self):
+        for params in ({"project": str(self.project.pk)}, {"chat": self.chat.pk},
+                       {"project": str(self.project.pk), "chat": self.chat.pk}):
+            qs = self.view_queryset(PlanViewSet, **params)
+            self.assertIndexed(self.capture(lambda: list(qs)))
+
+    def test_project_queryset_for_member(self):
+        qs = self.view_queryset(ProjectViewSet)
+        # prefetch memberships — отдельный запрос по project_id IN (...)
+        self.assertIndexed(self.capture(lambda: list(qs)))
+
+    def test_webhook_intent_lookups(self):
+        lookups = [
+            lambda: webhook._find_active_intent_for_user(20_001),
+            lambda: webhook._find_active_intent_for_request(30_001),
+            lambda: webhook._find_active_intent_for_chat(-100_000),
+            lambda: webhook._touch_start_token("proj_seed10", 20_010),
+        ]
+        for fn in lookups:
+            self.assertIndexed(self.capture(fn), {ChatLinkIntent._meta.db_table})
+
+    def test_webhook_intent_by_chat_uses_partial_index(self):
+        queries = self.capture(lambda: webhook._find_active_intent_for_chat(-100_000))
+        self.assertUsesIndex(queries, "intent_chat_status_exp")
+
+    def test_expiry_scan(self):
+        queries = self.capture(lambda: expiry.expire_batch(batch_size=10))
+        self.assertUsesIndex(queries, "sub_status_ends_at")
+        self.assertIndexed(queries)
+
+    def test_entitlement_compute_for_user(self):
+        self.assertIndexed(self.capture(lambda: entitlements.compute(user_ids=[self.user.pk])))
+
+    # ---------- Postgres: план без принуждения ----------
+
+    @ON_POSTGRES
+    def test_postgres_point_lookups_estimate_few_rows(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        lookups = [
+            lambda: user_has_chat_access(self.user, self.chat),
+            lambda: client.get(f"/api/chats/{self.chat.pk}/access/"),
+            lambda: webhook._find_active_intent_for_user(20_001),
+            lambda: webhook._find_active_intent_for_request(30_001),
+            lambda: webhook._find_active_intent_for_chat(-100_000),
+        ]
+        for fn in lookups:
+            for q in self.capture(fn):
+                lines = explain(q["sql"], seqscan=True)
+                self.assertLessEqual(explain.root_rows, MAX_ROOT_ROWS, f"{q['sql']}\n" + "\n".join(lines))
+
+    @ON_POSTGRES
+    def test_postgres_intent_by_chat_picks_partial_index(self):
+        queries = self.capture(lambda: webhook._find_active_intent_for_chat(-100_000))
+        self.assertUsesIndex(queries, "intent_chat_status_exp", seqscan=True)
+
+    @ON_POSTGRES
+    def test_postgres_expiry_scan_picks_status_index(self):
+        queries = self.capture(lambda: expiry.expire_batch(batch_size=10))
+        self.assertUsesIndex(queries, "sub_status_ends_at", seqscan=True)
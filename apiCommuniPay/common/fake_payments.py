@@ -0,0 +1,133 @@
+"""
+Локальный платёжный провайдер для нагрузочных прогонов и тестов — без эквайера.
+
+Подключение: settings.PAYMENT_PROVIDERS = {"fake": "apiCommuniPay.common.fake_payments.FakePaymentProvider"}.
+Параметры — settings.PAYMENT_FAKE (dict) или `configure(...)`:
+- latency_ms     — задержка `create_payment` (имитация запроса к провайдеру);
+- failure_rate   — доля `create_payment`, завершившихся ошибкой провайдера;
+- decline_rate   — доля платежей, по которым придёт `failed` вместо `succeeded`;
+- duplicate_rate — доля платежей, итоговое уведомление по которым придёт дважды;
+- reorder_rate   — доля платежей, у которых `pending` придёт после итогового статуса;
+- secret, seed.
+
+`meta["idempotency_key"]` ведёт себя как у настоящих эквайеров: повторный вызов с тем же
+ключом возвращает прежний результат без нового списания (`charges` — число списаний).
+
+Уведомления не отправляются сами: они копятся в `outbox`, вызывающий забирает их
+`drain()` и доставляет на вебхук (тело JSON + заголовок X-Fake-Signature = HMAC-SHA256).
+`drain()` отдаёт уведомления в перемешанном порядке, как при реальной доставке.
+"""
+from __future__ import annotations
+
+import hashlib
+import hmac
+import itertools
+import json
+import random
+import threading
+import time
+import uuid
+from typing import Any
+
+from django.conf import settings
+
+from .services import PaymentNotification, PaymentResult
+
+SIGNATURE_HEADER = "X-Fake-Signature"
+
+DEFAULTS = {
+    "latency_ms": 0,
+    "failure_rate": 0.0,
+    "decline_rate": 0.0,
+    "duplicate_rate": 0.0,
+    "reorder_rate": 0.0,
+    "secret": "fake-secret",
+    "seed": None,
+}
+
+
+class FakePaymentProvider:
+    def __init__(self, **options):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._prefix = uuid.uuid4().hex[:8]
+        self.outbox: list[tuple[bytes, str]] = []
+        self._idempotent: dict[str, PaymentResult] = {}
+        self.charges = 0
+        self.configure(**{**DEFAULTS, **getattr(settings, "PAYMENT_FAKE", {}), **options})
+
+    def configure(self, **options) -> None:
+        for key, value in options.items():
+            if key not in DEFAULTS:
+                raise TypeError(f"Unknown option: {key}")
+            setattr(self, key, value)
+        if "seed" in options:
+            self._random = random.Random(self.seed)
+
+    def sign(self, body: bytes) -> str:
+        return hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+
+    def _emit(self, payment_id: str, status: str) -> None:
+        body = json.dumps({"id": payment_id, "status": status}).encode()
+        self.outbox.append((body, self.sign(body)))
+
+    # ---------- PaymentProvider ----------
+
+    def create_payment(self, amount: int, currency: str, meta: dict[str, Any]) -> PaymentResult:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        key = meta.get("idempotency_key")
+        with self._lock:
+            if key in self._idempotent:
+                return self._idempotent[key]
+            res = self._create(amount, currency, meta)
+            if key:
+                self._idempotent[key] = res
+            self.charges += res.ok
+        return res
+
+    def _create(self, amount: int, currency: str, meta: dict[str, Any]) -> PaymentResult:
+        rnd = self._random
+        if rnd.random() < self.failure_rate:
+            return PaymentResult(ok=False, error="fake: provider unavailable")
+        payment_id = f"fake-{self._prefix}-{next(self._ids)}"
+        final = "failed" if rnd.random() < self.decline_rate else "succeeded"
+        late_pending = rnd.random() < self.reorder_rate
+        if not late_pending:
+            self._emit(payment_id, "pending")
+        self._emit(payment_id, final)
+        if rnd.random() < self.duplicate_rate:
+            self._emit(payment_id, final)
+        if late_pending:
+            self._emit(payment_id, "pending")
+        return PaymentResult(
+            ok=True,
+            provider_payment_id=payment_id,
+            raw={"amount": amount, "currency": currency, "meta": meta},
+        )
+
+    def verify_signature(self, request) -> bool:
+        got = request.headers.get(SIGNATURE_HEADER, "")
+        return hmac.compare_digest(got, self.sign(request.body))
+
+    def parse_notification(self, request) -> list[PaymentNotification]:
+        try:
+            body = json.loads(request.body)
+            return [PaymentNotification(provider_payment_id=str(body["id"]), status=str(body["status"]), raw=body)]
+        except (KeyError, TypeError, json.JSONDecodeError) as e:
+            raise ValueError(f"bad notification: {e}") from e
+
+    # ---------- доставка ----------
+
+    def drain(self, limit: int | None = None) -> list[tuple[bytes, str]]:
+        """Забрать накопленные уведомления (тело, подпись) в случайном порядке."""
+        with self._lock:
+            n = len(self.outbox) if limit is None else min(limit, len(self.outbox))
+            taken, self.outbox = self.outbox[:n], self.outbox[n:]
+            self._random.shuffle(taken)
+        return taken
+
+    def redeliver(self, items: list[tuple[bytes, str]]) -> None:
+        """Вернуть недоставленные уведомления в очередь (провайдер повторит доставку)."""
+        with self._lock:
+            self.outbox.extend(items)
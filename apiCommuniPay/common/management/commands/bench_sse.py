@@ -0,0 +1,175 @@
+"""
+Бенчмарк ёмкости SSE: сколько ожидающих клиентов держит `sse_subscribe`
+и с какой задержкой до них доходит `send_message_to_token`.
+
+Клиенты симулируются внутри процесса (RequestFactory → view → streaming_content),
+поэтому сокеты не считаются; меряем то, что стоит сам сервер: RSS и fd на соединение,
+CPU на доставку и p50/p99 задержки publish → delivery.
+
+Режимы:
+- sync     — поток на клиента, как у gunicorn gthread / runserver;
+- executor — asyncio + пул потоков: так Django под ASGI обслуживает синхронный
+  генератор стрима (каждый ожидающий `next()` всё равно держит поток пула).
+  Настоящего async-режима нет: стрим `sse_subscribe` — синхронный генератор.
+
+Клиент читает кадры до первого события: keep-alive комментарии (`: ping`) пропускаются.
+
+Отчёт пишется в JSON (--output); с --compare печатаются отклонения от прошлого отчёта.
+"""
+import asyncio
+import json
+import os
+import resource
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from apiCommuniPay.sse.broker import broker
+from apiCommuniPay.sse.views import send_message_to_token, sse_subscribe
+
+
+def _rss_kb() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _fd_count() -> int | None:
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+def _pct(data: list[float], p: float) -> float | None:
+    if not data:
+        return None
+    data = sorted(data)
+    return round(data[min(len(data) - 1, int(p * len(data)))] * 1000, 3)
+
+
+class Command(BaseCommand):
+    help = "SSE capacity benchmark: N waiting clients, publish via send_message_to_token, JSON report"
+
+    def add_arguments(self, p):
+        p.add_argument("--clients", type=int, default=500)
+        p.add_argument("--mode", choices=["sync", "executor", "both"], default="both")
+        p.add_argument("--timeout", type=float, default=30.0, help="сколько ждать доставки всем клиентам, сек")
+        p.add_argument("--output", default="sse_bench_report.json")
+        p.add_argument("--compare", help="путь к прошлому отчёту для сравнения")
+
+    def handle(self, *args, **o):
+        modes = ["sync", "executor"] if o["mode"] == "both" else [o["mode"]]
+        report = {
+            "clients": o["clients"],
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "results": {m: self._run(m, o["clients"], o["timeout"]) for m in modes},
+        }
+        with open(o["output"], "w") as f:
+            json.dump(report, f, indent=2)
+        for mode, res in report["results"].items():
+            self.stdout.write(f"{mode}: {json.dumps(res)}")
+        self.stdout.write(self.style.SUCCESS(f"Report: {o['output']}"))
+        if o["compare"]:
+            self._compare(o["compare"], report)
+
+    # ---------- прогон ----------
+
+    def _open(self, n: int):
+        rf = RequestFactory()
+        tokens = [f"bench_{uuid.uuid4().hex}" for _ in range(n)]
+        responses = [sse_subscribe(rf.get(f"/api/sse/{t}/"), t) for t in tokens]
+        return tokens, responses
+
+    def _run(self, mode: str, n: int, timeout: float) -> dict:
+        rss0, fd0 = _rss_kb(), _fd_count()
+        tokens, responses = self._open(n)
+        received: list[tuple[float, bytes]] = []
+        started = [0]
+        lock = threading.Lock()
+
+        def consume(resp):
+            with lock:
+                started[0] += 1
+            for frame in resp.streaming_content:
+                if not frame.startswith(b":"):   # keep-alive комментарий — ждём дальше
+                    with lock:
+                        received.append((time.time(), frame))
+                    break
+            resp.close()
+
+        if mode == "sync":
+            workers = [threading.Thread(target=consume, args=(r,), daemon=True) for r in responses]
+            for w in workers:
+                w.start()
+            waiter = None
+        else:
+            executor = ThreadPoolExecutor(max_workers=n)
+
+            async def run_all():
+                loop = asyncio.get_running_loop()
+                await asyncio.gather(*(loop.run_in_executor(executor, consume, r) for r in responses))
+
+            waiter = threading.Thread(target=asyncio.run, args=(run_all(),), daemon=True)
+            waiter.start()
+
+        # дождаться, пока все клиенты реально встанут в ожидание
+        deadline = time.monotonic() + timeout
+        while started[0] < n and time.monotonic() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.2)
+        rss1, fd1 = _rss_kb(), _fd_count()
+        open_connections = broker.metrics()["open_connections"]
+
+        cpu0, wall0 = time.process_time(), time.perf_counter()
+        for t in tokens:
+            send_message_to_token(t, {"t": time.time()})
+        publish_s = time.perf_counter() - wall0
+
+        while len(received) < n and time.monotonic() < deadline:
+            time.sleep(0.01)
+        wall = time.perf_counter() - wall0
+        cpu = time.process_time() - cpu0
+        if waiter is not None:
+            waiter.join(timeout=max(0.0, deadline - time.monotonic()))
+            executor.shutdown(wait=False)
+
+        latencies = []
+        for recv_at, frame in received:
+            payload = json.loads(frame.decode().split("data: ", 1)[1])
+            if "t" in payload:   # `event: timeout` — не доставка
+                latencies.append(recv_at - payload["t"])
+
+        return {
+            "open_connections": open_connections,
+            "delivered": len(latencies),
+            "rss_kb_per_connection": round((rss1 - rss0) / n, 2),
+            "fds_per_connection": round((fd1 - fd0) / n, 3) if fd0 is not None else None,
+            "publish_s": round(publish_s, 4),
+            "deliver_all_s": round(wall, 4),
+            "cpu_s": round(cpu, 4),
+            "latency_ms_p50": _pct(latencies, 0.50),
+            "latency_ms_p99": _pct(latencies, 0.99),
+            "latency_ms_max": _pct(latencies, 1.0),
+        }
+
+    def _compare(self, path: str, report: dict) -> None:
+        with open(path) as f:
+            prev = json.load(f)
+        for mode, res in report["results"].items():
+            old = prev.get("results", {}).get(mode)
+            if not old:
+                continue
+            for key, val in res.items():
+                was = old.get(key)
+                if isinstance(val, (int, float)) and isinstance(was, (int, float)) and was:
+                    self.stdout.write(f"{mode}.{key}: {was} → {val} ({(val - was) / was:+.1%})")
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("common", "0002_fix_chat_id_signed"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="chatlinkintent",
+            index=models.Index(
+                condition=models.Q(("chat_id__isnull", False)),
+                fields=["chat_id", "status", "expires_at"],
+                name="intent_chat_status_exp",
+            ),
+        ),
+    ]
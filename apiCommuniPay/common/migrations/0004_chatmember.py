@@ -0,0 +1,30 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("common", "0003_intent_chat_status_exp"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChatMember",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("tg_user_id", models.BigIntegerField()),
+                ("status", models.CharField(default="member", max_length=16)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("chat", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="members", to="common.telegramchat")),
+            ],
+            options={
+                "verbose_name": "участник чата",
+                "verbose_name_plural": "участники чатов",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="chatmember",
+            constraint=models.UniqueConstraint(fields=("chat", "tg_user_id"), name="chatmember_chat_user_uniq"),
+        ),
+    ]
@@ -80,6 +80,12 @@ class ChatLinkIntent(models.Model):
             models.Index(fields=["status", "expires_at"], name="intent_status_exp"),
             models.Index(fields=["tg_user_id", "status", "expires_at"], name="intent_user_status_exp"),
             models.Index(fields=["tg_request_id", "status", "expires_at"], name="intent_req_status_exp"),
+            # chat_id заполнен у единиц интентов — частичный индекс не тащит NULL-строки
+            models.Index(
+                fields=["chat_id", "status", "expires_at"],
+                name="intent_chat_status_exp",
+                condition=Q(chat_id__isnull=False),
+            ),
         ]
         constraints = [
             UniqueConstraint(
@@ -273,6 +279,32 @@ class TelegramChat(models.Model):
         return f"{self.type}:{self.tg_id} {self.title or self.username}"
 
 
+class ChatMember(models.Model):
+    """
+    Снимок участников Telegram-чата, как его видит бот.
+
+    Ведётся по апдейтам `chat_member` (их нужно включить в allowed_updates вебхука):
+    вступил/повышен → строка создаётся или обновляется, left/kicked → удаляется.
+    Сверка с оплаченными правами — `clubs/reconcile.py`.
+    """
+    chat = models.ForeignKey(TelegramChat, on_delete=models.CASCADE, related_name="members")
+    tg_user_id = models.BigIntegerField()
+    status = models.CharField(max_length=16, default="member")  # member | administrator | creator | restricted
+    updated_at = models.DateTimeField(auto_now=True)
+
+    ADMIN_STATUSES = ("administrator", "creator")
+
+    class Meta:
+        verbose_name = "участник чата"
+        verbose_name_plural = "участники чатов"
+        constraints = [
+            UniqueConstraint(fields=["chat", "tg_user_id"], name="chatmember_chat_user_uniq"),
+        ]
+
+    def __str__(self) -> str:
+        return f"ChatMember(chat={self.chat_id}, tg_user={self.tg_user_id}, {self.status})"
+
+
 class TimeStampedModel(models.Model):
     """
     Абстрактная база: два стандартных поля аудита — created_at и updated_at.
@@ -1,6 +1,10 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Protocol, Any
 
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
 @dataclass
 class PaymentResult:
     ok: bool
@@ -8,6 +12,31 @@ class PaymentResult:
     raw: dict | None = None
     error: str | None = None
 
+@dataclass
+class PaymentNotification:
+    """Разобранное уведомление провайдера: статус — pending / succeeded / failed."""
+    provider_payment_id: str
+    status: str
+    raw: dict = field(default_factory=dict)
+
 class PaymentProvider(Protocol):
     def create_payment(self, amount: int, currency: str, meta: dict[str, Any]) -> PaymentResult: ...
     def verify_signature(self, request) -> bool: ...
+    def parse_notification(self, request) -> list[PaymentNotification]: ...
+
+
+_providers: dict[str, PaymentProvider] = {}
+
+def get_provider(name: str | None = None) -> PaymentProvider:
+    """
+    Провайдер по имени из settings.PAYMENT_PROVIDERS = {"name": "dotted.path.Class"};
+    без имени — PAYMENT_DEFAULT_PROVIDER. Экземпляры кэшируются на процесс.
+    """
+    name = name or getattr(settings, "PAYMENT_DEFAULT_PROVIDER", None)
+    paths = getattr(settings, "PAYMENT_PROVIDERS", {})
+    if name not in paths:
+        raise ImproperlyConfigured(f"Unknown payment provider: {name!r}")
+    path = paths[name]
+    if path not in _providers:
+        _providers[path] = import_string(path)()
+    return _providers[path]
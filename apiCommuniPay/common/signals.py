@@ -0,0 +1,47 @@
+# apiCommuniPay/common/signals.py
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from apiCommuniPay.projects.models import ProjectMember
+from apiCommuniPay.sse import events
+
+from .models import TelegramChat
+
+
+def project_managers(project_id) -> list[int]:
+    """user_id владельцев и админов проекта — им интересны изменения чатов."""
+    if not project_id:
+        return []
+    return list(
+        ProjectMember.objects
+        .filter(project_id=project_id, role__in=[ProjectMember.Role.OWNER, ProjectMember.Role.ADMIN])
+        .values_list("user_id", flat=True)
+    )
+
+
+@receiver(post_init, sender=TelegramChat)
+def remember_initial_state(sender, instance: TelegramChat, **kwargs):
+    instance._initial_state = (instance.project_id, instance.status) if instance.pk else (None, None)
+
+
+@receiver(post_save, sender=TelegramChat)
+def publish_chat_event(sender, instance: TelegramChat, created, **kwargs):
+    """
+    Чат привязан к проекту → chat.linked; сменился статус (права бота) → chat.status_changed.
+    Получатели — владелец и админы проекта.
+    """
+    prev_project, prev_status = instance._initial_state
+    instance._initial_state = (instance.project_id, instance.status)
+    if instance.project_id and instance.project_id != prev_project:
+        event_type = events.CHAT_LINKED
+    elif not created and instance.status != prev_status:
+        event_type = events.CHAT_STATUS_CHANGED
+    else:
+        return
+    events.publish_user_event(project_managers(instance.project_id), event_type, {
+        "chat_id": instance.pk,
+        "tg_id": instance.tg_id,
+        "project_id": str(instance.project_id) if instance.project_id else None,
+        "status": instance.status,
+        "title": instance.title,
+    })
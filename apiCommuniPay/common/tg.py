@@ -1,22 +1,83 @@
 # apiCommuniPay/common/tg.py
 from __future__ import annotations
+import threading
+import time
+
 import requests
 from django.conf import settings
 
 TG_API = "https://api.telegram.org"
 
+# Bot API режет ботов примерно на 30 запросов/с; держимся чуть ниже.
+TG_API_RATE = getattr(settings, "TELEGRAM_API_RATE", 25)
+
+
+class RateLimiter:
+    """Token bucket на процесс: acquire() блокирует, пока не появится токен."""
+
+    def __init__(self, rate: float, burst: int | None = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+limiter = RateLimiter(TG_API_RATE)
+
+
+class TelegramError(Exception):
+    """
+    Ошибка Bot API. В URL запроса — токен бота, поэтому исключения requests наружу не
+    отдаём: только метод, HTTP-статус и `description` от Telegram (или имя класса ошибки сети).
+    """
+
+    def __init__(self, method: str, status_code: int | None = None, description: str = ""):
+        self.method, self.status_code, self.description = method, status_code, description
+        super().__init__(" ".join(str(p) for p in (method, status_code, description) if p))
+
+
 def tg_api(method: str, **params):
+    limiter.acquire()
     url = f"{TG_API}/bot{settings.TELEGRAM_BOT_TOKEN}/{method}"
-    r = requests.post(url, json=params, timeout=10)
-    r.raise_for_status()
-    data = r.json()
-    if not data.get("ok"):
-        raise RuntimeError(f"Telegram API error: {data}")
+    try:
+        r = requests.post(url, json=params, timeout=10)
+    except requests.RequestException as e:
+        raise TelegramError(method, description=type(e).__name__) from None
+    try:
+        data = r.json()
+    except ValueError:
+        data = {}
+    if not r.ok or not data.get("ok"):
+        raise TelegramError(method, r.status_code, str(data.get("description", ""))[:500])
     return data["result"]
 
 def get_chat(chat_id: int) -> dict:
     return tg_api("getChat", chat_id=chat_id)
 
+def kick_chat_member(chat_id: int, user_id: int) -> None:
+    """Удалить из чата без вечного бана: ban + сразу unban."""
+    tg_api("banChatMember", chat_id=chat_id, user_id=user_id)
+    tg_api("unbanChatMember", chat_id=chat_id, user_id=user_id, only_if_banned=True)
+
+def approve_chat_join_request(chat_id: int, user_id: int) -> None:
+    tg_api("approveChatJoinRequest", chat_id=chat_id, user_id=user_id)
+
+def decline_chat_join_request(chat_id: int, user_id: int) -> None:
+    tg_api("declineChatJoinRequest", chat_id=chat_id, user_id=user_id)
+
 def get_bot_id() -> int:
     # Можно задать TELEGRAM_BOT_ID в settings/env,
     # но если не задан, спросим у Telegram и закэшируем в модуле.
@@ -9,9 +9,11 @@ from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
+from apiCommuniPay.accounts import telegram_ids
+from apiCommuniPay.clubs import access_cache, chat_bitmap, join_requests, telegram_outbox
 from apiCommuniPay.sse.views import send_message_to_token
 
-from .models import ChatLinkIntent, TelegramChat
+from .models import ChatLinkIntent, ChatMember, TelegramChat
 
 _TELEGRAM_BOT_ID = getattr(settings, "TELEGRAM_BOT_ID", None)
 TELEGRAM_BOT_ID = int(_TELEGRAM_BOT_ID) if _TELEGRAM_BOT_ID not in (None, "") else None
@@ -79,6 +81,10 @@ def telegram_webhook_view(request, secret: str):
 
     if (m := update.get("my_chat_member")):
         return _handle_my_chat_member(m)
+    if (cm := update.get("chat_member")):
+        return _handle_chat_member(cm)
+    if (jr := update.get("chat_join_request")):
+        return _handle_chat_join_request(jr)
     if (msg := update.get("message")):
         return _handle_message(msg)
 
@@ -246,6 +252,68 @@ def _handle_my_chat_member(mcm: dict):
 
 
 
+# ---------- chat_member (вступления/выходы участников) ----------
+
+def _handle_chat_member(cm: dict):
+    """Поддерживаем снимок участников (ChatMember) для сверки с оплатами."""
+    new_cm = cm.get("new_chat_member") or {}
+    try:
+        tg_chat_id = int((cm.get("chat") or {})["id"])
+        tg_user_id = int((new_cm.get("user") or {})["id"])
+    except (KeyError, TypeError, ValueError):
+        return _ok()
+    chat_pk = TelegramChat.objects.filter(tg_id=tg_chat_id).values_list("pk", flat=True).first()
+    if chat_pk is None:
+        return _ok()
+
+    new_status = new_cm.get("status")
+    logger.debug("chat_member: chat_id=%s user_id=%s status=%s", tg_chat_id, tg_user_id, new_status)
+    if new_status in ("left", "kicked"):
+        ChatMember.objects.filter(chat_id=chat_pk, tg_user_id=tg_user_id).delete()
+    elif new_status in ("member", "restricted", "administrator", "creator"):
+        ChatMember.objects.update_or_create(
+            chat_id=chat_pk, tg_user_id=tg_user_id, defaults={"status": new_status},
+        )
+    return _ok()
+
+
+
+def _handle_chat_join_request(req: dict):
+    """
+    Заявка на вступление. Право проверяется по компактному ростеру чата без БД,
+    одобряем только после точной проверки — через очередь действий
+    (`telegram_outbox`), ответ вебхука Bot API не ждёт. Права нет, а у известного
+    пользователя есть подписка, ждущая оплаты, — заводим JoinRequest, его решит
+    обработчик оплаты (`clubs/payments.py`); иначе заявка остаётся висеть.
+    """
+    try:
+        tg_chat_id = int((req.get("chat") or {})["id"])
+        tg_user_id = int((req.get("from") or {})["id"])
+    except (KeyError, TypeError, ValueError):
+        return _ok()
+    allowed = chat_bitmap.may_have_access(tg_chat_id, tg_user_id)
+    # неизвестный telegram_id кэшируется и отрицательно — отказ чужим без БД
+    user_pk = telegram_ids.resolve(tg_user_id)
+    if not user_pk:
+        logger.debug("chat_join_request: chat_id=%s user_id=%s -> unknown user", tg_chat_id, tg_user_id)
+        return _ok()
+    chat = TelegramChat.objects.filter(tg_id=tg_chat_id).first()
+    if chat is None:
+        return _ok()
+
+    if allowed and access_cache.has_access(user_pk, chat.pk):
+        logger.info("chat_join_request: approve chat_id=%s user_id=%s", tg_chat_id, tg_user_id)
+        # повторная доставка того же апдейта (та же date) вторую строку не создаст
+        telegram_outbox.enqueue([telegram_outbox.action(
+            telegram_outbox.Kind.APPROVE, tg_chat_id, tg_user_id,
+            f"join:{tg_chat_id}:{tg_user_id}:{req.get('date', '')}",
+        )])
+    elif join_requests.open_request(user_pk, chat):
+        logger.info("chat_join_request: chat_id=%s user_id=%s -> awaiting payment", tg_chat_id, tg_user_id)
+    else:
+        logger.debug("chat_join_request: chat_id=%s user_id=%s -> not entitled", tg_chat_id, tg_user_id)
+    return _ok()
+
 def _link_chat_to_project(
     chat_id: int,
     chat_type: str | None,
@@ -256,11 +324,7 @@ def _link_chat_to_project(
     join_by_request: bool,
 ):
     logger.info("link_chat_to_project: chat_id=%s actor_id=%s", chat_id, actor_id)
-    intent = (
-        ChatLinkIntent.objects
-        .filter(chat_id=chat_id, status=ChatLinkIntent.Status.PENDING, expires_at__gt=timezone.now())
-        .order_by("-created_at").first()
-    ) or _find_active_intent_for_user(actor_id)
+    intent = _find_active_intent_for_chat(chat_id) or _find_active_intent_for_user(actor_id)
     logger.info("link_chat_to_project: intent_by_chat_or_user=%s project=%s", getattr(intent, 'id', None), getattr(getattr(intent, 'project', None), 'id', None))
 
     defaults = {
@@ -301,6 +365,16 @@ def _find_active_intent_for_user(tg_user_id: int | None):
     return intent
 
 
+def _find_active_intent_for_chat(chat_id: int | None):
+    if not chat_id:
+        return None
+    return (ChatLinkIntent.objects
+            .filter(chat_id=chat_id,
+                    status=ChatLinkIntent.Status.PENDING,
+                    expires_at__gt=timezone.now())
+            .order_by("-created_at").first())
+
+
 def _find_active_intent_for_request(req_id: int | None):
     if not req_id:
         logger.debug("find_intent_by_request: key=%s -> intent_id=None", req_id)
@@ -1,6 +1,8 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_init, post_save
 from django.dispatch import receiver
 
+from apiCommuniPay.sse import events
+
 from .models import Project, ProjectMember
 
 
@@ -17,3 +19,36 @@ def ensure_owner_membership(sender, instance: Project, created, **kwargs):
         user=instance.owner,
         defaults={"role": ProjectMember.Role.OWNER},
     )
+
+
+@receiver(post_init, sender=ProjectMember)
+def remember_initial_role(sender, instance: ProjectMember, **kwargs):
+    instance._initial_role = instance.role if instance.pk else None
+
+
+def _member_payload(member: ProjectMember) -> dict:
+    return {
+        "project_id": str(member.project_id),
+        "member_id": member.pk,
+        "user_id": member.user_id,
+        "role": member.role,
+    }
+
+
+@receiver(post_save, sender=ProjectMember)
+def publish_member_saved(sender, instance: ProjectMember, created, **kwargs):
+    """Добавление участника или смена роли → событие самому участнику."""
+    previous = instance._initial_role
+    instance._initial_role = instance.role
+    if created:
+        event_type = events.PROJECT_MEMBER_ADDED
+    elif previous != instance.role:
+        event_type = events.PROJECT_MEMBER_CHANGED
+    else:
+        return
+    events.publish_user_event(instance.user_id, event_type, _member_payload(instance))
+
+
+@receiver(post_delete, sender=ProjectMember)
+def publish_member_removed(sender, instance: ProjectMember, **kwargs):
+    events.publish_user_event(instance.user_id, events.PROJECT_MEMBER_REMOVED, _member_payload(instance))
@@ -209,4 +209,21 @@ else:
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
         }
-    }
\ No newline at end of file
+    }
+
+# Общий кэш. Версии прав (clubs/access_cache), ростеры чатов (clubs/chat_bitmap) и
+# telegram_id → user (accounts/telegram_ids) меняют и воркеры gunicorn, и команды
+# (process_payments, expire_subscriptions, import_subscribers, ...) — кэш в памяти
+# процесса этих изменений не увидит. Локально (SQLite, один runserver) — LocMemCache.
+# DatabaseCache не годится: incr у него не атомарен, а каждое чтение — запрос к БД.
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+# события пользователя между процессами (команды → веб-воркеры), см. sse/relay.py
+SSE_REDIS_URL = os.getenv("REDIS_URL")
+# с Postgres нужен Redis (или Memcached) — без него ClubsConfig.ready() откажется стартовать
+SHARED_CACHE_REQUIRED = bool(os.getenv("DATABASE_URL"))
@@ -0,0 +1,92 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from apiCommuniPay.sse import views
+from apiCommuniPay.sse.broker import Broker, token_channel
+
+
+class OutboxTests(SimpleTestCase):
+    def setUp(self):
+        self.broker = Broker(outbox_ttl=60, max_per_channel=3, max_channels=2)
+
+    def test_message_published_before_subscribe_is_delivered(self):
+        self.assertEqual(self.broker.publish("token:a", "message", {"n": 1}), 0)
+        sub = self.broker.subscribe("token:a")
+        ev = sub.get(timeout=0)
+        self.assertEqual(ev.data, {"n": 1})
+        self.assertIsNone(sub.get(timeout=0))
+
+    def test_last_event_id_skips_already_seen(self):
+        self.broker.publish("c", "x", 1)
+        first = self.broker.pending("c")[-1]
+        self.broker.publish("c", "x", 2)
+        sub = self.broker.subscribe("c", last_event_id=first.id)
+        self.assertEqual([sub.get(timeout=0).data], [2])
+
+    def test_ids_grow_across_restarts_and_old_cursor_resyncs(self):
+        self.broker.publish("c", "x", 1)
+        seen = self.broker.pending("c")[-1].id
+        restarted = Broker()   # новый процесс: outbox пуст, эпоха новая
+        restarted.publish("c", "x", 2)
+        self.assertGreater(restarted.pending("c")[-1].id, seen)
+
+        sub = restarted.subscribe("c", last_event_id=seen)
+        self.assertTrue(sub.resync)
+        self.assertEqual([sub.get(timeout=0).data], [2])
+        self.assertFalse(restarted.subscribe("c", last_event_id=restarted.pending("c")[-1].id).resync)
+
+    def test_expired_entries_are_evicted(self):
+        with mock.patch("apiCommuniPay.sse.broker.time.time", return_value=1000.0):
+            self.broker.publish("c", "x", 1)
+        with mock.patch("apiCommuniPay.sse.broker.time.time", return_value=1061.0):
+            self.assertEqual(self.broker.pending("c"), [])
+        self.assertEqual(len(self.broker._outbox), 0)
+
+    def test_memory_is_bounded(self):
+        for i in range(5):
+            self.broker.publish("a", "x", i)
+        self.assertEqual([e.data for e in self.broker.pending("a")], [2, 3, 4])
+        self.broker.publish("b", "x", 0)
+        self.broker.publish("c", "x", 0)
+        self.assertEqual(list(self.broker._outbox), ["b", "c"])
+
+    def test_token_stream_receives_early_message(self):
+        with mock.patch.object(views, "broker", self.broker):
+            views.send_message_to_token("proj_abc", '{"ok": true}')
+            self.assertEqual(len(self.broker.pending(token_channel("proj_abc"))), 1)
+            r = self.client.get("/api/sse/proj_abc/")
+            body = b"".join(r.streaming_content).decode()
+        self.assertIn('data: "{\\"ok\\": true}"', body)
+        self.assertFalse(self.broker._subscribers)
+
+
+class LongPollTests(SimpleTestCase):
+    def setUp(self):
+        self.broker = Broker()
+        patcher = mock.patch.object(views, "broker", self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_returns_all_events_after_cursor_in_one_response(self):
+        for i in range(3):
+            self.broker.publish(token_channel("t1"), "message", {"n": i})
+        first = self.broker.pending(token_channel("t1"))[0]
+
+        r = self.client.get("/api/sse/t1/poll/", {"cursor": first.id, "timeout": 0})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual([e["data"]["n"] for e in r.json()["events"]], [1, 2])
+        cursor = r.json()["cursor"]
+
+        r = self.client.get("/api/sse/t1/poll/", {"cursor": cursor, "timeout": 0})
+        self.assertEqual(r.json(), {"cursor": cursor, "events": []})
+        self.assertFalse(self.broker._subscribers)
+
+    def test_cursor_from_another_epoch_asks_to_resync(self):
+        self.broker.publish(token_channel("t1"), "message", {"n": 1})
+        r = self.client.get("/api/sse/t1/poll/", {"cursor": self.broker.epoch - 1, "timeout": 0})
+        self.assertTrue(r.json()["resync"])
+        self.assertEqual([e["data"]["n"] for e in r.json()["events"]], [1])
+
+    def test_rejects_garbage_cursor(self):
+        self.assertEqual(self.client.get("/api/sse/t1/poll/", {"cursor": "x"}).status_code, 400)
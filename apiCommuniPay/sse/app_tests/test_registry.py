@@ -0,0 +1,49 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from apiCommuniPay.sse.broker import CLOSE, Broker
+
+
+class ConnectionRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.broker = Broker(max_per_user=2, stale_after=30, reap_interval=0)
+
+    def test_reconnect_supersedes_previous_token_waiter(self):
+        old = self.broker.subscribe("token:t", channel_limit=1)
+        new = self.broker.subscribe("token:t", channel_limit=1)
+        self.assertEqual(old.get(timeout=0).type, CLOSE)
+        self.assertEqual(old.closed_reason, "superseded")
+
+        self.broker.publish("token:t", "message", {"ok": True})
+        self.assertEqual(new.get(timeout=0).data, {"ok": True})
+        self.assertIsNone(old.get(timeout=0))
+
+        # поздний unsubscribe старого стрима не должен снять новый
+        self.broker.unsubscribe(old)
+        self.assertEqual(self.broker.metrics()["open_connections"], 1)
+
+    def test_per_user_cap_evicts_oldest(self):
+        subs = [self.broker.subscribe("user:1", user_id=1) for _ in range(3)]
+        self.assertEqual(subs[0].closed_reason, "superseded")
+        self.assertIsNone(subs[1].closed_reason)
+        m = self.broker.metrics()
+        self.assertEqual((m["open_connections"], m["connections_superseded"]), (2, 1))
+
+    def test_stale_subscribers_are_reaped(self):
+        with mock.patch("apiCommuniPay.sse.broker.time.monotonic", return_value=100.0):
+            stale = self.broker.subscribe("user:1", user_id=1)
+        with mock.patch("apiCommuniPay.sse.broker.time.monotonic", return_value=200.0):
+            self.broker.publish("user:2", "x", {})
+        self.assertEqual(stale.closed_reason, "stale")
+        self.assertEqual(self.broker.metrics()["connected_users"], 0)
+
+    def test_metrics_track_bytes_and_latency(self):
+        sub = self.broker.subscribe("c")
+        self.broker.publish("c", "x", {"a": 1})
+        ev = sub.get(timeout=0)
+        self.broker.record_sent(sub, "data: {}\n\n", ev)
+        m = self.broker.metrics()
+        self.assertEqual(m["bytes_sent"], 10)
+        self.assertEqual(m["events_delivered"], 1)
+        self.assertIsNotNone(m["delivery_latency_ms"]["p99"])
@@ -0,0 +1,83 @@
+import json
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apiCommuniPay.clubs.models import Plan, Subscription
+from apiCommuniPay.projects.models import Project, ProjectMember
+from apiCommuniPay.sse import events, relay
+from apiCommuniPay.sse.broker import Broker, user_channel
+
+User = get_user_model()
+
+
+class UserEventsTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="x")
+        self.user = User.objects.create_user(username="member", password="x")
+        self.project = Project.objects.create(owner=self.owner, name="Proj")
+        self.plan = Plan.objects.create(project=self.project, name="Basic", price=Decimal("5.00"))
+        self.broker = Broker()
+        for target in ("apiCommuniPay.sse.events.broker", "apiCommuniPay.sse.views.broker", "apiCommuniPay.sse.relay.broker"):
+            patcher = mock.patch(target, self.broker)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.sub = self.broker.subscribe(user_channel(self.user.pk))
+
+    def drain(self):
+        out = []
+        while (ev := self.sub.get(timeout=0)) is not None:
+            out.append(ev)
+        return out
+
+    def test_subscription_lifecycle_events(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            s = Subscription.objects.create(user=self.user, plan=self.plan)
+        with self.captureOnCommitCallbacks(execute=True):
+            s.save()  # статус не менялся — событий нет
+        with self.captureOnCommitCallbacks(execute=True):
+            s.status = "canceled"
+            s.save(update_fields=["status"])
+
+        got = [(e.type, e.data["subscription_id"]) for e in self.drain()]
+        self.assertEqual(got, [(events.SUBSCRIPTION_ACTIVATED, s.pk), (events.SUBSCRIPTION_CANCELED, s.pk)])
+
+    def test_membership_events_go_to_member(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            m = ProjectMember.objects.create(project=self.project, user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            m.delete()
+        self.assertEqual(
+            [e.type for e in self.drain()],
+            [events.PROJECT_MEMBER_ADDED, events.PROJECT_MEMBER_REMOVED],
+        )
+
+    def test_nothing_published_on_rollback(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            Subscription.objects.create(user=self.user, plan=self.plan)
+        self.assertEqual(self.drain(), [])
+
+    def test_stream_requires_auth(self):
+        self.assertEqual(self.client.get("/api/sse/me/").status_code, 401)
+        r = self.client.get("/api/sse/me/", {"access": str(AccessToken.for_user(self.user))})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r["Content-Type"], "text/event-stream")
+        self.assertEqual(next(iter(r.streaming_content)), b"event: ready\ndata: {}\n\n")
+        r.close()
+
+    def test_relay_carries_events_between_processes(self):
+        redis = mock.Mock()
+        with mock.patch.object(relay, "REDIS_URL", "redis://test"), mock.patch.object(relay, "_client", redis):
+            with self.captureOnCommitCallbacks(execute=True):
+                events.publish_user_event(self.user.pk, events.SUBSCRIPTION_EXPIRED, {"subscription_id": 7})
+        channel, message = redis.publish.call_args.args
+        self.assertEqual(channel, relay.CHANNEL)
+        self.assertEqual(len(self.drain()), 1)   # свой процесс — напрямую
+
+        self.assertEqual(relay.deliver(message), 0)   # своё сообщение из канала не дублируется
+        other = json.dumps({**json.loads(message), "origin": "command"})   # то же от команды
+        self.assertEqual(relay.deliver(other), 1)
+        self.assertEqual([(e.type, e.data) for e in self.drain()], [(events.SUBSCRIPTION_EXPIRED, {"subscription_id": 7})])
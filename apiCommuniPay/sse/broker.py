@@ -0,0 +1,324 @@
+# apiCommuniPay/sse/broker.py
+"""
+In-memory брокер событий для SSE.
+
+Канал — произвольная строка (например, ``user:42`` или ``token:proj_...``). Каждый
+подписчик получает собственную очередь; ``publish`` раскладывает событие по очередям
+всех текущих подписчиков канала. Брокер живёт в памяти процесса, как и прежний
+SSE_CONNECTIONS; события пользователя из других процессов (команды, другие воркеры)
+приносит `relay.py` через Redis pub/sub.
+
+Outbox (store-and-forward)
+--------------------------
+Любое опубликованное событие дополнительно кладётся в короткоживущий outbox канала.
+Новый подписчик сначала получает всё, что лежит в outbox, и только потом — живые
+события. Так не теряются сообщения, отправленные до того, как браузер успел открыть
+стрим (бот обычно быстрее фронта). Повтор после переподключения отсекается по
+``Last-Event-ID``.
+
+Id события — время публикации в микросекундах (``time.time_ns() // 1000``), но не
+меньше предыдущего id + 1: id растут и между перезапусками процесса. ``epoch`` — id
+на момент запуска брокера. Курсор из другой эпохи (меньше ``epoch`` — выдан до
+перезапуска, больше последнего id — чужим процессом) не сопоставить с outbox:
+подписка получает весь outbox и флаг ``resync`` — клиент перечитывает состояние
+через REST.
+
+Память ограничена: не больше ``SSE_OUTBOX_MAX_PER_CHANNEL`` событий на канал и
+``SSE_OUTBOX_MAX_CHANNELS`` каналов; события старше ``SSE_OUTBOX_TTL`` секунд
+вычищаются при каждой публикации/подписке.
+
+Реестр соединений
+-----------------
+Брокер же ведёт учёт открытых подписок:
+
+* лимит на канал (для токена интента — одно соединение) и на пользователя;
+  при превышении вытесняется самое старое соединение — оно получает служебное
+  событие ``close`` с причиной ``superseded`` и завершает стрим;
+* подписки, которые давно не забирали события (клиент отвалился, а воркер этого
+  не заметил), снимаются «жнецом» не чаще раза в ``SSE_REAP_INTERVAL`` секунд;
+* ``metrics()`` отдаёт gauges: открытые соединения, отправленные байты,
+  задержку publish → delivery (p50/p99/max по последним доставкам).
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any
+
+from django.conf import settings
+
+OUTBOX_TTL = getattr(settings, "SSE_OUTBOX_TTL", 120)
+OUTBOX_MAX_PER_CHANNEL = getattr(settings, "SSE_OUTBOX_MAX_PER_CHANNEL", 50)
+OUTBOX_MAX_CHANNELS = getattr(settings, "SSE_OUTBOX_MAX_CHANNELS", 10_000)
+MAX_CONNECTIONS_PER_USER = getattr(settings, "SSE_MAX_CONNECTIONS_PER_USER", 5)
+STALE_AFTER = getattr(settings, "SSE_STALE_AFTER", 90)
+REAP_INTERVAL = getattr(settings, "SSE_REAP_INTERVAL", 10)
+
+CLOSE = "close"   # служебное событие: брокер просит стрим завершиться
+
+
+@dataclass
+class Event:
+    id: int
+    type: str
+    data: Any
+    published_at: float = field(default_factory=time.time)
+
+
+class Subscriber:
+    """Одна открытая подписка на канал (одно SSE-соединение)."""
+
+    def __init__(self, channel: str, user_id: int | None = None):
+        self.channel = channel
+        self.user_id = user_id
+        self.queue: queue.SimpleQueue[Event] = queue.SimpleQueue()
+        self.opened_at = self.last_seen = time.monotonic()
+        self.closed_reason: str | None = None
+        self.bytes_sent = 0
+        self.resync = False   # курсор клиента из другой эпохи брокера
+
+    def get(self, timeout: float) -> Event | None:
+        """Ждёт событие; сам вызов служит признаком жизни соединения для жнеца."""
+        self.last_seen = time.monotonic()
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        finally:
+            self.last_seen = time.monotonic()
+
+    def close(self, reason: str) -> None:
+        self.closed_reason = reason
+        self.queue.put(Event(id=0, type=CLOSE, data={"reason": reason}))
+
+
+class Metrics:
+    """Счётчики и выборка задержек доставки. Обновлять под локом брокера."""
+
+    def __init__(self, samples: int = 2048):
+        self.opened = 0
+        self.superseded = 0
+        self.reaped = 0
+        self.published = 0
+        self.delivered = 0
+        self.bytes_sent = 0
+        self.latencies: deque[float] = deque(maxlen=samples)
+
+    def latency_ms(self) -> dict[str, float | None]:
+        data = sorted(self.latencies)
+        if not data:
+            return {"p50": None, "p99": None, "max": None}
+
+        def pct(p: float) -> float:
+            return round(data[min(len(data) - 1, int(p * len(data)))] * 1000, 2)
+
+        return {"p50": pct(0.50), "p99": pct(0.99), "max": round(data[-1] * 1000, 2)}
+
+
+class Broker:
+    def __init__(
+        self,
+        outbox_ttl: float = OUTBOX_TTL,
+        max_per_channel: int = OUTBOX_MAX_PER_CHANNEL,
+        max_channels: int = OUTBOX_MAX_CHANNELS,
+        max_per_user: int = MAX_CONNECTIONS_PER_USER,
+        stale_after: float = STALE_AFTER,
+        reap_interval: float = REAP_INTERVAL,
+    ):
+        self._lock = threading.Lock()
+        self.epoch = self._last_id = time.time_ns() // 1000
+        self._subscribers: dict[str, set[Subscriber]] = {}
+        self._by_user: dict[int, set[Subscriber]] = {}
+        self._next_reap = 0.0
+        self.metrics_ = Metrics()
+        self.max_per_user = max_per_user
+        self.stale_after = stale_after
+        self.reap_interval = reap_interval
+        # channel -> deque[Event]; порядок ключей = порядок последней публикации,
+        # поэтому самые «старые» каналы всегда в начале и вычищаются за O(1) на канал.
+        self._outbox: OrderedDict[str, deque[Event]] = OrderedDict()
+        self.outbox_ttl = outbox_ttl
+        self.max_per_channel = max_per_channel
+        self.max_channels = max_channels
+
+    # ---------- id событий ----------
+
+    def _next_id(self) -> int:
+        """Вызывать под self._lock."""
+        self._last_id = max(self._last_id + 1, time.time_ns() // 1000)
+        return self._last_id
+
+    def known(self, event_id: int) -> bool:
+        """Курсор выдан этим брокером (0 — клиент ещё ничего не получал)."""
+        return not event_id or self.epoch < event_id <= self._last_id
+
+    # ---------- outbox ----------
+
+    def _evict_expired(self, now: float) -> None:
+        """Вызывать под self._lock."""
+        cutoff = now - self.outbox_ttl
+        while self._outbox:
+            channel, pending = next(iter(self._outbox.items()))
+            while pending and pending[0].published_at <= cutoff:
+                pending.popleft()
+            if pending:
+                break
+            del self._outbox[channel]
+
+    def _enqueue(self, channel: str, event: Event) -> None:
+        """Вызывать под self._lock."""
+        pending = self._outbox.get(channel)
+        if pending is None:
+            pending = self._outbox[channel] = deque(maxlen=self.max_per_channel)
+        else:
+            self._outbox.move_to_end(channel)
+        pending.append(event)
+        while len(self._outbox) > self.max_channels:
+            self._outbox.popitem(last=False)
+
+    def pending(self, channel: str, after_id: int = 0) -> list[Event]:
+        with self._lock:
+            self._evict_expired(time.time())
+            return [ev for ev in self._outbox.get(channel, ()) if ev.id > after_id]
+
+    # ---------- реестр соединений ----------
+
+    def _remove(self, sub: Subscriber) -> bool:
+        """Вызывать под self._lock. True, если подписка ещё числилась в реестре."""
+        subs = self._subscribers.get(sub.channel)
+        if not subs or sub not in subs:
+            return False
+        subs.discard(sub)
+        if not subs:
+            del self._subscribers[sub.channel]
+        if sub.user_id is not None:
+            own = self._by_user.get(sub.user_id)
+            if own is not None:
+                own.discard(sub)
+                if not own:
+                    del self._by_user[sub.user_id]
+        return True
+
+    def _supersede(self, subs, keep: int) -> None:
+        """Вызывать под self._lock. Оставляет `keep` самых свежих, остальных вытесняет."""
+        extra = len(subs) - keep
+        if extra <= 0:
+            return
+        for old in sorted(subs, key=lambda s: s.opened_at)[:extra]:
+            if self._remove(old):
+                old.close("superseded")
+                self.metrics_.superseded += 1
+
+    def _reap(self, mono_now: float) -> None:
+        """Вызывать под self._lock. Снимает подписки, которые давно не читали очередь."""
+        if mono_now < self._next_reap:
+            return
+        self._next_reap = mono_now + self.reap_interval
+        cutoff = mono_now - self.stale_after
+        stale = [s for subs in self._subscribers.values() for s in subs if s.last_seen < cutoff]
+        for sub in stale:
+            if self._remove(sub):
+                sub.close("stale")
+                self.metrics_.reaped += 1
+
+    # ---------- pub/sub ----------
+
+    def subscribe(
+        self,
+        channel: str,
+        last_event_id: int = 0,
+        *,
+        user_id: int | None = None,
+        channel_limit: int | None = None,
+    ) -> Subscriber:
+        """
+        Регистрирует подписчика и сразу кладёт ему в очередь непросроченные
+        события из outbox (кроме уже полученных до last_event_id). Курсор из другой
+        эпохи — весь outbox и `sub.resync`.
+
+        channel_limit — сколько соединений допускаем на канал; user_id включает
+        лимит max_per_user. Лишние (самые старые) соединения вытесняются.
+        """
+        sub = Subscriber(channel, user_id=user_id)
+        with self._lock:
+            self._reap(time.monotonic())
+            self._evict_expired(time.time())
+            if channel_limit:
+                self._supersede(self._subscribers.get(channel, ()), channel_limit - 1)
+            if user_id is not None and self.max_per_user:
+                self._supersede(self._by_user.get(user_id, ()), self.max_per_user - 1)
+            if not self.known(last_event_id):
+                sub.resync, last_event_id = True, 0
+            for ev in self._outbox.get(channel, ()):
+                if ev.id > last_event_id:
+                    sub.queue.put(ev)
+            self._subscribers.setdefault(channel, set()).add(sub)
+            if user_id is not None:
+                self._by_user.setdefault(user_id, set()).add(sub)
+            self.metrics_.opened += 1
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        with self._lock:
+            self._remove(sub)
+
+    def publish(self, channel: str, event_type: str, data: Any) -> int:
+        """
+        Кладёт событие в outbox канала и всем текущим подписчикам.
+        Возвращает число живых получателей (0 — значит, событие дождётся подписчика в outbox).
+        """
+        with self._lock:
+            now = time.time()
+            event = Event(id=self._next_id(), type=event_type, data=data, published_at=now)
+            self._reap(time.monotonic())
+            self._evict_expired(now)
+            self._enqueue(channel, event)
+            self.metrics_.published += 1
+            subs = list(self._subscribers.get(channel, ()))
+        for sub in subs:
+            sub.queue.put(event)
+        return len(subs)
+
+    def record_sent(self, sub: Subscriber, frame: str, *events: Event) -> None:
+        """Стрим сообщает, что отдал кадр клиенту: учитываем байты и задержку доставки событий."""
+        size = len(frame.encode())
+        now = time.time()
+        with self._lock:
+            sub.bytes_sent += size
+            self.metrics_.bytes_sent += size
+            for event in events:
+                if event.id:
+                    self.metrics_.delivered += 1
+                    self.metrics_.latencies.append(max(0.0, now - event.published_at))
+
+    def metrics(self) -> dict[str, Any]:
+        with self._lock:
+            m = self.metrics_
+            return {
+                "open_connections": sum(len(s) for s in self._subscribers.values()),
+                "open_channels": len(self._subscribers),
+                "connected_users": len(self._by_user),
+                "outbox_channels": len(self._outbox),
+                "outbox_events": sum(len(q) for q in self._outbox.values()),
+                "connections_opened": m.opened,
+                "connections_superseded": m.superseded,
+                "connections_reaped": m.reaped,
+                "events_published": m.published,
+                "events_delivered": m.delivered,
+                "bytes_sent": m.bytes_sent,
+                "delivery_latency_ms": m.latency_ms(),
+            }
+
+broker = Broker()
+
+
+def user_channel(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def token_channel(token: str) -> str:
+    return f"token:{token}"
@@ -0,0 +1,45 @@
+# apiCommuniPay/sse/events.py
+"""
+Доменные события для персонального канала пользователя (/api/sse/me/).
+
+Публикуем только после коммита транзакции: клиент, получив событие, сразу
+перечитывает данные через REST и должен увидеть уже зафиксированное состояние.
+Событие уходит в брокер этого процесса и через `relay` (Redis pub/sub) — в остальные:
+большую часть событий публикуют команды, а стримы держат веб-воркеры.
+"""
+from __future__ import annotations
+
+from typing import Any, Iterable
+
+from django.db import transaction
+
+from . import relay
+from .broker import broker, user_channel
+
+CHAT_LINKED = "chat.linked"
+CHAT_STATUS_CHANGED = "chat.status_changed"
+SUBSCRIPTION_ACTIVATED = "subscription.activated"
+SUBSCRIPTION_RENEWED = "subscription.renewed"
+SUBSCRIPTION_CHANGED = "subscription.changed"
+SUBSCRIPTION_EXPIRED = "subscription.expired"
+SUBSCRIPTION_CANCELED = "subscription.canceled"
+JOIN_REQUEST_DECIDED = "join_request.decided"
+PROJECT_MEMBER_ADDED = "project_member.added"
+PROJECT_MEMBER_CHANGED = "project_member.changed"
+PROJECT_MEMBER_REMOVED = "project_member.removed"
+
+
+def publish_user_event(user_ids: int | Iterable[int], event_type: str, data: dict[str, Any]) -> None:
+    """Отправляет событие в каналы указанных пользователей после коммита."""
+    if isinstance(user_ids, int):
+        user_ids = [user_ids]
+    targets = {uid for uid in user_ids if uid}
+    if not targets:
+        return
+
+    def _send():
+        for uid in targets:
+            broker.publish(user_channel(uid), event_type, data)
+        relay.publish(targets, event_type, data)
+
+    transaction.on_commit(_send)
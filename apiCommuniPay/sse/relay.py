@@ -0,0 +1,107 @@
+# apiCommuniPay/sse/relay.py
+"""
+Доставка событий пользователя между процессами через Redis pub/sub.
+
+Брокер (`broker.py`) живёт в памяти процесса, а события публикуют не только веб-воркеры,
+но и команды: `expire_subscriptions`, `process_payments`, `renew`, bulk-операции,
+`import_subscribers`, `process_join_requests`. Поэтому `events.publish_user_event`
+после коммита отдаёт событие локальному брокеру и публикует его в канал
+`SSE_REDIS_CHANNEL`. Каждый процесс, который обслуживает стримы, держит поток-слушатель
+(`start()` — при первой подписке на персональный канал) и раскладывает чужие события в
+свой брокер, а вместе с ним в outbox. Свои сообщения (`ORIGIN`) слушатель пропускает:
+они уже доставлены напрямую.
+
+Pub/sub ничего не хранит: событие, опубликованное, пока слушатель процесса ещё не
+запущен или переподключается к Redis, до этого процесса не дойдёт.
+
+Без `SSE_REDIS_URL` (локальная разработка в одном процессе) работает только
+локальный брокер.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Iterable
+
+from django.conf import settings
+
+from .broker import broker, user_channel
+
+logger = logging.getLogger("sse.relay")
+
+REDIS_URL = getattr(settings, "SSE_REDIS_URL", None)
+CHANNEL = getattr(settings, "SSE_REDIS_CHANNEL", "sse:user_events")
+RECONNECT_MAX = 30   # сек, пауза между переподключениями слушателя удваивается до этого предела
+
+ORIGIN = uuid.uuid4().hex   # id процесса в сообщениях
+
+_client = None
+_listener: threading.Thread | None = None
+_lock = threading.Lock()
+
+
+def _redis():
+    global _client
+    if _client is None:
+        import redis   # нужен только с SSE_REDIS_URL
+
+        _client = redis.Redis.from_url(REDIS_URL)
+    return _client
+
+
+def publish(user_ids: Iterable[int], event_type: str, data: dict[str, Any]) -> None:
+    """
+    Отдаёт событие остальным процессам; вызывать после коммита. Ошибка Redis не
+    ломает вызывающего — событие до других процессов не дойдёт, в лог пишется предупреждение.
+    """
+    if not REDIS_URL:
+        return
+    message = json.dumps({"origin": ORIGIN, "users": sorted(user_ids), "type": event_type, "data": data})
+    try:
+        _redis().publish(CHANNEL, message)
+    except Exception:
+        logger.warning("relay: publish %s failed", event_type, exc_info=True)
+
+
+def deliver(raw: bytes | str) -> int:
+    """Сообщение из канала → локальный брокер. Возвращает число пользователей (0 — своё сообщение)."""
+    msg = json.loads(raw)
+    if msg["origin"] == ORIGIN:
+        return 0
+    for uid in msg["users"]:
+        broker.publish(user_channel(uid), msg["type"], msg["data"])
+    return len(msg["users"])
+
+
+def _listen() -> None:
+    delay = 1.0
+    while True:
+        try:
+            pubsub = _redis().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(CHANNEL)
+            delay = 1.0
+            for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                try:
+                    deliver(message["data"])
+                except (ValueError, KeyError, TypeError):
+                    logger.warning("relay: bad message %r", message["data"][:200])
+        except Exception:
+            logger.warning("relay: listener failed, reconnecting in %.0fs", delay, exc_info=True)
+            time.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX)
+
+
+def start() -> None:
+    """Запускает слушателя в этом процессе (один раз). Без SSE_REDIS_URL ничего не делает."""
+    global _listener
+    if not REDIS_URL or (_listener is not None and _listener.is_alive()):
+        return
+    with _lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = threading.Thread(target=_listen, name="sse-relay", daemon=True)
+            _listener.start()
@@ -1,7 +1,11 @@
 # urls.py
 from django.urls import path
-from apiCommuniPay.sse.views import sse_subscribe
+from apiCommuniPay.sse.views import sse_metrics, sse_subscribe, token_poll, user_events, user_events_poll
 
 urlpatterns = [
+    path("me/", user_events, name="sse-user-events"),
+    path("me/poll/", user_events_poll, name="sse-user-events-poll"),
+    path("metrics/", sse_metrics, name="sse-metrics"),
     path("<str:token>/", sse_subscribe, name="sse-subscribe"),
+    path("<str:token>/poll/", token_poll, name="sse-token-poll"),
 ]
@@ -1,35 +1,73 @@
 import time
 import json
-from django.http import HttpResponseBadRequest, StreamingHttpResponse
-from threading import Event
+from django.conf import settings
+from django.http import HttpResponseBadRequest, HttpResponse, JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from . import relay
+from .broker import CLOSE, broker, token_channel, user_channel
+
+USER_STREAM_TTL = 15 * 60     # сколько держим персональный стрим, сек
+USER_STREAM_HEARTBEAT = 20    # keep-alive комментарий, чтобы прокси не рвали соединение
+TOKEN_STREAM_TTL = 15 * 60    # сколько ждём сообщения по токену интента, сек
+# на один токен — одно соединение: переподключение вытесняет прежний стрим
+MAX_CONNECTIONS_PER_TOKEN = getattr(settings, "SSE_MAX_CONNECTIONS_PER_TOKEN", 1)
+LONG_POLL_MAX_WAIT = getattr(settings, "SSE_LONG_POLL_MAX_WAIT", 25)   # меньше типичных таймаутов прокси
+LONG_POLL_MAX_EVENTS = 100
+
+
+def _last_event_id(request) -> int:
+    raw = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id") or "0"
+    try:
+        return int(raw)
+    except ValueError:
+        return 0
+
+
+def _send(sub, frame: str, *events) -> str:
+    broker.record_sent(sub, frame, *events)
+    return frame
 
-# Временное хранилище активных подписок (in-memory)
-SSE_CONNECTIONS = {}  # {token: {"event": Event(), "message": str}}
 
 def sse_subscribe(request, token):
     """
     Подписка на SSE по токену.
-    Ожидает сообщения или таймаут 15 минут.
+    Ожидает сообщения или таймаут 15 минут. Сообщение, отправленное до подключения,
+    берётся из outbox брокера.
     """
     if request.method != "GET":
         return HttpResponseBadRequest("GET only")
-    
-    # создаём Event для ожидания сообщения
-    stop_event = Event()
-    SSE_CONNECTIONS[token] = {"event": stop_event, "message": None}
+
+    sub = broker.subscribe(
+        token_channel(token),
+        last_event_id=_last_event_id(request),
+        channel_limit=MAX_CONNECTIONS_PER_TOKEN,
+    )
 
     def event_stream():
+        deadline = time.monotonic() + TOKEN_STREAM_TTL
         try:
-            # ждём сообщение до 15 минут
-            if not stop_event.wait(timeout=15*60):
-                # таймаут
-                yield "event: timeout\ndata: {}\n\n"
-            else:
-                msg = SSE_CONNECTIONS[token]["message"]
-                yield f"data: {json.dumps(msg)}\n\n"
+            # ждём сообщение до 15 минут, периодически шлём keep-alive
+            while True:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    # таймаут
+                    yield _send(sub, "event: timeout\ndata: {}\n\n")
+                    return
+                ev = sub.get(timeout=min(USER_STREAM_HEARTBEAT, left))
+                if ev is None:
+                    yield _send(sub, ": ping\n\n")
+                    continue
+                if ev.type == CLOSE:
+                    yield _send(sub, f"event: {sub.closed_reason}\ndata: {{}}\n\n")
+                    return
+                yield _send(sub, f"id: {ev.id}\ndata: {json.dumps(ev.data)}\n\n", ev)
+                return
         finally:
             # чистим соединение
-            SSE_CONNECTIONS.pop(token, None)
+            broker.unsubscribe(sub)
 
     response = StreamingHttpResponse(event_stream(), content_type="text/event-stream")
     response['Cache-Control'] = 'no-cache'
@@ -39,8 +77,134 @@ def sse_subscribe(request, token):
 def send_message_to_token(token: str, payload: dict):
     """
     Отправка сообщения конкретному клиенту по токену.
+    Если клиент ещё не подключился — сообщение дождётся его в outbox.
+    """
+    broker.publish(token_channel(token), "message", payload)
+
+
+def _authenticate(request):
+    """
+    EventSource не умеет слать заголовки, поэтому JWT принимаем ещё и из ?access=.
+    Иначе — обычный Authorization: Bearer или сессия.
+    """
+    jwt_auth = JWTAuthentication()
+    raw = request.GET.get("access")
+    try:
+        if raw:
+            return jwt_auth.get_user(jwt_auth.get_validated_token(raw))
+        res = jwt_auth.authenticate(request)
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+    if res:
+        return res[0]
+    user = getattr(request, "user", None)
+    return user if user is not None and user.is_authenticated else None
+
+
+def user_events(request):
+    """
+    Персональный канал событий пользователя: чаты, подписки, заявки, участники проектов.
+    Формат кадра: `event: <type>` + `data: <json>`.
+    """
+    if request.method != "GET":
+        return HttpResponseBadRequest("GET only")
+    user = _authenticate(request)
+    if user is None:
+        return HttpResponse(status=401)
+
+    relay.start()
+    sub = broker.subscribe(user_channel(user.pk), last_event_id=_last_event_id(request), user_id=user.pk)
+
+    def event_stream():
+        deadline = time.monotonic() + USER_STREAM_TTL
+        try:
+            yield _send(sub, "event: ready\ndata: {}\n\n")
+            if sub.resync:
+                # Last-Event-ID из другой эпохи брокера — пропущенное не восстановить
+                yield _send(sub, "event: resync\ndata: {}\n\n")
+            while True:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    yield _send(sub, "event: timeout\ndata: {}\n\n")
+                    return
+                ev = sub.get(timeout=min(USER_STREAM_HEARTBEAT, left))
+                if ev is None:
+                    yield _send(sub, ": ping\n\n")
+                    continue
+                if ev.type == CLOSE:
+                    yield _send(sub, f"event: {sub.closed_reason}\ndata: {{}}\n\n")
+                    return
+                yield _send(sub, f"id: {ev.id}\nevent: {ev.type}\ndata: {json.dumps(ev.data)}\n\n", ev)
+        finally:
+            broker.unsubscribe(sub)
+
+    response = StreamingHttpResponse(event_stream(), content_type="text/event-stream")
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _long_poll(request, channel: str, user_id: int | None = None, channel_limit: int | None = None):
+    """
+    Фолбэк для клиентов, у которых SSE режут прокси/встроенные браузеры.
+    Тот же брокер и тот же outbox: отдаём все события после ?cursor= одним ответом,
+    а если их нет — ждём первое не дольше ?timeout= секунд. Клиент повторяет запрос
+    с cursor из ответа. `"resync": true` — cursor из другой эпохи брокера (перезапуск,
+    другой процесс): клиент перечитывает состояние через REST.
     """
-    conn = SSE_CONNECTIONS.get(token)
-    if conn:
-        conn["message"] = payload
-        conn["event"].set()  # пробуждаем генератор
+    try:
+        cursor = max(0, int(request.GET.get("cursor") or _last_event_id(request)))
+        wait = min(max(0.0, float(request.GET.get("timeout", LONG_POLL_MAX_WAIT))), LONG_POLL_MAX_WAIT)
+    except ValueError:
+        return HttpResponseBadRequest("cursor and timeout must be numbers")
+
+    sub = broker.subscribe(channel, last_event_id=cursor, user_id=user_id, channel_limit=channel_limit)
+    batch = []
+    try:
+        ev = sub.get(timeout=wait)
+        while ev is not None and ev.type != CLOSE:
+            batch.append(ev)
+            if len(batch) >= LONG_POLL_MAX_EVENTS:
+                break
+            ev = sub.get(timeout=0)
+    finally:
+        broker.unsubscribe(sub)
+
+    body = {
+        "cursor": batch[-1].id if batch else (0 if sub.resync else cursor),
+        "events": [{"id": e.id, "type": e.type, "data": e.data} for e in batch],
+    }
+    if sub.resync:
+        body["resync"] = True
+    response = JsonResponse(body)
+    broker.record_sent(sub, response.content.decode(), *batch)
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def user_events_poll(request):
+    """Long-poll вариант /api/sse/me/."""
+    if request.method != "GET":
+        return HttpResponseBadRequest("GET only")
+    user = _authenticate(request)
+    if user is None:
+        return HttpResponse(status=401)
+    relay.start()
+    return _long_poll(request, user_channel(user.pk), user_id=user.pk)
+
+
+def token_poll(request, token):
+    """Long-poll вариант /api/sse/<token>/."""
+    if request.method != "GET":
+        return HttpResponseBadRequest("GET only")
+    return _long_poll(request, token_channel(token), channel_limit=MAX_CONNECTIONS_PER_TOKEN)
+
+
+def sse_metrics(request):
+    """Gauges брокера для мониторинга; только для сотрудников платформы."""
+    user = _authenticate(request)
+    if user is None:
+        return HttpResponse(status=401)
+    if not getattr(user, "is_platform_staff", False):
+        return HttpResponse(status=403)
+    return JsonResponse(broker.metrics())